@@ -0,0 +1,8 @@
+"""
+Benchmarks offline do Pergunta que Respondo.
+
+Os scripts deste pacote rodam sem Gemini nem Tavily, usando os dublês de
+:mod:`benchmarks.fakes`. Execute a partir da pasta ``web/``, por exemplo::
+
+    python -m benchmarks.bench_crawler
+"""
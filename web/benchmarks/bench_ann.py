@@ -0,0 +1,126 @@
+"""
+Compara os tipos de índice de :mod:`chatbot.ann` em recall@10, latência e memória.
+
+Para cada escala, gera vetores sintéticos normalizados, agrupados em tópicos
+(como trechos de notícias sobre poucos assuntos), e consultas tiradas da mesma
+distribuição. O índice ``flat`` dá a resposta exata; os demais são
+comparados com ele em:
+
+* recall@10: fração dos 10 vizinhos exatos encontrados;
+* latência p50/p99 de uma consulta isolada (como no ``rag_engine``);
+* tempo de treino e de inserção;
+* tamanho do índice serializado (aproximação da memória ocupada).
+
+``nprobe`` e ``efSearch`` são varridos para mostrar a troca entre recall e
+latência que ``FAISS_NPROBE``/``FAISS_EF_SEARCH`` controlam em produção.
+
+Uso (a partir de ``web/``; requer ``faiss-cpu``)::
+
+    python -m benchmarks.bench_ann [--escalas 100000,1000000] [--consultas 200]
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import faiss
+
+from chatbot import ann
+from benchmarks.util import percentil
+
+
+def vetores_sinteticos(n: int, centros: np.ndarray, rnd) -> np.ndarray:
+    topicos, d = centros.shape
+    vetores = np.empty((n, d), dtype=np.float32)
+    for inicio in range(0, n, 100000):
+        fim = min(n, inicio + 100000)
+        rotulos = rnd.integers(0, topicos, fim - inicio)
+        vetores[inicio:fim] = centros[rotulos] + 0.6 * rnd.standard_normal((fim - inicio, d), dtype=np.float32)
+    faiss.normalize_L2(vetores)
+    return vetores
+
+
+def tamanho_mb(index) -> float:
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        return round(os.path.getsize(f.name) / 2**20, 1)
+
+
+def avaliar(index, consultas: np.ndarray, exatos: np.ndarray, k: int) -> dict:
+    latencias, acertos = [], 0
+    for q, verdade in zip(consultas, exatos):
+        inicio = time.perf_counter()
+        _, indices = index.search(q[None, :], k)
+        latencias.append(1000 * (time.perf_counter() - inicio))
+        acertos += len(set(indices[0].tolist()) & set(verdade.tolist()))
+    return {
+        f"recall@{k}": round(acertos / (k * len(consultas)), 4),
+        "p50_ms": percentil(latencias, 50),
+        "p99_ms": percentil(latencias, 99),
+    }
+
+
+def medir_tipo(tipo: str, vetores: np.ndarray, consultas, exatos, k: int, varredura: list[int]) -> dict:
+    index = ann.criar_indice(vetores.shape[1], len(vetores), tipo)
+    inicio = time.perf_counter()
+    ann.treinar(index, vetores)
+    treino = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    index.add(vetores)
+    insercao = time.perf_counter() - inicio
+
+    resultado = {
+        "indice": ann.descrever(index),
+        "treino_s": round(treino, 2),
+        "insercao_s": round(insercao, 2),
+        "tamanho_mb": tamanho_mb(index),
+    }
+    if tipo == "flat":
+        resultado.update(avaliar(index, consultas, exatos, k))
+        return resultado
+
+    resultado["buscas"] = []
+    for valor in varredura:
+        ann.ajustar_busca(index, nprobe=valor, ef_search=max(valor, k))
+        parametro = "efSearch" if tipo == "hnsw" else "nprobe"
+        resultado["buscas"].append({parametro: max(valor, k) if tipo == "hnsw" else valor,
+                                    **avaliar(index, consultas, exatos, k)})
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--escalas", default="100000,1000000", help="tamanhos da base, separados por vírgula")
+    parser.add_argument("--dim", type=int, default=384, help="dimensão (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--topicos", type=int, default=1000, help="grupos de vetores na base sintética")
+    parser.add_argument("--consultas", type=int, default=200, help="consultas por medida")
+    parser.add_argument("--tipos", default=",".join(ann.TIPOS), help="tipos de índice a comparar")
+    parser.add_argument("--varredura", default="8,16,32,64,128", help="valores de nprobe/efSearch")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rnd = np.random.default_rng(0)
+    varredura = [int(v) for v in args.varredura.split(",")]
+    relatorio = []
+    for n in (int(e) for e in args.escalas.split(",")):
+        centros = rnd.standard_normal((args.topicos, args.dim), dtype=np.float32)
+        vetores = vetores_sinteticos(n, centros, rnd)
+        consultas = vetores_sinteticos(args.consultas, centros, rnd)
+        exato = faiss.IndexFlatL2(args.dim)
+        exato.add(vetores)
+        _, exatos = exato.search(consultas, args.k)
+        del exato
+
+        por_tipo = {
+            tipo: medir_tipo(tipo, vetores, consultas, exatos, args.k, varredura)
+            for tipo in args.tipos.split(",")
+        }
+        relatorio.append({"vetores": n, "dim": args.dim, "tipos": por_tipo})
+        print(json.dumps(relatorio[-1], ensure_ascii=False, indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compara o tempo de carga de um rebuild completo: um JSON por artigo (bronze)
+contra a camada gold compactada (ver :mod:`data.camadas`).
+
+Os artigos de ``data/bronze/`` são replicados (com links distintos) em um
+diretório temporário até o tamanho pedido. Para cada layout o benchmark mede
+a leitura de todos os artigos e a leitura só da coluna ``texto``, além do
+custo da compactação bronze -> silver -> gold e de uma reimportação sem
+arquivos novos. O cache de páginas do sistema operacional não é esvaziado,
+então os números refletem leituras "quentes".
+
+Uso (a partir de ``web/``)::
+
+    python -m benchmarks.bench_camadas [--artigos 5000] [--repeticoes 3]
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+from data import camadas
+from benchmarks.fakes import BRONZE_DIR
+
+
+def replicar_bronze(destino: Path, total: int, bronze_dir: Path = BRONZE_DIR) -> int:
+    """Grava ``total`` arquivos no formato da bronze, replicando os artigos reais."""
+    originais = []
+    for nome in sorted(os.listdir(bronze_dir)):
+        if nome.endswith(".json"):
+            with open(bronze_dir / nome, encoding="utf-8") as f:
+                originais.append(json.load(f))
+
+    destino.mkdir(parents=True, exist_ok=True)
+    for i in range(total):
+        artigo = dict(originais[i % len(originais)])
+        artigo["link"] = f"{artigo.get('link', 'https://exemplo.org')}#copia-{i}"
+        with open(destino / f"{i:06d}.json", "w", encoding="utf-8") as f:
+            json.dump(artigo, f, ensure_ascii=False, indent=4)
+    return total
+
+
+def carregar_bronze(bronze_dir: Path, colunas=None) -> list[dict]:
+    """O layout antigo: ``os.listdir`` + ``json.load`` em cada arquivo."""
+    artigos = []
+    for nome in sorted(os.listdir(bronze_dir)):
+        if nome.endswith(".json"):
+            with open(bronze_dir / nome, encoding="utf-8") as f:
+                artigo = json.load(f)
+            artigos.append(artigo if colunas is None else {c: artigo.get(c) for c in colunas})
+    return artigos
+
+
+def cronometrar(funcao, repeticoes: int) -> tuple[float, object]:
+    melhor, resultado = float("inf"), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return round(1000 * melhor, 1), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--artigos", type=int, default=5000, help="artigos sintéticos na bronze")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções por medida (vale a melhor)")
+    args = parser.parse_args()
+
+    raiz = Path(tempfile.mkdtemp(prefix="bench_camadas_"))
+    bronze, silver, gold = raiz / "bronze", raiz / "silver", raiz / "gold"
+    try:
+        replicar_bronze(bronze, args.artigos)
+
+        inicio = time.perf_counter()
+        camadas.compactar(bronze, silver, gold)
+        ms_compactacao = round(1000 * (time.perf_counter() - inicio), 1)
+        ms_reimportacao, _ = cronometrar(lambda: camadas.importar_bronze(bronze, silver), 1)
+
+        def ler_gold(colunas=None):
+            return list(camadas.ler_artigos(colunas, silver_path=silver, gold_path=gold))
+
+        medidas = {
+            "bronze_completo": cronometrar(lambda: carregar_bronze(bronze), args.repeticoes),
+            "bronze_texto": cronometrar(lambda: carregar_bronze(bronze, ["texto"]), args.repeticoes),
+            "gold_completo": cronometrar(ler_gold, args.repeticoes),
+            "gold_texto": cronometrar(lambda: ler_gold(["texto"]), args.repeticoes),
+        }
+        for nome, (_, artigos) in medidas.items():
+            assert len(artigos) == args.artigos, (nome, len(artigos))
+
+        base = medidas["bronze_completo"][0]
+        resultado = {
+            "artigos": args.artigos,
+            "formato_gold": "parquet" if (gold / "artigos.parquet").exists() else "jsonl",
+            "ms_compactacao": ms_compactacao,
+            "ms_reimportacao_sem_novos": ms_reimportacao,
+            "ms_carga": {nome: ms for nome, (ms, _) in medidas.items()},
+            "speedup_gold_vs_bronze": round(base / medidas["gold_completo"][0], 2),
+            "speedup_gold_texto_vs_bronze": round(base / medidas["gold_texto"][0], 2),
+        }
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compara a indexação por artigo inteiro com a indexação por trechos.
+
+Para cada artigo de ``data/bronze/`` é gerada uma pergunta sintética a partir
+de uma sentença da segunda metade do texto (onde artigos inteiros sofrem com
+o truncamento do MiniLM). As duas bases são consultadas com os mesmos modelos
+usados em produção (``all-MiniLM-L6-v2`` + ``ms-marco-MiniLM-L-6-v2``) e o
+benchmark informa recall@5, MRR e a latência do reranking.
+
+Uso (a partir de ``web/``; requer ``sentence-transformers``)::
+
+    python -m benchmarks.bench_chunking [--k 10] [--top-n 5]
+"""
+
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+from sentence_transformers import SentenceTransformer, CrossEncoder
+
+from chatbot.knowledge.knowledge import carregar_artigos
+from chatbot.knowledge.chunking import dividir_artigos, dividir_sentencas
+from benchmarks.util import percentil
+
+
+def perguntas_sinteticas(artigos: list[dict], semente: int = 7) -> list[tuple[str, str]]:
+    """Pares ``(pergunta, link esperado)`` tirados da segunda metade de cada artigo."""
+    rnd = random.Random(semente)
+    perguntas = []
+    for artigo in artigos:
+        sentencas = [s for s in dividir_sentencas(artigo.get("texto", "")) if len(s.split()) >= 8]
+        if len(sentencas) < 6:
+            continue
+        sentenca = rnd.choice(sentencas[len(sentencas) // 2:])
+        perguntas.append((" ".join(sentenca.split()[:14]), artigo["link"]))
+    return perguntas
+
+
+def avaliar(nome, textos, links, perguntas, bi, cross, k, top_n) -> dict:
+    matriz = bi.encode(textos, batch_size=64, normalize_embeddings=True)
+    acertos, rr, latencias = 0, 0.0, []
+    for pergunta, esperado in perguntas:
+        q = bi.encode([pergunta], normalize_embeddings=True)[0]
+        candidatos = np.argsort(-(matriz @ q))[:k]
+
+        inicio = time.perf_counter()
+        scores = cross.predict([(pergunta, textos[i]) for i in candidatos])
+        latencias.append(1000 * (time.perf_counter() - inicio))
+
+        ordem = [candidatos[i] for i in np.argsort(-scores)][:top_n]
+        ranking = list(dict.fromkeys(links[i] for i in ordem))
+        if esperado in ranking:
+            acertos += 1
+            rr += 1 / (ranking.index(esperado) + 1)
+    return {
+        "modo": nome,
+        "documentos": len(textos),
+        "recall@%d" % top_n: round(acertos / len(perguntas), 3),
+        "mrr": round(rr / len(perguntas), 3),
+        "rerank_ms_p50": percentil(latencias, 50),
+        "rerank_ms_p95": percentil(latencias, 95),
+        "caracteres_medios": int(np.mean([len(t) for t in textos])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k", type=int, default=10, help="candidatos do FAISS")
+    parser.add_argument("--top-n", type=int, default=5, help="documentos após o rerank")
+    args = parser.parse_args()
+
+    artigos = carregar_artigos()
+    perguntas = perguntas_sinteticas(artigos)
+    bi = SentenceTransformer("all-MiniLM-L6-v2")
+    cross = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+    inteiros = [f"{a.get('titulo', '')} - {a.get('texto', '')}" for a in artigos]
+    trechos, metadados = dividir_artigos(artigos)
+
+    resultado = {
+        "perguntas": len(perguntas),
+        "resultados": [
+            avaliar("artigo_inteiro", inteiros, [a["link"] for a in artigos], perguntas, bi, cross, args.k, args.top_n),
+            avaliar("trechos", trechos, [m["link"] for m in metadados], perguntas, bi, cross, args.k, args.top_n),
+        ],
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Tamanho e base do contexto do prompt: trechos inteiros contra :func:`chatbot.contexto.montar`.
+
+Indexa os trechos de ``data/bronze/`` no BM25 e usa os ``--k`` melhores de
+cada pergunta como a lista reranqueada que chegaria ao LLM (o reranqueamento
+não muda o que a montagem faz com ela). As perguntas são as de
+``perguntas_ouro.json`` mais as sintéticas de :mod:`benchmarks.bench_chunking`.
+Para cada pergunta, compara o contexto antigo (``repr`` dos trechos) com o
+montado dentro de ``--max-tokens`` e reporta:
+
+* tokens estimados dos dois contextos (média, p50, p95) e a redução;
+* tempo da montagem;
+* se a notícia esperada continua no contexto (perguntas de ouro) e se a
+  sentença de onde a pergunta sintética saiu continua nele;
+* a ancoragem (:func:`chatbot.contexto.ancoragem`) dessa sentença, a resposta
+  de referência das perguntas sintéticas, no contexto montado.
+
+Com ``--llm``, também pede ao Gemini (``GOOGLE_API_KEY``) uma resposta com
+cada contexto para as perguntas de ouro e compara a ancoragem das duas nos
+trechos inteiros.
+
+Uso (a partir de ``web/``; requer ``sentence-transformers`` por causa de
+:mod:`benchmarks.bench_chunking`)::
+
+    python -m benchmarks.bench_contexto [--k 6] [--max-tokens 600] [--llm]
+"""
+
+import json
+import time
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+from chatbot import bm25, contexto
+from chatbot.knowledge.chunking import dividir_artigos, dividir_sentencas
+from benchmarks.bench_chunking import perguntas_sinteticas
+from benchmarks.fakes import PERGUNTAS_OURO, carregar_bronze
+from benchmarks.util import percentil
+
+
+def resumir(valores: list[float]) -> dict:
+    return {"media": round(float(np.mean(valores)), 1), "p50": percentil(valores, 50), "p95": percentil(valores, 95)}
+
+
+def evidencia(artigos: dict, pergunta: str, link: str) -> str:
+    """Sentença do artigo de onde a pergunta sintética foi tirada."""
+    return next(
+        (s for s in dividir_sentencas(artigos[link].get("texto", "")) if " ".join(s.split()).startswith(pergunta)),
+        pergunta,
+    )
+
+
+def avaliar(perguntas, buscar, max_tokens: int, idf, artigos: dict) -> dict:
+    originais, montados, reducoes, latencias = [], [], [], []
+    mantidas, evidencias, ancoragens = 0, 0, []
+    for pergunta, esperados, sintetica in perguntas:
+        docs = buscar(pergunta)
+        inicio = time.perf_counter()
+        montado = contexto.montar(pergunta, docs, max_tokens, idf=idf)
+        latencias.append(1000 * (time.perf_counter() - inicio))
+        originais.append(montado.tokens_originais)
+        montados.append(montado.tokens)
+        reducoes.append(montado.reducao)
+
+        recuperados = {doc.metadata["link"] for doc in docs} & esperados
+        if not recuperados or recuperados & {meta.get("link") for meta in montado.fontes}:
+            mantidas += 1
+        if sintetica:
+            referencia = evidencia(artigos, pergunta, next(iter(esperados)))
+            if " ".join(referencia.split()) in " ".join(montado.texto.split()):
+                evidencias += 1
+            ancoragens.append(contexto.ancoragem(referencia, montado.texto))
+    n = len(perguntas)
+    resultado = {
+        "perguntas": n,
+        "tokens_originais": resumir(originais),
+        "tokens_montados": resumir(montados),
+        "reducao_media": round(float(np.mean(reducoes)), 3),
+        "montagem_ms": resumir(latencias),
+        "noticia_esperada_mantida": round(mantidas / n, 3),
+    }
+    if ancoragens:
+        resultado["evidencia_mantida"] = round(evidencias / n, 3)
+        resultado["ancoragem_referencia"] = round(float(np.mean(ancoragens)), 3)
+    return resultado
+
+
+def comparar_llm(perguntas, buscar, max_tokens: int, idf) -> dict:
+    """Ancoragem, nos trechos inteiros, das respostas do Gemini com cada contexto."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from chatbot import rag_engine
+
+    rag_engine.init_components()
+    cadeia = ChatPromptTemplate.from_template(rag_engine.PROMPT_TEMPLATE) | rag_engine.llm | StrOutputParser()
+    ancoragens = {"original": [], "montado": []}
+    for pergunta, _, _ in perguntas:
+        docs = buscar(pergunta)
+        completo = "\n".join(doc.page_content for doc in docs)
+        contextos = {
+            "original": str([doc.page_content for doc in docs]),
+            "montado": contexto.montar(pergunta, docs, max_tokens, idf=idf).texto,
+        }
+        for versao, texto in contextos.items():
+            resposta = cadeia.invoke({"pergunta": pergunta, "contexto": texto})
+            ancoragens[versao].append(contexto.ancoragem(resposta, completo))
+    return {versao: round(float(np.mean(valores)), 3) for versao, valores in ancoragens.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k", type=int, default=6, help="trechos que chegariam ao LLM (top_n do reranqueamento)")
+    parser.add_argument("--max-tokens", type=int, default=contexto.CONTEXTO_MAX_TOKENS)
+    parser.add_argument("--llm", action="store_true", help="compara respostas reais do Gemini (GOOGLE_API_KEY)")
+    args = parser.parse_args()
+
+    bronze = carregar_bronze()
+    artigos = {artigo["link"]: artigo for artigo in bronze}
+    textos, metadados = dividir_artigos(bronze)
+    trechos = [SimpleNamespace(page_content=t, metadata=m) for t, m in zip(textos, metadados)]
+    lexico = bm25.IndiceBM25()
+    lexico.adicionar(textos)
+
+    def buscar(pergunta):
+        return [trechos[pos] for pos, _ in lexico.buscar(pergunta, args.k)]
+
+    with open(PERGUNTAS_OURO, encoding="utf-8") as f:
+        ouro = [(item["pergunta"], set(item["links"]), False) for item in json.load(f)]
+    sinteticas = [(pergunta, {link}, True) for pergunta, link in perguntas_sinteticas(bronze)]
+
+    relatorio = {"parametros": vars(args), "trechos": len(textos), "conjuntos": {}}
+    for conjunto, perguntas in (("ouro", ouro), ("sinteticas", sinteticas)):
+        relatorio["conjuntos"][conjunto] = {
+            "idf_bm25": avaliar(perguntas, buscar, args.max_tokens, lexico.idf, artigos),
+            "idf_local": avaliar(perguntas, buscar, args.max_tokens, None, artigos),
+        }
+    if args.llm:
+        relatorio["ancoragem_respostas_gemini"] = comparar_llm(ouro, buscar, args.max_tokens, lexico.idf)
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
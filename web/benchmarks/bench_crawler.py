@@ -0,0 +1,62 @@
+"""
+Benchmark do coletor concorrente contra um servidor HTTP local e um LLM falso.
+
+Compara a coleta sequencial (um worker, uma chamada de LLM por vez) com o
+:class:`crawler.coletor.ColetorConcorrente` configurado com os limites padrão.
+
+Uso (a partir de ``web/``)::
+
+    python -m benchmarks.bench_crawler --hosts 3 --paginas 10
+"""
+
+import json
+import time
+import argparse
+from contextlib import ExitStack
+
+from crawler.coletor import ColetorConcorrente
+from benchmarks.fakes import ServidorLocal, FakeExtratorLLM
+
+
+def rodar(urls, latencia_llm: float, **limites) -> dict:
+    llm = FakeExtratorLLM(latencia_llm)
+    inicio = time.perf_counter()
+    with ColetorConcorrente(preparar=lambda html: html, extrair=llm, **limites) as coletor:
+        resultados = coletor.coletar(urls)
+        estatisticas = dict(coletor.estatisticas)
+    return {
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "artigos": sum(r is not None for r in resultados),
+        **estatisticas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hosts", type=int, default=3)
+    parser.add_argument("--paginas", type=int, default=10, help="páginas por host")
+    parser.add_argument("--latencia-http", type=float, default=0.1)
+    parser.add_argument("--latencia-llm", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        servidores = [stack.enter_context(ServidorLocal(args.latencia_http)) for _ in range(args.hosts)]
+        urls = [f"{s.url}/noticia/{i}" for i in range(args.paginas) for s in servidores]
+
+        resultado = {
+            "urls": len(urls),
+            "sequencial": rodar(
+                urls, args.latencia_llm,
+                max_workers=1, max_por_host=1, intervalo_host=0, max_llm=1,
+            ),
+            "concorrente": rodar(
+                urls, args.latencia_llm,
+                max_workers=8, max_por_host=2, intervalo_host=0.05, max_llm=4,
+            ),
+        }
+    resultado["speedup"] = round(resultado["sequencial"]["segundos"] / resultado["concorrente"]["segundos"], 2)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compara o ``index.pkl`` do LangChain com o ``docstore.sqlite3`` de :mod:`chatbot.docstore`.
+
+Para cada escala, grava um docstore sintético nos dois formatos (trechos de
+~1000 caracteres com os metadados usados pelo chunking) e, em um processo
+novo para cada medida, mede:
+
+* o tempo para abrir o docstore (desserializar o pickle ou abrir o SQLite);
+* o aumento de memória residente do processo ao abri-lo;
+* a latência de materializar os 10 documentos de uma consulta.
+
+Uso (a partir de ``web/``; requer ``langchain-community``)::
+
+    python -m benchmarks.bench_docstore [--escalas 10000,100000,500000]
+"""
+
+import json
+import time
+import pickle
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from chatbot import docstore
+from benchmarks.bench_memoria import memoria_processo
+
+PALAVRAS = "governo federal ministério saúde educação brasília distrito projeto lei câmara senado".split()
+
+
+def gerar(destino: Path, n: int):
+    rnd = random.Random(0)
+    documentos, ids = {}, {}
+    for i in range(n):
+        doc_id = f"doc-{i}"
+        texto = " ".join(rnd.choice(PALAVRAS) for _ in range(140))
+        documentos[doc_id] = Document(
+            page_content=texto,
+            metadata={"fonte": "exemplo.com.br", "link": f"https://exemplo.com.br/{i // 8}",
+                      "titulo": f"Notícia {i // 8}", "data_coleta": "2025-08-26T10:00:00",
+                      "chunk": i % 8, "n_chunks": 8},
+            id=doc_id,
+        )
+        ids[i] = doc_id
+    store = InMemoryDocstore(documentos)
+    with open(destino / docstore.LEGACY_FILE, "wb") as f:
+        pickle.dump((store, ids), f)
+    docstore.salvar(store, ids, destino)
+
+
+def medir(formato: str, caminho: str, n: int, fila):
+    antes = memoria_processo()["rss_mb"]
+    inicio = time.perf_counter()
+    if formato == "pickle":
+        with open(Path(caminho) / docstore.LEGACY_FILE, "rb") as f:
+            store, ids = pickle.load(f)
+    else:
+        store, ids = docstore.abrir(caminho)
+    abertura = time.perf_counter() - inicio
+    depois = memoria_processo()["rss_mb"]
+
+    rnd = random.Random(1)
+    latencias = []
+    for _ in range(200):
+        inicio = time.perf_counter()
+        [store.search(ids[rnd.randrange(n)]) for _ in range(10)]
+        latencias.append(1000 * (time.perf_counter() - inicio))
+    latencias.sort()
+    fila.put({
+        "abertura_ms": round(1000 * abertura, 1),
+        "rss_aumento_mb": round(depois - antes, 1),
+        "top10_ms_p50": round(latencias[len(latencias) // 2], 3),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--escalas", default="10000,100000,500000", help="trechos no docstore")
+    args = parser.parse_args()
+
+    contexto = mp.get_context("spawn")
+    for n in (int(e) for e in args.escalas.split(",")):
+        raiz = Path(tempfile.mkdtemp(prefix="bench_docstore_"))
+        try:
+            gerar(raiz, n)
+            resultado = {
+                "trechos": n,
+                "tamanho_mb": {
+                    "pickle": round((raiz / docstore.LEGACY_FILE).stat().st_size / 2**20, 1),
+                    "sqlite": round((raiz / docstore.DOCSTORE_FILE).stat().st_size / 2**20, 1),
+                },
+            }
+            for formato in ("pickle", "sqlite"):
+                fila = contexto.Queue()
+                processo = contexto.Process(target=medir, args=(formato, str(raiz), n, fila))
+                processo.start()
+                resultado[formato] = fila.get()
+                processo.join()
+            print(json.dumps(resultado, ensure_ascii=False, indent=2), flush=True)
+        finally:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compara os backends de embeddings (:mod:`chatbot.embeddings`).
+
+Os trechos de ``data/bronze/`` são indexados com o backend de referência
+(``torch``, o mesmo do índice em produção) e cada backend codifica as mesmas
+perguntas. O benchmark informa tempo de carga, latência por pergunta
+(p50/p95), concordância dos vetores com a referência (cosseno médio),
+recall@10 da busca no índice de referência e o ganho do cache de perguntas.
+
+Uso (a partir de ``web/``)::
+
+    python -m benchmarks.bench_embeddings --backends torch int8 onnx
+"""
+
+import json
+import time
+import argparse
+
+import numpy as np
+
+from chatbot.embeddings import CachedQueryEmbeddings, criar_embeddings
+from chatbot.knowledge.knowledge import carregar_artigos
+from chatbot.knowledge.chunking import dividir_artigos
+from benchmarks.bench_chunking import perguntas_sinteticas
+from benchmarks.util import percentil
+
+
+def medir(backend: str, perguntas: list[str], matriz_ref: np.ndarray, consultas_ref: np.ndarray, k: int) -> dict:
+    inicio = time.perf_counter()
+    emb = criar_embeddings(backend)
+    carga = time.perf_counter() - inicio
+
+    emb.embed_query("aquecimento")
+    latencias, vetores = [], []
+    for pergunta in perguntas:
+        t = time.perf_counter()
+        vetores.append(emb.embed_query(pergunta))
+        latencias.append(1000 * (time.perf_counter() - t))
+    vetores = np.asarray(vetores, dtype=np.float32)
+
+    cossenos = np.sum(vetores * consultas_ref, axis=1)
+    topk_ref = np.argsort(-(consultas_ref @ matriz_ref.T), axis=1)[:, :k]
+    topk = np.argsort(-(vetores @ matriz_ref.T), axis=1)[:, :k]
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(topk, topk_ref)])
+
+    cache = CachedQueryEmbeddings(emb)
+    for pergunta in perguntas:
+        cache.embed_query(pergunta)
+    t = time.perf_counter()
+    for pergunta in perguntas:
+        cache.embed_query(pergunta)
+    ms_cache = 1000 * (time.perf_counter() - t) / len(perguntas)
+
+    return {
+        "backend": backend,
+        "carga_s": round(carga, 2),
+        "ms_p50": percentil(latencias, 50),
+        "ms_p95": percentil(latencias, 95),
+        "ms_com_cache": round(ms_cache, 4),
+        "cosseno_medio_ref": round(float(np.mean(cossenos)), 4),
+        f"recall@{k}_vs_ref": round(float(recall), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    artigos = carregar_artigos()
+    textos, _ = dividir_artigos(artigos)
+    perguntas = [p for p, _ in perguntas_sinteticas(artigos)]
+
+    referencia = criar_embeddings("torch")
+    matriz_ref = np.asarray(referencia.embed_documents(textos), dtype=np.float32)
+    consultas_ref = np.asarray([referencia.embed_query(p) for p in perguntas], dtype=np.float32)
+
+    resultados = []
+    for backend in args.backends:
+        try:
+            resultados.append(medir(backend, perguntas, matriz_ref, consultas_ref, args.k))
+        except ImportError as e:
+            resultados.append({"backend": backend, "erro": str(e)})
+    print(json.dumps({"trechos": len(textos), "perguntas": len(perguntas), "resultados": resultados},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Avaliação offline da extração heurística (:mod:`crawler.extracao`).
+
+Lê um corpus de páginas reais salvas (por padrão ``benchmarks/html/``, no
+formato que o crawler grava quando ``CRAWLER_HTML_DIR`` está definido: a URL
+num comentário na primeira linha) e informa quantas páginas seriam resolvidas
+sem o LLM. As páginas cuja URL está em ``data/bronze/`` têm como referência o
+texto que o LLM extraiu dela, e para essas também são medidas a cobertura e a
+precisão do texto extraído localmente.
+
+``--capturar`` baixa para o corpus as páginas dos links de ``data/bronze/``
+que ainda não estão nele. Sem nenhum HTML salvo, o benchmark cai num corpus
+sintético (artigos da bronze envolvidos em menus, barras laterais e rodapés,
+mais páginas de listagem) e avisa: esse corpus é gerado com a mesma estrutura
+que a heurística procura, então os números dele não valem para páginas reais.
+
+Uso (a partir de ``web/``)::
+
+    python -m benchmarks.bench_extracao [--html-dir benchmarks/html] [--capturar]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import requests
+
+from crawler.coletor import HEADERS, salvar_html
+from crawler.extracao import extrair_conteudo_principal
+from benchmarks.fakes import carregar_bronze, corpus_sintetico
+
+HTML_DIR = Path(__file__).resolve().parent / "html"
+
+
+def _palavras(texto: str) -> set:
+    return set(re.findall(r"\w+", texto.lower()))
+
+
+def capturar(html_dir: Path, timeout: float = 15.0) -> dict:
+    """Baixa as páginas dos links da bronze que ainda não estão em ``html_dir``."""
+    salvas = {url for url, _ in map(_ler_pagina, html_dir.glob("*.html"))} if html_dir.exists() else set()
+    contagem = {"baixadas": 0, "ja_salvas": 0, "falhas": 0}
+    for artigo in carregar_bronze():
+        url = artigo["link"]
+        if url in salvas:
+            contagem["ja_salvas"] += 1
+            continue
+        try:
+            response = requests.get(url, headers=HEADERS, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Falha ao baixar {url}: {e}", file=sys.stderr)
+            contagem["falhas"] += 1
+            continue
+        salvar_html(html_dir, url, response.text)
+        contagem["baixadas"] += 1
+    return contagem
+
+
+def _ler_pagina(caminho: Path) -> tuple[str | None, str]:
+    """URL (do comentário da primeira linha, se houver) e HTML de uma página salva."""
+    html = caminho.read_text(encoding="utf-8")
+    cabecalho = re.match(r"<!-- (\S+) -->\n", html)
+    return (cabecalho.group(1), html[cabecalho.end():]) if cabecalho else (None, html)
+
+
+def carregar_corpus(html_dir: Path) -> tuple[str, list[dict]]:
+    """``("html", páginas salvas)`` ou, sem nenhuma, ``("sintetico", corpus_sintetico())``."""
+    if html_dir.exists():
+        textos = {artigo["link"]: artigo.get("texto") for artigo in carregar_bronze()}
+        paginas = []
+        for caminho in sorted(html_dir.glob("*.html")):
+            url, html = _ler_pagina(caminho)
+            texto = textos.get(url)
+            paginas.append({"nome": url or caminho.name, "html": html, "texto": texto, "artigo": True if texto else None})
+        if paginas:
+            return "html", paginas
+    return "sintetico", corpus_sintetico()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--html-dir", type=Path, default=HTML_DIR)
+    parser.add_argument("--capturar", action="store_true", help="baixa antes as páginas dos links de data/bronze/")
+    args = parser.parse_args()
+
+    captura = capturar(args.html_dir) if args.capturar else None
+    origem, corpus = carregar_corpus(args.html_dir)
+    if origem == "sintetico":
+        print(
+            f"Aviso: nenhum HTML em {args.html_dir}; usando o corpus sintético, que não mede páginas reais "
+            "(rode com --capturar)",
+            file=sys.stderr,
+        )
+    locais, coberturas, precisoes, falsos_positivos = 0, [], [], 0
+    inicio = time.perf_counter()
+    for pagina in corpus:
+        resultado = extrair_conteudo_principal(pagina["html"])
+        if resultado is None:
+            continue
+        locais += 1
+        if pagina.get("artigo") is False:
+            falsos_positivos += 1
+        elif pagina["texto"]:
+            esperado, obtido = _palavras(pagina["texto"]), _palavras(resultado["texto"])
+            coberturas.append(len(esperado & obtido) / len(esperado))
+            precisoes.append(len(esperado & obtido) / len(obtido))
+    segundos = time.perf_counter() - inicio
+
+    relatorio = {
+        "corpus": origem,
+        "paginas": len(corpus),
+        "paginas_com_referencia": sum(1 for pagina in corpus if pagina.get("texto")),
+        "extraidas_localmente": locais,
+        "llm_evitadas_pct": round(100 * locais / len(corpus), 1) if corpus else 0.0,
+        "falsos_positivos": falsos_positivos,
+        "cobertura_media": round(sum(coberturas) / len(coberturas), 3) if coberturas else None,
+        "precisao_media": round(sum(precisoes) / len(precisoes), 3) if precisoes else None,
+        "ms_por_pagina": round(1000 * segundos / len(corpus), 2) if corpus else 0.0,
+    }
+    if captura is not None:
+        relatorio["captura"] = captura
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
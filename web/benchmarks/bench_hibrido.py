@@ -0,0 +1,160 @@
+"""
+Compara a busca densa com a busca híbrida (FAISS + BM25 fundidos por RRF).
+
+Hoje o ``rag_engine`` busca até ``RERANK_K_MAX`` (10) candidatos densos para
+compensar os termos exatos que o MiniLM perde, e o cross-encoder paga por
+isso. O benchmark indexa os trechos de ``data/bronze/`` e mede, para cada
+configuração:
+
+* recall dos candidatos (alguma notícia esperada entre os que vão ao
+  cross-encoder);
+* recall@5 e MRR da lista final, após o reranqueamento;
+* pares avaliados pelo cross-encoder por pergunta e latência do reranqueamento.
+
+Configurações: densa com k=10 (o reranqueamento adaptativo, sem BM25), densa
+com k=6, só BM25 com k=6, híbrida (10 densos + 10 BM25, fundidos por RRF e
+cortados em 6, como ``HIBRIDO_K``) com todos os pares no cross-encoder e
+híbrida com o atalho por concordância (``HIBRIDO_CONCORDANCIA``, o padrão do
+``rag_engine``). Para cada uma, também a fração de perguntas que pularam o
+cross-encoder. As perguntas são as de
+``perguntas_ouro.json`` (muitas com siglas, como SEEDF e TCDF) mais as
+perguntas sintéticas de :mod:`benchmarks.bench_chunking`.
+
+Uso (a partir de ``web/``; requer ``sentence-transformers``)::
+
+    python -m benchmarks.bench_hibrido [--hibrido-k 6] [--k-max 10]
+"""
+
+import json
+import time
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+from sentence_transformers import SentenceTransformer, CrossEncoder
+
+from chatbot import bm25
+from chatbot.reranking import AdaptiveReranker
+from chatbot.knowledge.chunking import dividir_artigos
+from benchmarks.bench_chunking import perguntas_sinteticas
+from benchmarks.fakes import PERGUNTAS_OURO, carregar_bronze
+from benchmarks.util import percentil
+
+
+def concordam(reranker: AdaptiveReranker, densos, fundidos) -> bool:
+    """O critério de ``RerankingRetriever._concordam``, com as similaridades densas já convertidas."""
+    n = reranker.top_n
+    return reranker.decisivo([s for _, s in densos]) and {p for p, _ in densos[:n]} == {p for p, _ in fundidos[:n]}
+
+
+def avaliar(nome: str, perguntas, buscar, reranker: AdaptiveReranker, adaptativo: bool, trechos, atalho=None) -> dict:
+    """
+    ``buscar(pergunta, vetor)`` devolve pares ``(posição, score)`` na ordem em que
+    vão ao reranqueamento; ``atalho(reranker, pergunta, vetor)``, se pode pular o cross-encoder.
+    """
+    candidatos_ok, acertos, rr, pares, latencias = 0, 0, 0.0, [], []
+    for pergunta, vetor, esperados in perguntas:
+        candidatos = [(trechos[pos], score) for pos, score in buscar(pergunta, vetor)]
+        if {doc.metadata["link"] for doc, _ in candidatos} & esperados:
+            candidatos_ok += 1
+
+        antes = reranker.stats()["pares_reranqueados"]
+        pular = atalho(reranker, pergunta, vetor) if atalho is not None else False
+        inicio = time.perf_counter()
+        docs = reranker.rerank(pergunta, candidatos, adaptativo=adaptativo, atalho=pular)
+        latencias.append(1000 * (time.perf_counter() - inicio))
+        pares.append(reranker.stats()["pares_reranqueados"] - antes)
+
+        ranking = list(dict.fromkeys(doc.metadata["link"] for doc in docs))
+        posicao = next((i for i, link in enumerate(ranking) if link in esperados), None)
+        if posicao is not None:
+            acertos += 1
+            rr += 1 / (posicao + 1)
+    n = len(perguntas)
+    return {
+        "config": nome,
+        "recall_candidatos": round(candidatos_ok / n, 3),
+        f"recall@{reranker.top_n}": round(acertos / n, 3),
+        "mrr": round(rr / n, 3),
+        "pares_por_pergunta": round(float(np.mean(pares)), 2),
+        "taxa_pulo": reranker.stats()["taxa_pulo"],
+        "rerank_ms_p50": percentil(latencias, 50),
+        "rerank_ms_p95": percentil(latencias, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k-max", type=int, default=10, help="candidatos densos do modo atual")
+    parser.add_argument("--hibrido-k", type=int, default=6, help="candidatos da fusão que vão ao cross-encoder")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    args = parser.parse_args()
+
+    artigos = carregar_bronze()
+    textos, metadados = dividir_artigos(artigos)
+    trechos = [SimpleNamespace(page_content=t, metadata=m) for t, m in zip(textos, metadados)]
+
+    bi = SentenceTransformer("all-MiniLM-L6-v2")
+    cross = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    matriz = bi.encode(textos, batch_size=64, normalize_embeddings=True)
+
+    inicio = time.perf_counter()
+    lexico = bm25.IndiceBM25()
+    lexico.adicionar(textos)
+    construcao_s = time.perf_counter() - inicio
+
+    with open(PERGUNTAS_OURO, encoding="utf-8") as f:
+        ouro = [(item["pergunta"], set(item["links"])) for item in json.load(f)]
+    sinteticas = [(pergunta, {link}) for pergunta, link in perguntas_sinteticas(artigos)]
+
+    def densos(vetor, k):
+        sims = matriz @ vetor
+        melhores = np.argsort(-sims)[:k]
+        return [(int(i), float(sims[i])) for i in melhores]
+
+    def hibrido(pergunta, vetor):
+        fundidos = bm25.fundir_rrf(
+            [[pos for pos, _ in densos(vetor, args.k_max)], [pos for pos, _ in lexico.buscar(pergunta, args.k_max)]],
+            k=args.rrf_k,
+        )
+        return fundidos[:args.hibrido_k]
+
+    def concordancia(reranker, pergunta, vetor):
+        return concordam(reranker, densos(vetor, args.k_max), hibrido(pergunta, vetor))
+
+    configs = [
+        (f"denso_k{args.k_max}", lambda p, v: densos(v, args.k_max), True, None),
+        (f"denso_k{args.hibrido_k}", lambda p, v: densos(v, args.hibrido_k), True, None),
+        (f"bm25_k{args.hibrido_k}", lambda p, v: lexico.buscar(p, args.hibrido_k), False, None),
+        (f"hibrido_k{args.hibrido_k}", hibrido, False, None),
+        (f"hibrido_k{args.hibrido_k}_concordancia", hibrido, False, concordancia),
+    ]
+
+    latencias_bm25 = []
+    relatorio = {
+        "trechos": len(textos),
+        "termos_bm25": lexico.termos,
+        "construcao_bm25_s": round(construcao_s, 3),
+        "conjuntos": {},
+    }
+    for conjunto, perguntas in (("ouro", ouro), ("sinteticas", sinteticas)):
+        vetores = bi.encode([p for p, _ in perguntas], normalize_embeddings=True)
+        preparadas = [(p, v, esperados) for (p, esperados), v in zip(perguntas, vetores)]
+        for pergunta, _, _ in preparadas:
+            inicio = time.perf_counter()
+            lexico.buscar(pergunta, args.k_max)
+            latencias_bm25.append(1000 * (time.perf_counter() - inicio))
+        resultados = []
+        for nome, buscar, adaptativo, atalho in configs:
+            reranker = AdaptiveReranker(cross, top_n=args.top_n, k_min=args.top_n, k_max=args.k_max)
+            resultados.append(avaliar(nome, preparadas, buscar, reranker, adaptativo, trechos, atalho))
+        relatorio["conjuntos"][conjunto] = {"perguntas": len(perguntas), "resultados": resultados}
+
+    relatorio["bm25_busca_ms_p50"] = percentil(latencias_bm25, 50)
+    relatorio["bm25_busca_ms_p95"] = percentil(latencias_bm25, 95)
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
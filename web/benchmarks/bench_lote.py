@@ -0,0 +1,152 @@
+"""
+Vazão do ``/ask/batch/`` contra N chamadas sequenciais a ``answer_question``.
+
+Usa o mesmo índice de teste e o mesmo :class:`benchmarks.fake_llm.FakeChatLLM`
+de :mod:`benchmarks.bench_rag`, com os caches de embeddings e semântico
+desativados, e responde às mesmas ``--perguntas`` perguntas (as de
+``perguntas_ouro.json`` mais as sintéticas de :mod:`benchmarks.bench_chunking`)
+de três formas:
+
+* **sequencial**: um ``answer_question`` por pergunta, como um cliente que
+  chama o ``/ask/`` em laço;
+* **lote**: um único ``answer_batch`` com todas (o que o ``/ask/batch/`` faz);
+* **views.ask_batch**: a requisição JSON completa pelo ``RequestFactory``.
+
+Para cada forma, reporta o tempo total, perguntas por segundo e quantas
+chamadas foram feitas ao modelo de embeddings, ao índice, ao cross-encoder e
+ao LLM (e o pico de chamadas simultâneas ao LLM). Também confere se as fontes
+devolvidas pelo lote são as mesmas da forma sequencial.
+
+Uso (a partir de ``web/``; requer as dependências do projeto)::
+
+    python -m benchmarks.bench_lote [--perguntas 100] [--latencia-llm 0.3] [--concorrencia-llm 4]
+"""
+
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from collections import Counter
+
+# importar bench_rag configura o Django (django.setup) antes das views
+from benchmarks.bench_rag import montar_indice
+from benchmarks.bench_chunking import perguntas_sinteticas
+from benchmarks.fake_llm import FakeChatLLM
+from benchmarks.fakes import PERGUNTAS_OURO, carregar_bronze
+from django.test import RequestFactory
+
+from chatbot import rag_engine, views
+
+
+class Contadores:
+    """Substitui métodos por versões que contam as chamadas (e, no LLM, o pico de simultâneas)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chamadas = Counter()
+        self.simultaneas = 0
+        self.pico = 0
+
+    def contar(self, dono, atributo: str, nome: str, simultaneas: bool = False):
+        original = getattr(dono, atributo)
+
+        def contado(*args, **kwargs):
+            with self._lock:
+                self.chamadas[nome] += 1
+                if simultaneas:
+                    self.simultaneas += 1
+                    self.pico = max(self.pico, self.simultaneas)
+            try:
+                return original(*args, **kwargs)
+            finally:
+                if simultaneas:
+                    with self._lock:
+                        self.simultaneas -= 1
+
+        setattr(dono, atributo, contado)
+
+    def zerar(self):
+        with self._lock:
+            self.chamadas.clear()
+            self.pico = 0
+
+    def resumo(self) -> dict:
+        with self._lock:
+            return {**{f"chamadas_{nome}": n for nome, n in sorted(self.chamadas.items())}, "pico_llm_simultaneas": self.pico}
+
+
+def medir(nome: str, funcao, perguntas: list[str], contadores: Contadores) -> tuple[dict, list]:
+    contadores.zerar()
+    inicio = time.perf_counter()
+    respostas = funcao(perguntas)
+    segundos = time.perf_counter() - inicio
+    return {
+        "forma": nome,
+        "perguntas": len(perguntas),
+        "segundos": round(segundos, 3),
+        "perguntas_por_s": round(len(perguntas) / segundos, 2),
+        "falhas": sum(1 for r in respostas if "erro" in r),
+        **contadores.resumo(),
+    }, respostas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--perguntas", type=int, default=100, help="tamanho do lote")
+    parser.add_argument("--latencia-llm", type=float, default=0.3, help="atraso (s) do LLM falso")
+    parser.add_argument("--concorrencia-llm", type=int, default=rag_engine.BATCH_LLM_CONCORRENTES,
+                        help="gerações simultâneas do lote (BATCH_LLM_CONCORRENTES)")
+    parser.add_argument("--rerank-lote", type=int, default=rag_engine.RERANK_LOTE,
+                        help="pares por lote do cross-encoder (RERANK_LOTE)")
+    args = parser.parse_args()
+
+    with open(PERGUNTAS_OURO, encoding="utf-8") as f:
+        perguntas = [item["pergunta"] for item in json.load(f)]
+    perguntas += [pergunta for pergunta, _ in perguntas_sinteticas(carregar_bronze())]
+    # sufixos distintos: sem o cache semântico nem a deduplicação do lote, cada pergunta roda o pipeline inteiro
+    perguntas = [f"{perguntas[i % len(perguntas)]} ({i})" for i in range(args.perguntas)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        relatorio = {"parametros": vars(args), "fixture": montar_indice(Path(tmp) / "FAISS")}
+        rag_engine.FAISS_DIR = str(Path(tmp) / "FAISS")
+        rag_engine.INDEX_POLL_INTERVAL = 0
+        rag_engine.BATCH_LLM_CONCORRENTES = args.concorrencia_llm
+        rag_engine.RERANK_LOTE = args.rerank_lote
+        rag_engine.llm = FakeChatLLM(latencia=args.latencia_llm)
+        rag_engine.init_components()
+        rag_engine.warmup()
+        rag_engine.embeddings.max_entries = 0
+        rag_engine.semantic_cache.max_entries = 0
+
+        contadores = Contadores()
+        contadores.contar(rag_engine.embeddings.base, "embed_query", "embeddings")
+        contadores.contar(rag_engine.embeddings.base, "embed_documents", "embeddings")
+        contadores.contar(rag_engine.reranker.cross_encoder, "predict", "cross_encoder")
+        contadores.contar(FakeChatLLM, "_generate", "llm", simultaneas=True)
+        with rag_engine.index_manager.acquire() as handle:
+            contadores.contar(handle.value["vector_store"].index, "search", "indice")
+
+        fabrica = RequestFactory()
+
+        def pela_view(lote):
+            request = fabrica.post("/ask/batch/", data=json.dumps({"perguntas": lote}), content_type="application/json")
+            return json.loads(views.ask_batch(request).content)["resultados"]
+
+        sequencial, esperadas = medir(
+            "sequencial", lambda lote: [rag_engine.answer_question(p) for p in lote], perguntas, contadores
+        )
+        lote, respostas = medir("lote", rag_engine.answer_batch, perguntas, contadores)
+        view, _ = medir("views.ask_batch", pela_view, perguntas, contadores)
+        rag_engine.index_manager.stop()
+
+    iguais = sum(1 for a, b in zip(esperadas, respostas) if a.get("fontes") == b.get("fontes"))
+    relatorio["resultados"] = [sequencial, lote, view]
+    relatorio["aceleracao_lote"] = round(sequencial["segundos"] / lote["segundos"], 2)
+    relatorio["fontes_iguais_ao_sequencial"] = f"{iguais}/{len(perguntas)}"
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Mede a memória residente por worker com o índice copiado e com o índice mapeado.
+
+Gera uma matriz de vetores sintéticos no formato ``vetores.npy`` publicado
+por :func:`chatbot.index_store.publish` e sobe ``--workers`` processos, como os
+workers do gunicorn/uvicorn. Cada worker carrega o índice e faz buscas que
+percorrem todos os vetores:
+
+* ``copia``: os vetores são lidos para a memória do processo, como faz
+  ``FAISS.load_local`` (o ``IndexFlatL2`` guarda os vetores em memória própria);
+* ``mmap``: os vetores são abertos com :class:`chatbot.mmap_index.MmapFlatIndex`.
+
+Com todos os workers vivos ao mesmo tempo, cada um lê de ``/proc/self`` o RSS
+(que conta as páginas compartilhadas inteiras), o PSS (que divide as páginas
+compartilhadas entre os processos) e a parte anônima (privada) do RSS. A soma
+dos PSS é a memória realmente ocupada pelo conjunto. Requer Linux.
+
+Uso (a partir de ``web/``)::
+
+    python -m benchmarks.bench_memoria [--vetores 200000] [--dim 384] [--workers 4]
+"""
+
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+
+from chatbot.mmap_index import MmapFlatIndex, VECTORS_FILE
+
+
+def gerar_vetores(caminho: Path, n: int, dim: int, semente: int = 0):
+    rnd = np.random.default_rng(semente)
+    vetores = np.lib.format.open_memmap(caminho, mode="w+", dtype=np.float32, shape=(n, dim))
+    for inicio in range(0, n, 50000):
+        bloco = rnd.standard_normal((min(50000, n - inicio), dim), dtype=np.float32)
+        vetores[inicio:inicio + len(bloco)] = bloco / np.linalg.norm(bloco, axis=1, keepdims=True)
+    vetores.flush()
+    del vetores
+
+
+def memoria_processo() -> dict:
+    """RSS, PSS e RSS anônimo do processo atual, em MB."""
+    campos = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for linha in f:
+            partes = linha.split()
+            if partes[0] in ("Rss:", "Pss:", "Anonymous:"):
+                campos[partes[0][:-1].lower()] = int(partes[1]) / 1024
+    return {"rss_mb": round(campos["rss"], 1), "pss_mb": round(campos["pss"], 1),
+            "anon_mb": round(campos["anonymous"], 1)}
+
+
+def worker(modo: str, caminho: str, consultas: int, barreira, fila):
+    inicio = time.perf_counter()
+    index = MmapFlatIndex(caminho)
+    if modo == "copia":
+        index.vetores = np.array(index.vetores)
+    carga = time.perf_counter() - inicio
+
+    rnd = np.random.default_rng()
+    inicio = time.perf_counter()
+    for _ in range(consultas):
+        index.search(rnd.standard_normal((1, index.d), dtype=np.float32), 10)
+    busca = (time.perf_counter() - inicio) / consultas
+
+    # mede com todos os workers carregados, para o PSS dividir as páginas compartilhadas
+    barreira.wait()
+    fila.put({"carga_ms": round(1000 * carga, 1), "busca_ms": round(1000 * busca, 2), **memoria_processo()})
+    barreira.wait()
+
+
+def medir(modo: str, caminho: Path, workers: int, consultas: int) -> dict:
+    contexto = mp.get_context("fork")
+    barreira = contexto.Barrier(workers)
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=worker, args=(modo, str(caminho), consultas, barreira, fila))
+        for _ in range(workers)
+    ]
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+
+    media = {chave: round(float(np.mean([r[chave] for r in resultados])), 2) for chave in resultados[0]}
+    media["pss_total_mb"] = round(sum(r["pss_mb"] for r in resultados), 1)
+    return media
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vetores", type=int, default=200000, help="vetores no índice")
+    parser.add_argument("--dim", type=int, default=384, help="dimensão (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--workers", type=int, default=4, help="processos simultâneos")
+    parser.add_argument("--consultas", type=int, default=20, help="buscas por worker")
+    args = parser.parse_args()
+
+    raiz = Path(tempfile.mkdtemp(prefix="bench_memoria_"))
+    try:
+        caminho = raiz / VECTORS_FILE
+        gerar_vetores(caminho, args.vetores, args.dim)
+        resultado = {
+            "vetores": args.vetores,
+            "dim": args.dim,
+            "tamanho_indice_mb": round(caminho.stat().st_size / 2**20, 1),
+            "workers": args.workers,
+            "por_worker": {modo: medir(modo, caminho, args.workers, args.consultas) for modo in ("copia", "mmap")},
+        }
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Mede o pipeline do ``/ask/`` de ponta a ponta, sem Gemini nem Tavily.
+
+O benchmark monta um índice de teste com os artigos de ``data/bronze/`` (os
+mesmos trechos, embeddings e tipo de índice do ``build_faiss.py``), troca o
+LLM do :mod:`chatbot.rag_engine` por :class:`benchmarks.fake_llm.FakeChatLLM`
+e mede:
+
+* qualidade da recuperação contra ``benchmarks/perguntas_ouro.json``
+  (perguntas em português com os links das notícias que as respondem):
+  recall@k e MRR dos candidatos (FAISS ou fusão FAISS + BM25), da lista
+  final após o reranqueamento e das fontes devolvidas por ``answer_question``. O recall@k
+  é a fração de perguntas com ao menos um link esperado entre os ``k``
+  primeiros artigos;
+* vazão e latência p50/p95/p99 de ``answer_question`` e de ``views.ask``
+  (requisição JSON pelo ``RequestFactory`` do Django), com ``--concorrencia``
+  threads, e de cada etapa: embedding da pergunta, busca de candidatos,
+  reranqueamento e LLM;
+* a rota ``update_news`` em modo teste, com um :class:`benchmarks.fakes.FakeTavily`
+  apontando para páginas de um servidor HTTP local.
+
+Os caches de embeddings e semântico são desativados (a menos que se passe
+``--caches``), já que as mesmas perguntas se repetem a cada rodada.
+
+O resultado é um JSON com o commit e os parâmetros da execução. Para comparar
+duas execuções (por exemplo, antes e depois de uma mudança)::
+
+    python -m benchmarks.bench_rag --saida benchmarks/resultados/$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_rag --comparar benchmarks/resultados/<commit-anterior>.json
+
+Uso (a partir de ``web/``; requer as dependências do projeto)::
+
+    python -m benchmarks.bench_rag [--repeticoes 3] [--concorrencia 4] [--latencia-llm 0.3]
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# o benchmark controla a inicialização do rag_engine; as chaves só satisfazem
+# os módulos que as exigem ao serem importados (nenhuma API é chamada)
+os.environ["RAG_STARTUP"] = "lazy"
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web.settings")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+import django
+
+django.setup()
+
+from django.test import RequestFactory
+
+from chatbot import ann, bm25, index_store, rag_engine, views
+from chatbot.embeddings import criar_embeddings
+from chatbot.knowledge.chunking import dividir_artigos
+from chatbot.reranking import AdaptiveReranker, RerankingRetriever
+from benchmarks.fake_llm import FakeChatLLM
+from benchmarks.fakes import PERGUNTAS_OURO, FakeTavily, FakeExtratorLLM, ServidorLocal, carregar_bronze
+from benchmarks.util import percentil
+
+
+class Cronometro:
+    """Acumula as durações (ms) de cada etapa, vindas de várias threads."""
+
+    def __init__(self):
+        self.amostras = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa: str, ms: float):
+        with self._lock:
+            self.amostras[etapa].append(ms)
+
+    def medir(self, etapa: str, funcao, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            self.registrar(etapa, 1000 * (time.perf_counter() - inicio))
+
+    def envolver(self, dono, atributo: str, etapa: str):
+        """Substitui ``dono.atributo`` por uma versão cronometrada."""
+        original = getattr(dono, atributo)
+
+        def cronometrado(*args, **kwargs):
+            return self.medir(etapa, original, *args, **kwargs)
+
+        setattr(dono, atributo, cronometrado)
+
+    def limpar(self):
+        with self._lock:
+            self.amostras.clear()
+
+    def resumo(self) -> dict:
+        with self._lock:
+            return {
+                etapa: {
+                    "n": len(valores),
+                    "media_ms": round(float(np.mean(valores)), 2),
+                    "p50_ms": percentil(valores, 50),
+                    "p95_ms": percentil(valores, 95),
+                    "p99_ms": percentil(valores, 99),
+                }
+                for etapa, valores in self.amostras.items()
+            }
+
+
+def montar_indice(destino: Path) -> dict:
+    """Publica em ``destino`` um índice com os artigos da camada bronze."""
+    inicio = time.perf_counter()
+    textos, metadados = dividir_artigos(carregar_bronze())
+    embeddings = criar_embeddings()
+    vetores = embeddings.embed_documents(textos)
+    vector_store = ann.criar_vector_store(list(zip(textos, vetores)), embeddings, metadados)
+    lexico = bm25.IndiceBM25()
+    lexico.adicionar(textos)
+    versao = index_store.publish(vector_store, destino, bm25=lexico)
+    return {
+        "trechos": len(textos),
+        "indice": ann.descrever(vector_store.index),
+        "versao": versao,
+        "segundos": round(time.perf_counter() - inicio, 2),
+    }
+
+
+def links_unicos(docs) -> list[str]:
+    return list(dict.fromkeys(getattr(doc, "metadata", {}).get("link") for doc in docs))
+
+
+def metricas(rankings: list[list[str]], esperados: list[set], ks: tuple[int, ...]) -> dict:
+    """recall@k (fração de perguntas com um link esperado no top-k) e MRR."""
+    resultado = {}
+    for k in ks:
+        acertos = sum(bool(set(ranking[:k]) & relevantes) for ranking, relevantes in zip(rankings, esperados))
+        resultado[f"recall@{k}"] = round(acertos / len(rankings), 3)
+    rr = 0.0
+    for ranking, relevantes in zip(rankings, esperados):
+        posicao = next((i for i, link in enumerate(ranking) if link in relevantes), None)
+        rr += 0.0 if posicao is None else 1 / (posicao + 1)
+    resultado["mrr"] = round(rr / len(rankings), 3)
+    return resultado
+
+
+def avaliar_recuperacao(perguntas: list[dict]) -> dict:
+    """Recall@k e MRR antes e depois do reranqueamento, sem passar pelo LLM."""
+    esperados = [set(item["links"]) for item in perguntas]
+    iniciais, finais = [], []
+    with rag_engine.index_manager.acquire() as handle:
+        retriever = handle.value["retriever"]
+        for item in perguntas:
+            vetor = rag_engine._embed_query(item["pergunta"])
+            candidatos = retriever.candidatos(item["pergunta"], vetor)
+            iniciais.append(links_unicos(doc for doc, _ in candidatos))
+            finais.append(links_unicos(retriever.reranquear(item["pergunta"], candidatos)))
+    return {
+        "candidatos": metricas(iniciais, esperados, (1, 3, 5, 10)),
+        "rerank": metricas(finais, esperados, (1, 3, 5)),
+    }
+
+
+def medir_carga(nome: str, alvo, perguntas: list[str], concorrencia: int, cronometro: Cronometro) -> tuple[dict, list]:
+    """Dispara ``alvo(pergunta)`` para todas as perguntas e mede vazão e latência por etapa."""
+    cronometro.limpar()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(lambda p: cronometro.medir(nome, alvo, p), perguntas))
+    segundos = time.perf_counter() - inicio
+    return {
+        "requisicoes": len(perguntas),
+        "concorrencia": concorrencia,
+        "segundos": round(segundos, 3),
+        "vazao_rps": round(len(perguntas) / segundos, 2),
+        "etapas": cronometro.resumo(),
+    }, resultados
+
+
+def chamar_ask(fabrica: RequestFactory, pergunta: str) -> dict:
+    request = fabrica.post("/ask/", data=json.dumps({"pergunta": pergunta}), content_type="application/json")
+    resposta = views.ask(request)
+    if resposta.status_code != 200:
+        raise RuntimeError(f"/ask/ respondeu {resposta.status_code}: {resposta.content[:200]!r}")
+    return json.loads(resposta.content)
+
+
+def medir_coleta(fabrica: RequestFactory, pasta: Path, urls: int, latencia_http: float, latencia_llm: float) -> dict:
+    """Chama ``update_news`` em modo teste com o Tavily falso e um servidor local."""
+    from crawler import crawler_exec
+
+    # estado e impressões da coleta ficam na pasta temporária, não em data/
+    crawler_exec.ESTADO_PATH = pasta / "crawler_estado.sqlite3"
+    crawler_exec.PROCESSED_URLS_LOG = pasta / "processed_urls.log"
+    crawler_exec.IMPRESSOES_PATH = pasta / "duplicatas.sqlite3"
+    crawler_exec.extrair_artigo_com_llm = FakeExtratorLLM(latencia_llm)
+
+    with ServidorLocal(latencia_http) as servidor:
+        crawler_exec.tavily = FakeTavily([f"{servidor.url}/noticia/{i}" for i in range(urls)])
+        inicio = time.perf_counter()
+        resposta = views.update_news(fabrica.get("/update_news/", {"teste": "1"}))
+        segundos = time.perf_counter() - inicio
+    dados = json.loads(resposta.content)
+    return {
+        "urls": min(urls, 5),  # executar_coleta pede max_results=5 ao Tavily
+        "status": dados.get("status"),
+        "artigos": dados.get("qtde_artigos"),
+        "segundos": round(segundos, 3),
+    }
+
+
+def commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual: dict, anterior: dict) -> dict:
+    """Diferenças de vazão, latências e qualidade entre duas execuções."""
+    def delta(a, b):
+        return {"antes": b, "depois": a, "variacao_pct": round(100 * (a - b) / b, 1) if b else None}
+
+    diferencas = {"commits": [anterior.get("commit"), atual.get("commit")]}
+    for cenario in ("answer_question", "views.ask"):
+        if cenario not in atual or cenario not in anterior:
+            continue
+        diferencas[cenario] = {"vazao_rps": delta(atual[cenario]["vazao_rps"], anterior[cenario]["vazao_rps"])}
+        for etapa, valores in atual[cenario]["etapas"].items():
+            if etapa in anterior[cenario]["etapas"]:
+                diferencas[cenario][etapa] = {
+                    p: delta(valores[p], anterior[cenario]["etapas"][etapa][p]) for p in ("p50_ms", "p95_ms", "p99_ms")
+                }
+    for grupo, valores in atual.get("qualidade", {}).items():
+        for metrica, valor in valores.items():
+            antes = anterior.get("qualidade", {}).get(grupo, {}).get(metrica)
+            if antes is not None and antes != valor:
+                diferencas.setdefault("qualidade", {})[f"{grupo}.{metrica}"] = delta(valor, antes)
+    return diferencas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticoes", type=int, default=3, help="rodadas do conjunto de perguntas por cenário")
+    parser.add_argument("--concorrencia", type=int, default=4, help="requisições simultâneas")
+    parser.add_argument("--latencia-llm", type=float, default=0.3, help="atraso (s) do LLM falso")
+    parser.add_argument("--latencia-http", type=float, default=0.05, help="atraso (s) do servidor da coleta")
+    parser.add_argument("--perguntas", default=str(PERGUNTAS_OURO), help="conjunto de perguntas com links esperados")
+    parser.add_argument("--caches", action="store_true", help="mantém os caches de embeddings e semântico")
+    parser.add_argument("--sem-coleta", action="store_true", help="não mede a rota update_news")
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    parser.add_argument("--comparar", help="resultado anterior (JSON) para comparar com esta execução")
+    args = parser.parse_args()
+
+    with open(args.perguntas, encoding="utf-8") as f:
+        perguntas = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = Path(tmp)
+        relatorio = {
+            "commit": commit_atual(),
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "parametros": {
+                **vars(args),
+                "perguntas": len(perguntas),
+                "index_type": ann.FAISS_INDEX_TYPE,
+                "rerank_top_n": rag_engine.RERANK_TOP_N,
+                "rerank_k_max": rag_engine.RERANK_K_MAX,
+                "bm25": rag_engine.BM25_ATIVO,
+                "hibrido_k": rag_engine.HIBRIDO_K,
+            },
+            "fixture": montar_indice(pasta / "FAISS"),
+        }
+
+        rag_engine.FAISS_DIR = str(pasta / "FAISS")
+        rag_engine.INDEX_POLL_INTERVAL = 0
+        rag_engine.llm = FakeChatLLM(latencia=args.latencia_llm)
+        inicio = time.perf_counter()
+        rag_engine.init_components()
+        rag_engine.warmup(com_llm=True)
+        relatorio["inicializacao_s"] = round(time.perf_counter() - inicio, 2)
+        if not args.caches:
+            rag_engine.embeddings.max_entries = 0
+            rag_engine.semantic_cache.max_entries = 0
+
+        relatorio["qualidade"] = avaliar_recuperacao(perguntas)
+
+        cronometro = Cronometro()
+        cronometro.envolver(rag_engine, "_embed_query", "embedding")
+        cronometro.envolver(RerankingRetriever, "_buscar", "candidatos")
+        cronometro.envolver(AdaptiveReranker, "rerank", "rerank")
+        cronometro.envolver(FakeChatLLM, "_generate", "llm")
+
+        rodada = [item["pergunta"] for item in perguntas] * args.repeticoes
+        relatorio["answer_question"], respostas = medir_carga(
+            "answer_question", rag_engine.answer_question, rodada, args.concorrencia, cronometro
+        )
+        esperados = [set(item["links"]) for item in perguntas]
+        relatorio["qualidade"]["fontes"] = metricas(
+            [[fonte["link"] for fonte in r["fontes"]] for r in respostas[:len(perguntas)]], esperados, (1, 3)
+        )
+
+        fabrica = RequestFactory()
+        relatorio["views.ask"], _ = medir_carga(
+            "views.ask", lambda p: chamar_ask(fabrica, p), rodada, args.concorrencia, cronometro
+        )
+        relatorio["reranker"] = rag_engine.reranker.stats()
+
+        if not args.sem_coleta:
+            relatorio["update_news"] = medir_coleta(
+                fabrica, pasta, urls=5, latencia_http=args.latencia_http, latencia_llm=args.latencia_llm
+            )
+        rag_engine.index_manager.stop()
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            relatorio["comparacao"] = comparar(relatorio, json.load(f))
+
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    print(texto)
+    if args.saida:
+        Path(args.saida).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.saida).write_text(texto + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Teste de carga do ``/ask/`` com um LLM falso lento: coalescência e admissão.
+
+Usa o mesmo índice de teste e o mesmo :class:`benchmarks.fake_llm.FakeChatLLM`
+de :mod:`benchmarks.bench_rag`, com o cache semântico desativado, e mede dois
+cenários pela view ``views.ask``:
+
+* **rajada**: ``--usuarios`` pedidos simultâneos da mesma pergunta (metade com
+  pequenas variações de caixa, espaços e pontuação), com e sem a coalescência.
+  Reporta chamadas ao LLM, latência p50/p95 e status;
+* **sobrecarga**: perguntas diferentes (sem coalescência) com mais requisições
+  simultâneas do que ``LLM_MAX_CONCORRENTES + LLM_MAX_FILA``. Reporta quantas
+  foram admitidas e quantas receberam ``503``, quanto tempo levou para o ``503``
+  sair, os ``Retry-After`` sugeridos e o máximo de chamadas simultâneas ao LLM
+  observado (que não pode passar do limite).
+
+Uso (a partir de ``web/``; requer as dependências do projeto)::
+
+    python -m benchmarks.bench_sobrecarga [--usuarios 50] [--latencia-llm 2] [--max-concorrentes 4]
+"""
+
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# importar bench_rag configura o Django (django.setup) antes das views
+from benchmarks.bench_rag import montar_indice
+from benchmarks.util import percentil
+from benchmarks.fake_llm import FakeChatLLM
+from benchmarks.fakes import PERGUNTAS_OURO
+from django.test import RequestFactory
+
+from chatbot import rag_engine, views
+from chatbot.concorrencia import ControleAdmissao, SingleFlight
+
+
+class Observador:
+    """Conta as chamadas a ``FakeChatLLM._generate`` e o pico de chamadas simultâneas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zerar()
+        original = FakeChatLLM._generate
+
+        def observado(llm, *args, **kwargs):
+            with self._lock:
+                self.chamadas += 1
+                self.simultaneas += 1
+                self.pico = max(self.pico, self.simultaneas)
+            try:
+                return original(llm, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.simultaneas -= 1
+
+        FakeChatLLM._generate = observado
+
+    def zerar(self):
+        self.chamadas = 0
+        self.simultaneas = 0
+        self.pico = 0
+
+
+def pedir(fabrica: RequestFactory, pergunta: str) -> tuple[int, str | None, float]:
+    """``(status, Retry-After, ms)`` de uma chamada a ``views.ask``."""
+    inicio = time.perf_counter()
+    request = fabrica.post("/ask/", data=json.dumps({"pergunta": pergunta}), content_type="application/json")
+    resposta = views.ask(request)
+    return resposta.status_code, resposta.get("Retry-After"), 1000 * (time.perf_counter() - inicio)
+
+
+def disparar(fabrica: RequestFactory, observador: Observador, perguntas: list[str]) -> dict:
+    """Envia todas as perguntas ao mesmo tempo (uma thread por pergunta)."""
+    observador.zerar()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(perguntas)) as executor:
+        resultados = list(executor.map(lambda p: pedir(fabrica, p), perguntas))
+    ok = [ms for status, _, ms in resultados if status == 200]
+    recusadas = [ms for status, _, ms in resultados if status == 503]
+    return {
+        "requisicoes": len(perguntas),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "status": dict(Counter(status for status, _, _ in resultados)),
+        "chamadas_llm": observador.chamadas,
+        "pico_llm_simultaneas": observador.pico,
+        "ok_ms_p50": percentil(ok, 50),
+        "ok_ms_p95": percentil(ok, 95),
+        "recusa_ms_p50": percentil(recusadas, 50),
+        "recusa_ms_p95": percentil(recusadas, 95),
+        "retry_after": dict(Counter(r for status, r, _ in resultados if status == 503)),
+    }
+
+
+def variacoes(pergunta: str, n: int) -> list[str]:
+    """``n`` cópias da pergunta, metade com diferenças de caixa, espaços e pontuação."""
+    formas = [pergunta, pergunta.lower(), f"  {pergunta}  ", pergunta.rstrip("?") + " ?"]
+    return [formas[i % len(formas)] if i % 2 else pergunta for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--usuarios", type=int, default=50, help="requisições simultâneas em cada cenário")
+    parser.add_argument("--latencia-llm", type=float, default=2.0, help="atraso (s) do LLM falso")
+    parser.add_argument("--max-concorrentes", type=int, default=4)
+    parser.add_argument("--max-fila", type=int, default=8)
+    parser.add_argument("--max-espera", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(PERGUNTAS_OURO, encoding="utf-8") as f:
+        perguntas = [item["pergunta"] for item in json.load(f)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        relatorio = {"parametros": vars(args), "fixture": montar_indice(Path(tmp) / "FAISS")}
+        rag_engine.FAISS_DIR = str(Path(tmp) / "FAISS")
+        rag_engine.INDEX_POLL_INTERVAL = 0
+        rag_engine.llm = FakeChatLLM(latencia=args.latencia_llm)
+        rag_engine.init_components()
+        rag_engine.warmup()
+        rag_engine.semantic_cache.max_entries = 0
+        fabrica = RequestFactory()
+        observador = Observador()
+
+        def configurar(coalescer: bool, max_concorrentes: int):
+            rag_engine.admissao = ControleAdmissao(max_concorrentes, args.max_fila, args.max_espera)
+            rag_engine.single_flight = (
+                SingleFlight(rag_engine.SEMANTIC_CACHE_THRESHOLD, rag_engine.COALESCER_MAX_ESPERA) if coalescer else None
+            )
+
+        rajada = variacoes(perguntas[0], args.usuarios)
+        relatorio["rajada"] = {}
+        for nome, coalescer in (("sem_coalescencia", False), ("com_coalescencia", True)):
+            # sem limite de admissão, para isolar o efeito da coalescência
+            configurar(coalescer, max_concorrentes=0)
+            relatorio["rajada"][nome] = disparar(fabrica, observador, rajada)
+
+        distintas = [perguntas[i % len(perguntas)] + f" (pedido {i})" for i in range(args.usuarios)]
+        relatorio["sobrecarga"] = {}
+        for nome, limite in (("sem_admissao", 0), ("com_admissao", args.max_concorrentes)):
+            configurar(False, max_concorrentes=limite)
+            relatorio["sobrecarga"][nome] = disparar(fabrica, observador, distintas)
+        relatorio["sobrecarga"]["com_admissao"]["controle"] = rag_engine.admissao.stats()
+        rag_engine.index_manager.stop()
+
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Chat model falso e determinístico para medir o pipeline RAG sem o Gemini.
+
+Fica fora de :mod:`benchmarks.fakes` porque depende do ``langchain_core``,
+que os benchmarks do crawler não precisam.
+"""
+
+import re
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_CONTEXTO = re.compile(r"CONTEXTO:\s*(.*?)\s*PERGUNTA:", re.S)
+
+
+class FakeChatLLM(BaseChatModel):
+    """
+    Substituto de ``ChatGoogleGenerativeAI`` para ``rag_engine.llm``.
+
+    Espera ``latencia`` segundos (o tempo de uma chamada real à API) e
+    responde com as primeiras ``palavras`` palavras do contexto do prompt, de
+    modo que a mesma pergunta sobre o mesmo índice gera sempre a mesma
+    resposta. Suporta ``invoke`` e ``astream`` (a resposta é emitida palavra
+    a palavra).
+    """
+
+    latencia: float = 0.3
+    palavras: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-rag"
+
+    def _resposta(self, messages) -> str:
+        texto = str(messages[-1].content) if messages else ""
+        achado = _CONTEXTO.search(texto)
+        contexto = achado.group(1) if achado else texto
+        palavras = re.sub(r"[\[\]'\"]|\\n", " ", contexto).split()[:self.palavras]
+        return "Segundo as notícias: " + " ".join(palavras)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latencia)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._resposta(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latencia)
+        for i, palavra in enumerate(self._resposta(messages).split(" ")):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=palavra if i == 0 else " " + palavra))
@@ -0,0 +1,178 @@
+"""
+Dublês usados pelos benchmarks: servidor HTTP local e LLMs falsos.
+"""
+
+import json
+import time
+import html
+import random
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PARAGRAFO = (
+    "A Secretaria de Educação do Distrito Federal (SEEDF) divulgou o calendário "
+    "de matrículas da rede pública para 2026, com novas vagas em escolas de tempo integral "
+    "na região administrativa {i}. "
+)
+
+
+def pagina_html(titulo: str, paragrafos: int = 12) -> str:
+    """Gera uma página de notícia com menu, artigo e rodapé."""
+    corpo = "".join(f"<p>{PARAGRAFO.format(i=i)}</p>" for i in range(paragrafos))
+    menu = "".join(f'<li><a href="/secao/{i}">Seção {i}</a></li>' for i in range(20))
+    return (
+        f"<html><head><title>{titulo}</title></head><body>"
+        f"<nav><ul>{menu}</ul></nav>"
+        f"<article><h1>{titulo}</h1>{corpo}</article>"
+        f"<footer>Todos os direitos reservados</footer></body></html>"
+    )
+
+
+BRONZE_DIR = Path(__file__).resolve().parent.parent / "data" / "bronze"
+# perguntas em português com os links das notícias da bronze que as respondem
+PERGUNTAS_OURO = Path(__file__).resolve().parent / "perguntas_ouro.json"
+
+
+def carregar_bronze(bronze_dir: Path = BRONZE_DIR) -> list[dict]:
+    """Artigos da camada bronze, em ordem de nome de arquivo."""
+    artigos = []
+    for caminho in sorted(bronze_dir.glob("*.json")):
+        with open(caminho, encoding="utf-8") as f:
+            artigos.append(json.load(f))
+    return artigos
+
+
+def corpus_sintetico(bronze_dir: Path = BRONZE_DIR, semente: int = 42) -> list[dict]:
+    """
+    Monta páginas HTML a partir dos artigos da camada bronze.
+
+    Cada artigo vira uma página com menu, barra lateral de links e rodapé (com
+    ``artigo=True`` e o texto original em ``texto``); além disso, são geradas
+    páginas de listagem, só com manchetes e links, marcadas com ``artigo=False``.
+    """
+    rnd = random.Random(semente)
+    paginas = []
+    artigos = carregar_bronze(bronze_dir)
+
+    menu = "".join(f'<li><a href="/secao/{i}">Seção {i}</a></li>' for i in range(15))
+    for artigo in artigos:
+        paragrafos = [p for p in artigo.get("texto", "").split("\n") if p.strip()]
+        corpo = "".join(f"<p>{html.escape(p)}</p>" for p in paragrafos)
+        lateral = "".join(
+            f'<li><a href="/n/{i}">{html.escape(rnd.choice(artigos)["titulo"])}</a></li>'
+            for i in range(8)
+        )
+        paginas.append({
+            "nome": artigo["link"],
+            "artigo": True,
+            "texto": artigo.get("texto", ""),
+            "html": (
+                f"<html><body><header><ul>{menu}</ul></header>"
+                f"<div class='conteudo'><h1>{html.escape(artigo['titulo'])}</h1>"
+                f"<div class='materia'>{corpo}</div></div>"
+                f"<div class='sidebar'><h3>Leia também</h3><ul>{lateral}</ul></div>"
+                f"<footer>Todos os direitos reservados</footer></body></html>"
+            ),
+        })
+
+    for n in range(max(1, len(artigos) // 4)):
+        itens = "".join(
+            f'<div class="card"><a href="/n/{i}">{html.escape(a["titulo"])}</a>'
+            f'<p>{html.escape(a.get("texto", "")[:120])}</p></div>'
+            for i, a in enumerate(rnd.sample(artigos, min(12, len(artigos))))
+        )
+        paginas.append({
+            "nome": f"listagem-{n}",
+            "artigo": False,
+            "texto": None,
+            "html": f"<html><body><nav><ul>{menu}</ul></nav><main>{itens}</main></body></html>",
+        })
+    return paginas
+
+
+class ServidorLocal:
+    """
+    Servidor HTTP em thread que responde qualquer caminho com uma página HTML.
+
+    Args:
+        latencia (float): Atraso artificial, em segundos, de cada resposta.
+    """
+
+    def __init__(self, latencia: float = 0.05):
+        latencia_ = latencia
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latencia_)
+                corpo = pagina_html(self.path).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, porta = self.httpd.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeExtratorLLM:
+    """
+    Substituto do LLM de extração do crawler: espera ``latencia`` segundos e
+    devolve o próprio texto como artigo.
+    """
+
+    def __init__(self, latencia: float = 0.2):
+        self.latencia = latencia
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texto: str) -> dict:
+        with self._lock:
+            self.chamadas += 1
+        time.sleep(self.latencia)
+        return {"texto": texto}
+
+
+class FakeTavily:
+    """
+    Substituto do ``TavilyClient``: ``search`` devolve sempre os mesmos
+    resultados, no formato da API, sem acessar a rede.
+
+    Args:
+        urls (list[str]): URLs devolvidas em ``results``.
+        latencia (float): Atraso artificial, em segundos, de cada busca.
+    """
+
+    def __init__(self, urls: list[str], latencia: float = 0.0):
+        self.urls = list(urls)
+        self.latencia = latencia
+        self.buscas = []
+
+    def search(self, query: str, max_results: int = 5, **kwargs) -> dict:
+        self.buscas.append(query)
+        time.sleep(self.latencia)
+        return {
+            "query": query,
+            "results": [
+                {"url": url, "title": f"Notícia {i}", "content": "", "score": 1.0 - i / 100}
+                for i, url in enumerate(self.urls[:max_results])
+            ],
+        }
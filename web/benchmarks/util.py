@@ -0,0 +1,10 @@
+"""
+Funções comuns aos relatórios dos benchmarks.
+"""
+
+import numpy as np
+
+
+def percentil(valores: list[float], p: float) -> float:
+    """Percentil ``p`` de ``valores`` com 3 casas (latências abaixo de 1 ms), ou 0 se vazio."""
+    return round(float(np.percentile(valores, p)), 3) if valores else 0.0
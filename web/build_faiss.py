@@ -1,6 +1,9 @@
-from chatbot.knowledge.knowledge import create_dummies
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from chatbot.knowledge.knowledge import carregar_artigos
+from chatbot.knowledge.chunking import dividir_artigos
+from chatbot.knowledge.duplicatas import IndiceDuplicatas, IMPRESSOES_PATH, DEDUP_LIMIAR
+from chatbot.embeddings import criar_embeddings
+from chatbot import ann, bm25, index_store
+from data import camadas
 
 def main():
     """
@@ -8,18 +11,49 @@ def main():
 
     Esta função executa os seguintes passos:
     1. Exibe uma mensagem indicando o início da geração do índice FAISS.
-    2. Cria dados de texto fictícios usando a função `create_dummies()`.
-    3. Inicializa um modelo de embeddings HuggingFace com o modelo 'all-MiniLM-L6-v2'.
-    4. Constrói um vetor store FAISS a partir dos textos e embeddings.
-    5. Salva o índice FAISS gerado no diretório local './FAISS/'.
-    6. Exibe uma mensagem de confirmação após o salvamento bem-sucedido.
+    2. Compacta a camada bronze nas camadas silver e gold (ver data/camadas.py).
+    3. Carrega os artigos da camada gold e descarta quase-duplicatas (MinHash),
+       recriando as impressões usadas depois pelo crawler.
+    4. Inicializa o modelo de embeddings 'all-MiniLM-L6-v2' no backend definido por EMBEDDINGS_BACKEND.
+    5. Divide os artigos em trechos com metadados e constrói um vetor store FAISS a partir deles,
+       com o tipo de índice definido por FAISS_INDEX_TYPE (flat, ivf, hnsw ou ivfpq), treinado
+       em uma amostra dos vetores quando necessário.
+    6. Constrói o índice léxico BM25 dos mesmos trechos (ver chatbot/bm25.py).
+    7. Publica os índices como uma nova versão em './FAISS/versions/' e aponta './FAISS/CURRENT' para ela.
+       Os passos 2 a 7 rodam sob o lock de escrita do índice (ver chatbot/index_store.py), esperando
+       a coleta em andamento terminar.
+    8. Exibe uma mensagem de confirmação após o salvamento bem-sucedido.
     """
     print("🔄 Gerando FAISS index...")
-    texts = create_dummies()
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vector_store = FAISS.from_texts(texts, embedding=embeddings)
-    vector_store.save_local("FAISS/")
-    print("✅ FAISS salvo em ./FAISS/")
+    # o índice é refeito do zero: coletas publicadas durante o build seriam perdidas
+    with index_store.bloqueio_escrita("FAISS/"):
+        construir()
+
+def construir():
+    """Passos 2 a 7 de :func:`main`."""
+    total = camadas.compactar()
+    print(f"🥇 Camada gold compactada: {total} artigos")
+    artigos = carregar_artigos()
+    dedup = IndiceDuplicatas(IMPRESSOES_PATH, limiar=DEDUP_LIMIAR, recriar=True)
+    artigos = [
+        a for a in artigos
+        if dedup.verificar_e_adicionar(a.get("link") or a.get("id") or a["arquivo"], a.get("texto", ""), a.get("titulo")) is None
+    ]
+    dedup.salvar_relatorio()
+    print(f"🧹 {dedup.relatorio()['ignorados']} quase-duplicatas ignoradas (ver data/duplicatas_relatorio.json)")
+    dedup.fechar()
+
+    texts, metadatas = dividir_artigos(artigos)
+    print(f"✂️ {len(artigos)} artigos divididos em {len(texts)} trechos")
+    embeddings = criar_embeddings()
+    vetores = embeddings.embed_documents(texts)
+    vector_store = ann.criar_vector_store(list(zip(texts, vetores)), embeddings, metadatas)
+    print(f"🧭 Índice: {ann.descrever(vector_store.index)}")
+    lexico = bm25.IndiceBM25()
+    lexico.adicionar(texts)
+    print(f"🔤 Índice BM25: {lexico.termos} termos")
+    versao = index_store.publish(vector_store, "FAISS/", bm25=lexico)
+    print(f"✅ FAISS salvo em ./FAISS/ (versão {versao})")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
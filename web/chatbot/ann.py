@@ -0,0 +1,194 @@
+"""
+Tipos de índice FAISS aproximados (ANN) para bases grandes.
+
+O tipo é escolhido pela variável ``FAISS_INDEX_TYPE`` no build
+(``build_faiss.py``) e na criação do índice pelo crawler:
+
+* ``flat`` (padrão): busca exata, custo linear no tamanho da base;
+* ``ivf``: ``IndexIVFFlat``; os vetores são agrupados em ``nlist`` listas
+  (k-means) e a busca visita só as ``nprobe`` listas mais próximas;
+* ``hnsw``: ``IndexHNSWFlat``; grafo navegável, busca controlada por
+  ``efSearch``, sem treino;
+* ``ivfpq``: ``IndexIVFPQ``; como o ``ivf``, mas cada vetor é comprimido por
+  quantização de produto em ``m`` bytes (com ``nbits=8``), em vez de
+  ``4 * dim`` bytes.
+
+Os tipos com IVF são treinados em uma amostra aleatória dos vetores (no
+máximo ``FAISS_TREINO_AMOSTRA``) antes de receber a base. O crawler acrescenta
+vetores novos às listas já treinadas; um ``build_faiss.py`` completo retreina.
+
+Na consulta, ``FAISS_NPROBE`` e ``FAISS_EF_SEARCH`` ajustam a troca entre
+recall e latência (ver :func:`ajustar_busca`), sem precisar reindexar.
+:func:`buscar` restringe a busca a um subconjunto das posições (filtros por
+data e fonte, ver :mod:`chatbot.filtros`).
+``benchmarks/bench_ann.py`` mede recall@10 e latência de cada tipo.
+"""
+
+import os
+import math
+import logging
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TIPOS = ("flat", "ivf", "hnsw", "ivfpq")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = 4·√N
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_TREINO_AMOSTRA = int(os.getenv("FAISS_TREINO_AMOSTRA", "100000"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# teto do efSearch quando a busca é restrita a uma parte da base (ver buscar)
+FAISS_EF_SEARCH_MAX = int(os.getenv("FAISS_EF_SEARCH_MAX", "1024"))
+
+# pontos de treino por centróide abaixo dos quais o k-means do FAISS degrada
+_PONTOS_POR_CENTROIDE = 39
+
+
+def nlist_para(n: int, nlist: int = FAISS_IVF_NLIST) -> int:
+    """Número de listas do IVF para ``n`` vetores (``4·√n`` por padrão), limitado pelo treino."""
+    if nlist <= 0:
+        nlist = int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // _PONTOS_POR_CENTROIDE))
+
+
+def _subquantizadores(d: int, m: int) -> int:
+    """Maior divisor de ``d`` que não passa de ``m`` (o PQ exige ``d % m == 0``)."""
+    return max(i for i in range(1, min(m, d) + 1) if d % i == 0)
+
+
+def criar_indice(d: int, n: int, tipo: str = FAISS_INDEX_TYPE, nlist: int = FAISS_IVF_NLIST,
+                 pq_m: int = FAISS_PQ_M, pq_nbits: int = FAISS_PQ_NBITS, hnsw_m: int = FAISS_HNSW_M,
+                 ef_construction: int = FAISS_HNSW_EF_CONSTRUCTION):
+    """
+    Cria um índice vazio (ainda não treinado) do ``tipo`` pedido para ``n`` vetores de dimensão ``d``.
+
+    Bases pequenas demais para o treino caem para um tipo mais simples:
+    ``ivfpq`` vira ``ivf`` com menos de ``2**pq_nbits`` vetores.
+    """
+    import faiss
+
+    if tipo not in TIPOS:
+        raise ValueError(f"FAISS_INDEX_TYPE desconhecido: {tipo!r} (use {', '.join(TIPOS)})")
+    if tipo == "ivfpq" and n < 2 ** pq_nbits:
+        logger.warning(f"Poucos vetores ({n}) para treinar o PQ; usando ivf")
+        tipo = "ivf"
+
+    if tipo == "flat":
+        return faiss.IndexFlatL2(d)
+    if tipo == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    quantizador = faiss.IndexFlatL2(d)
+    listas = nlist_para(n, nlist)
+    if tipo == "ivf":
+        return faiss.IndexIVFFlat(quantizador, d, listas)
+    return faiss.IndexIVFPQ(quantizador, d, listas, _subquantizadores(d, pq_m), pq_nbits)
+
+
+def treinar(index, vetores: np.ndarray, amostra: int = FAISS_TREINO_AMOSTRA, semente: int = 0):
+    """Treina ``index`` (se necessário) em até ``amostra`` vetores sorteados."""
+    if index.is_trained:
+        return
+    if len(vetores) > amostra > 0:
+        linhas = np.random.default_rng(semente).choice(len(vetores), amostra, replace=False)
+        vetores = vetores[np.sort(linhas)]
+    index.train(np.ascontiguousarray(vetores, dtype=np.float32))
+
+
+def ajustar_busca(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """
+    Define os parâmetros de busca de ``index``: ``nprobe`` (IVF) e ``efSearch`` (HNSW).
+
+    Índices planos (incluindo o :class:`chatbot.mmap_index.MmapFlatIndex`) são ignorados.
+    """
+    try:
+        import faiss
+    except ImportError:
+        return
+    if not isinstance(index, faiss.Index):
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def buscar(index, consultas, k: int, posicoes=None):
+    """
+    Busca os ``k`` vizinhos de ``consultas``; com ``posicoes``, só entre elas.
+
+    O filtro é aplicado durante a busca, e não depois dela, então os ``k``
+    resultados nunca são desperdiçados com trechos filtrados:
+
+    * :class:`chatbot.mmap_index.MmapFlatIndex` lê só as linhas selecionadas;
+    * índices do FAISS recebem um ``IDSelectorBatch`` nos parâmetros de busca.
+      Como a seleção deixa menos vetores por lista (IVF) e por vizinhança
+      (HNSW), ``nprobe`` e ``efSearch`` crescem na proporção inversa da fração
+      selecionada, até ``nlist`` e ``FAISS_EF_SEARCH_MAX``.
+
+    Returns:
+        tuple: ``(distancias, indices)`` como ``faiss.Index.search``.
+    """
+    consultas = np.ascontiguousarray(consultas, dtype=np.float32).reshape(-1, index.d)
+    if posicoes is None:
+        return index.search(consultas, k)
+    if hasattr(index, "buscar_em"):
+        return index.buscar_em(consultas, k, posicoes)
+
+    import faiss
+
+    posicoes = np.ascontiguousarray(posicoes, dtype=np.int64)
+    fator = index.ntotal / max(len(posicoes), 1)
+    seletor = faiss.IDSelectorBatch(posicoes)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=seletor, nprobe=min(ivf.nlist, math.ceil(ivf.nprobe * fator)))
+    elif isinstance(index, faiss.IndexHNSW):
+        ef = min(FAISS_EF_SEARCH_MAX, max(k, math.ceil(index.hnsw.efSearch * fator)))
+        params = faiss.SearchParametersHNSW(sel=seletor, efSearch=ef)
+    else:
+        params = faiss.SearchParameters(sel=seletor)
+    return index.search(consultas, k, params=params)
+
+
+def descrever(index) -> str:
+    """Resumo legível do tipo e dos parâmetros de ``index`` (para logs)."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index) if isinstance(index, faiss.Index) else None
+    if ivf is not None:
+        return f"{type(index).__name__}(nlist={ivf.nlist}, nprobe={ivf.nprobe}, ntotal={index.ntotal})"
+    if isinstance(index, faiss.IndexHNSW):
+        return f"{type(index).__name__}(efSearch={index.hnsw.efSearch}, ntotal={index.ntotal})"
+    return f"{type(index).__name__}(ntotal={index.ntotal})"
+
+
+def criar_vector_store(pares: list[tuple[str, list[float]]], embeddings, metadados: list[dict] | None = None,
+                       tipo: str = FAISS_INDEX_TYPE):
+    """
+    Monta um vector store ``FAISS`` do LangChain com o tipo de índice configurado.
+
+    Substitui ``FAISS.from_embeddings``: cria o índice, treina-o em uma
+    amostra dos vetores e só então adiciona os pares ``(texto, vetor)``.
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    vetores = np.asarray([v for _, v in pares], dtype=np.float32)
+    index = criar_indice(vetores.shape[1], len(vetores), tipo)
+    treinar(index, vetores)
+    vs = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vs.add_embeddings(pares, metadatas=metadados)
+    ajustar_busca(vs.index)
+    logger.info(f"Índice FAISS construído: {descrever(vs.index)}")
+    return vs
@@ -0,0 +1,265 @@
+"""
+Índice léxico BM25 em português, usado junto com a busca densa.
+
+O MiniLM dos embeddings foi treinado quase só em inglês e deixa escapar termos
+exatos que aparecem o tempo todo nas perguntas: nomes de escolas, siglas como
+"SEEDF" ou "CIL", nomes de programas. Este módulo mantém um índice invertido
+BM25 sobre os mesmos trechos do FAISS, com as posições do FAISS como ids:
+
+* :func:`tokenizar` normaliza o texto (minúsculas, sem stopwords), reduz cada
+  palavra ao radical com o stemmer Snowball de português e remove os acentos,
+  de modo que "educação" e "educacao", ou "escola" e "escolas", se encontrem;
+* :class:`IndiceBM25` guarda as listas de postagens em arrays NumPy e é gravado
+  em cada versão do índice como ``bm25.npz`` (ver
+  :func:`chatbot.index_store.publish`), sem pickle;
+* :func:`fundir_rrf` combina os rankings denso e léxico por *reciprocal rank
+  fusion*, que só usa as posições e dispensa calibrar as duas escalas de score.
+
+O ``build_faiss.py`` constrói o índice junto com o FAISS e o crawler acrescenta
+os trechos novos a ele a cada coleta. Versões antigas, sem ``bm25.npz``,
+continuam funcionando só com a busca densa; para gerar o arquivo nelas::
+
+    python -m chatbot.bm25 FAISS/
+"""
+
+import os
+import re
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+from functools import lru_cache
+from collections import Counter, defaultdict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BM25_FILE = "bm25.npz"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+STOPWORDS = frozenset("""
+a à ao aos as às até com como da das de dela delas dele deles depois do dos e é ela elas ele eles em
+entre era eram essa essas esse esses esta está estão estas este estes eu foi foram há isso isto já
+lhe lhes mais mas me mesmo meu minha muito na nas nem no nos nós o os ou para pela pelas pelo pelos
+por qual quais quando que quem se sem ser seu seus si sua suas são só também te tem têm teu tu tua
+um uma umas uns vai você vocês sobre pra pro ter sido será serão onde
+""".split())
+
+_PALAVRA = re.compile(r"\w+")
+# terminações que o stemmer só reconhece acentuadas; quem digita sem acento
+# ("educacao", "inscricoes") precisa cair no mesmo radical
+_TERMINACOES = (("coes", "ções"), ("cao", "ção"), ("oes", "ões"), ("ao", "ão"))
+_local = threading.local()
+
+
+def _sem_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=200_000)
+def _radical(palavra: str) -> str:
+    # os objetos do snowballstemmer guardam estado: um por thread
+    stemmer = getattr(_local, "stemmer", None)
+    if stemmer is None:
+        import snowballstemmer
+
+        stemmer = _local.stemmer = snowballstemmer.stemmer("portuguese")
+    palavra = _sem_acentos(palavra)
+    for sem, com in _TERMINACOES:
+        if palavra.endswith(sem):
+            palavra = palavra[:-len(sem)] + com
+            break
+    return _sem_acentos(stemmer.stemWord(palavra))
+
+
+def tokenizar(texto: str) -> list[str]:
+    """Termos indexáveis de ``texto``: radicais sem acento, sem stopwords nem letras soltas."""
+    return [
+        _radical(palavra)
+        for palavra in _PALAVRA.findall(texto.lower())
+        if palavra not in STOPWORDS and (len(palavra) > 1 or palavra.isdigit())
+    ]
+
+
+class IndiceBM25:
+    """
+    Índice invertido BM25 cujos documentos são as posições dos trechos no FAISS.
+
+    Documentos só são acrescentados no fim (:meth:`adicionar`), na mesma ordem
+    em que os vetores entram no FAISS.
+
+    Args:
+        k1 (float): Saturação da frequência do termo.
+        b (float): Peso da normalização pelo tamanho do documento.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.comprimentos = np.empty(0, dtype=np.int32)
+        self._postagens = {}  # termo -> (posições int32, frequências int32)
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.comprimentos)
+
+    @property
+    def termos(self) -> int:
+        return len(self._postagens)
+
+    def adicionar(self, textos: list[str]) -> int:
+        """Indexa ``textos`` nas posições seguintes às já existentes; retorna a primeira."""
+        inicio = self.total
+        novos = defaultdict(lambda: ([], []))
+        comprimentos = []
+        for pos, texto in enumerate(textos, start=inicio):
+            contagem = Counter(tokenizar(texto))
+            comprimentos.append(sum(contagem.values()))
+            for termo, tf in contagem.items():
+                docs, tfs = novos[termo]
+                docs.append(pos)
+                tfs.append(tf)
+
+        with self._lock:
+            for termo, (docs, tfs) in novos.items():
+                docs = np.asarray(docs, dtype=np.int32)
+                tfs = np.asarray(tfs, dtype=np.int32)
+                if termo in self._postagens:
+                    antigos_docs, antigos_tfs = self._postagens[termo]
+                    docs = np.concatenate([antigos_docs, docs])
+                    tfs = np.concatenate([antigos_tfs, tfs])
+                self._postagens[termo] = (docs, tfs)
+            self.comprimentos = np.concatenate([self.comprimentos, np.asarray(comprimentos, dtype=np.int32)])
+        return inicio
+
+    def buscar(self, consulta: str, k: int, posicoes=None) -> list[tuple[int, float]]:
+        """
+        Pares ``(posição, score BM25)`` dos ``k`` melhores trechos, do maior score para o menor.
+
+        Com ``posicoes`` (ver :mod:`chatbot.filtros`), só elas concorrem ao top-k.
+        """
+        n = self.total
+        termos = [t for t in dict.fromkeys(tokenizar(consulta)) if t in self._postagens]
+        if n == 0 or k <= 0 or not termos:
+            return []
+
+        media = float(self.comprimentos.mean()) or 1.0
+        normalizacao = self.k1 * (1 - self.b + self.b * self.comprimentos / media)
+        scores = np.zeros(n, dtype=np.float32)
+        for termo in termos:
+            docs, tfs = self._postagens[termo]
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            # cada documento aparece uma vez por termo: a soma indexada é segura
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + normalizacao[docs])
+
+        if posicoes is not None:
+            posicoes = np.asarray(posicoes, dtype=np.int64)
+            scores = scores[posicoes]
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        melhores = np.argpartition(-scores, k - 1)[:k]
+        melhores = melhores[np.argsort(-scores[melhores], kind="stable")]
+        ids = posicoes[melhores] if posicoes is not None else melhores
+        return [(int(pos), float(scores[i])) for pos, i in zip(ids, melhores) if scores[i] > 0]
+
+    def idf(self, termos) -> dict:
+        """IDF (o mesmo de :meth:`buscar`) de cada termo já tokenizado; termos ausentes da base têm o maior peso."""
+        n = self.total
+        return {
+            termo: float(np.log(1 + (n - df + 0.5) / (df + 0.5)))
+            for termo in termos
+            for df in [len(self._postagens[termo][0]) if termo in self._postagens else 0]
+        }
+
+    def salvar(self, destino) -> Path:
+        """Grava o índice em ``<destino>/bm25.npz`` (postagens concatenadas, sem pickle)."""
+        termos = sorted(self._postagens)
+        docs = [self._postagens[t][0] for t in termos]
+        tfs = [self._postagens[t][1] for t in termos]
+        inicios = np.zeros(len(termos) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in docs], out=inicios[1:])
+        caminho = Path(destino) / BM25_FILE
+        with open(caminho, "wb") as f:
+            np.savez(
+                f,
+                termos=np.array(termos, dtype=str),
+                inicios=inicios,
+                docs=np.concatenate(docs) if docs else np.empty(0, np.int32),
+                tfs=np.concatenate(tfs) if tfs else np.empty(0, np.int32),
+                comprimentos=self.comprimentos,
+                parametros=np.array([self.k1, self.b]),
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        return caminho
+
+    @classmethod
+    def carregar(cls, caminho) -> "IndiceBM25":
+        with np.load(caminho, allow_pickle=False) as dados:
+            k1, b = (float(v) for v in dados["parametros"])
+            indice = cls(k1=k1, b=b)
+            inicios, docs, tfs = dados["inicios"], dados["docs"], dados["tfs"]
+            indice._postagens = {
+                str(termo): (docs[inicios[i]:inicios[i + 1]], tfs[inicios[i]:inicios[i + 1]])
+                for i, termo in enumerate(dados["termos"])
+            }
+            indice.comprimentos = dados["comprimentos"]
+        return indice
+
+
+def abrir(path) -> IndiceBM25 | None:
+    """Carrega o ``bm25.npz`` de uma versão do índice, ou ``None`` se ela não tiver um."""
+    caminho = Path(path) / BM25_FILE
+    return IndiceBM25.carregar(caminho) if caminho.exists() else None
+
+
+def construir(vs) -> IndiceBM25:
+    """Indexa, em ordem de posição, todos os trechos de um vector store ``FAISS`` do LangChain."""
+    indice = IndiceBM25()
+    textos = [vs.docstore.search(vs.index_to_docstore_id[pos]).page_content for pos in range(vs.index.ntotal)]
+    indice.adicionar(textos)
+    return indice
+
+
+def fundir_rrf(rankings: list[list], k: int = 60) -> list[tuple[object, float]]:
+    """
+    Reciprocal rank fusion: cada item soma ``1 / (k + posição)`` em cada ranking em que aparece.
+
+    Args:
+        rankings (list[list]): Listas de chaves, cada uma do melhor para o pior.
+        k (int): Constante de suavização (60 no artigo original).
+
+    Returns:
+        list: Pares ``(chave, score)`` do maior para o menor score.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for posicao, chave in enumerate(ranking, start=1):
+            scores[chave] += 1.0 / (k + posicao)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def converter(path) -> Path:
+    """Gera ``bm25.npz`` para uma versão já publicada a partir do seu docstore."""
+    from . import docstore
+
+    path = Path(path)
+    documentos, index_to_docstore_id = docstore.abrir(path)
+    indice = IndiceBM25()
+    indice.adicionar([documentos.search(index_to_docstore_id[pos]).page_content for pos in range(len(index_to_docstore_id))])
+    return indice.salvar(path)
+
+
+if __name__ == "__main__":
+    from chatbot import index_store
+
+    raiz = sys.argv[1] if len(sys.argv) > 1 else "FAISS/"
+    atual = index_store.current_path(raiz)
+    if atual is None:
+        sys.exit(f"Nenhum índice em {raiz}")
+    print(f"{atual}: {converter(atual)} gravado")
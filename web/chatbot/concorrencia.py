@@ -0,0 +1,300 @@
+"""
+Coalescência de perguntas idênticas e controle de admissão das chamadas ao LLM.
+
+Quando sai uma notícia, dezenas de pessoas fazem a mesma pergunta ao mesmo
+tempo. Sem controle, cada ``/ask/`` roda a própria recuperação e a própria
+chamada ao Gemini, e o número de chamadas simultâneas não tem limite. Este
+módulo traz as duas peças usadas pelo :mod:`chatbot.rag_engine`:
+
+* :class:`SingleFlight`: enquanto uma pergunta está sendo respondida, outra
+  igual (mesmo texto normalizado ou embedding com similaridade acima do limiar,
+  na mesma versão do índice e com os mesmos filtros) não roda o pipeline de
+  novo: espera a primeira terminar e recebe uma cópia do resultado;
+* :class:`ControleAdmissao`: limita as chamadas simultâneas ao LLM. Quem não
+  encontra vaga entra em uma fila FIFO limitada; com a fila cheia, ou depois de
+  esperar ``max_espera`` segundos, a requisição é recusada com
+  :class:`Sobrecarga`, que a view converte em ``503`` com ``Retry-After``.
+
+Os dois funcionam tanto em threads (WSGI, ``answer_question``) quanto no event
+loop (ASGI, ``astream_answer``). Os limites valem por processo: com vários
+workers, o total é o limite vezes o número de workers.
+"""
+
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+
+import numpy as np
+
+from . import metricas
+
+ADMISSOES = metricas.contador(
+    "pqr_llm_admissoes_total", "Pedidos de vaga para o LLM: admitida, fila_cheia ou espera_esgotada",
+    rotulos=("resultado",),
+)
+ESPERA_SEGUNDOS = metricas.histograma("pqr_llm_espera_segundos", "Tempo na fila até conseguir vaga para o LLM")
+COALESCIDAS = metricas.contador(
+    "pqr_coalescidas_total", "Perguntas atendidas pelo resultado de outra igual em andamento", rotulos=("criterio",)
+)
+
+
+class Sobrecarga(Exception):
+    """
+    O servidor não tem vaga para a requisição agora.
+
+    Attributes:
+        retry_after (int): Segundos sugeridos antes de tentar de novo.
+    """
+
+    def __init__(self, mensagem: str, retry_after: int):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+
+
+class ControleAdmissao:
+    """
+    Semáforo com fila limitada e tempo máximo de espera.
+
+    Args:
+        max_concorrentes (int): Chamadas simultâneas permitidas (<= 0 desativa o limite).
+        max_fila (int): Requisições que podem esperar por uma vaga.
+        max_espera (float): Segundos máximos de espera na fila.
+    """
+
+    def __init__(self, max_concorrentes: int, max_fila: int, max_espera: float):
+        self.max_concorrentes = max_concorrentes
+        self.max_fila = max_fila
+        self.max_espera = max_espera
+        self._lock = threading.Lock()
+        self._ativos = 0
+        self._fila = deque()  # Futures de quem espera, na ordem de chegada
+        self._duracao_media = None  # média móvel exponencial de cada chamada (s)
+        self._recusadas = 0
+
+    def retry_after(self) -> int:
+        """Estimativa (s) de quando haverá vaga: a fila atual dividida pelas vagas, vezes a duração média."""
+        media = self._duracao_media or 1.0
+        rodadas = (len(self._fila) + 1) / max(self.max_concorrentes, 1)
+        return max(1, math.ceil(media * rodadas))
+
+    def _recusar(self, motivo: str, resultado: str):
+        self._recusadas += 1
+        ADMISSOES.inc(resultado=resultado)
+        raise Sobrecarga(motivo, self.retry_after())
+
+    def verificar(self):
+        """Recusa de imediato (sem reservar vaga) se a fila já está cheia."""
+        if self.max_concorrentes <= 0:
+            return
+        with self._lock:
+            if self._ativos >= self.max_concorrentes and len(self._fila) >= self.max_fila:
+                self._recusar("Muitas perguntas em andamento", "fila_cheia")
+
+    def _entrar(self) -> Future | None:
+        """Reserva uma vaga (``None``) ou entra na fila (o ``Future`` é resolvido ao receber a vaga)."""
+        with self._lock:
+            if self._ativos < self.max_concorrentes and not self._fila:
+                self._ativos += 1
+                return None
+            if len(self._fila) >= self.max_fila:
+                self._recusar("Muitas perguntas em andamento", "fila_cheia")
+            vez = Future()
+            self._fila.append(vez)
+            return vez
+
+    def _desistir(self, vez: Future) -> bool:
+        """Sai da fila; falso se a vaga já tinha sido concedida (e agora precisa ser liberada)."""
+        with self._lock:
+            try:
+                self._fila.remove(vez)
+            except ValueError:
+                return False
+            return True
+
+    def _liberar(self, segundos: float | None):
+        with self._lock:
+            if segundos is not None:
+                self._duracao_media = segundos if self._duracao_media is None else (
+                    0.8 * self._duracao_media + 0.2 * segundos
+                )
+            # a vaga passa direto para o primeiro da fila, sem voltar ao contador
+            if self._fila:
+                self._fila.popleft().set_result(True)
+            else:
+                self._ativos -= 1
+
+    def _admitida(self, inicio: float):
+        espera = time.monotonic() - inicio
+        ADMISSOES.inc(resultado="admitida")
+        ESPERA_SEGUNDOS.observar(espera)
+        metricas.anotar(espera_llm_ms=round(1000 * espera, 1))
+
+    @contextmanager
+    def vaga(self):
+        """Ocupa uma vaga durante o bloco ``with`` (threads)."""
+        if self.max_concorrentes <= 0:
+            yield
+            return
+        inicio = time.monotonic()
+        vez = self._entrar()
+        if vez is not None:
+            try:
+                vez.result(timeout=self.max_espera)
+            except FutureTimeoutError:
+                if self._desistir(vez):
+                    self._recusar("Tempo de espera por uma vaga esgotado", "espera_esgotada")
+            except BaseException:
+                if not self._desistir(vez):
+                    self._liberar(None)
+                raise
+        self._admitida(inicio)
+        chamada = time.monotonic()
+        try:
+            yield
+        finally:
+            self._liberar(time.monotonic() - chamada)
+
+    @asynccontextmanager
+    async def vaga_async(self):
+        """Como :meth:`vaga`, mas espera a vez sem bloquear o event loop."""
+        if self.max_concorrentes <= 0:
+            yield
+            return
+        inicio = time.monotonic()
+        vez = self._entrar()
+        if vez is not None:
+            try:
+                # shield: o timeout não cancela o Future, que ainda pode receber a vaga
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(vez)), self.max_espera)
+            except asyncio.TimeoutError:
+                if self._desistir(vez):
+                    self._recusar("Tempo de espera por uma vaga esgotado", "espera_esgotada")
+            except BaseException:
+                if not self._desistir(vez):
+                    self._liberar(None)
+                raise
+        self._admitida(inicio)
+        chamada = time.monotonic()
+        try:
+            yield
+        finally:
+            self._liberar(time.monotonic() - chamada)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ativos": self._ativos,
+                "fila": len(self._fila),
+                "max_concorrentes": self.max_concorrentes,
+                "max_fila": self.max_fila,
+                "recusadas": self._recusadas,
+                "duracao_media_s": round(self._duracao_media or 0.0, 3),
+            }
+
+
+class LiderDesistiu(Exception):
+    """A requisição que executava o pipeline foi abandonada (ex.: o cliente do stream desconectou)."""
+
+
+class SemContexto(Exception):
+    """
+    O líder não achou contexto. A resposta dele cita a pergunta dele, então não
+    é repassada: cada seguidor monta a sua (ver :meth:`SingleFlight.mesmo_texto`).
+    """
+
+
+class Voo:
+    """Uma execução do pipeline em andamento, compartilhada pelas perguntas iguais."""
+
+    def __init__(self, chave, vetor, grupo):
+        self.chave = chave
+        self.vetor = vetor
+        self.grupo = grupo
+        self.futuro = Future()
+        self.seguidores = 0
+
+
+class SingleFlight:
+    """
+    Registro das perguntas em andamento, para que as iguais compartilhem a execução.
+
+    Args:
+        threshold (float): Similaridade de cosseno mínima entre embeddings
+            para considerar duas perguntas iguais (> 1 compara só o texto).
+        max_espera (float): Segundos máximos que uma pergunta espera pela igual.
+    """
+
+    def __init__(self, threshold: float, max_espera: float):
+        self.threshold = threshold
+        self.max_espera = max_espera
+        self._lock = threading.Lock()
+        self._voos = OrderedDict()  # (grupo, texto normalizado) -> Voo
+
+    @staticmethod
+    def _texto(pergunta: str) -> str:
+        return " ".join(pergunta.lower().split())
+
+    def entrar(self, pergunta: str, vetor, versao, escopo: str = "") -> tuple[Voo, bool]:
+        """
+        Procura uma execução igual em andamento ou registra uma nova.
+
+        Returns:
+            tuple[Voo, bool]: O voo e se quem chamou é o líder (deve executar
+            o pipeline e chamar :meth:`concluir`).
+        """
+        grupo = (versao, escopo)
+        chave = (grupo, self._texto(pergunta))
+        with self._lock:
+            voo, criterio = self._voos.get(chave), "texto"
+            if voo is None:
+                voo, criterio = self._semelhante(grupo, vetor), "embedding"
+            if voo is not None:
+                voo.seguidores += 1
+                COALESCIDAS.inc(criterio=criterio)
+                return voo, False
+            voo = self._voos[chave] = Voo(chave, vetor, grupo)
+            return voo, True
+
+    def mesmo_texto(self, voo: Voo, pergunta: str) -> bool:
+        """Se ``pergunta`` entrou em ``voo`` pelo texto (e não só pela semelhança do embedding)."""
+        return voo.chave[1] == self._texto(pergunta)
+
+    def _semelhante(self, grupo, vetor) -> Voo | None:
+        candidatos = [voo for voo in self._voos.values() if voo.grupo == grupo]
+        if not candidatos or vetor is None or self.threshold > 1:
+            return None
+        sims = np.stack([voo.vetor for voo in candidatos]) @ vetor
+        melhor = int(np.argmax(sims))
+        return candidatos[melhor] if sims[melhor] >= self.threshold else None
+
+    def concluir(self, voo: Voo, resultado=None, erro: BaseException | None = None):
+        """Encerra o voo e entrega o resultado (ou o erro) a quem está esperando."""
+        with self._lock:
+            if self._voos.get(voo.chave) is voo:
+                del self._voos[voo.chave]
+        if erro is not None:
+            voo.futuro.set_exception(erro)
+        else:
+            voo.futuro.set_result(resultado)
+
+    def aguardar(self, voo: Voo):
+        """Resultado do líder (threads). Erros do líder são repassados."""
+        try:
+            return voo.futuro.result(timeout=self.max_espera)
+        except FutureTimeoutError:
+            raise Sobrecarga("Tempo de espera pela resposta esgotado", max(1, math.ceil(self.max_espera / 4))) from None
+
+    async def aguardar_async(self, voo: Voo):
+        """Como :meth:`aguardar`, sem bloquear o event loop."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(voo.futuro)), self.max_espera)
+        except asyncio.TimeoutError:
+            raise Sobrecarga("Tempo de espera pela resposta esgotado", max(1, math.ceil(self.max_espera / 4))) from None
+
+    def em_andamento(self) -> int:
+        with self._lock:
+            return len(self._voos)
@@ -0,0 +1,263 @@
+"""
+Montagem do contexto enviado ao LLM, dentro de um orçamento de tokens.
+
+O ``rag_engine`` colocava no prompt o ``repr`` da lista de trechos
+reranqueados: aspas, ``\\n`` escapados, o título repetido no início de cada
+trecho, as sentenças sobrepostas entre trechos vizinhos do mesmo artigo e
+todas as sentenças, relevantes ou não. Isso aumentava os tokens de entrada, o
+custo e o tempo até o primeiro token.
+
+:func:`montar` troca isso por um contexto compacto:
+
+* os trechos são quebrados em sentenças (:func:`chatbot.knowledge.chunking.dividir_sentencas`)
+  e cada sentença recebe um score: a fração do peso (IDF) dos termos da
+  pergunta que ela contém (com os radicais de :func:`chatbot.bm25.tokenizar`),
+  mais um bônus pela posição do trecho no reranqueamento. Sentenças sem
+  nenhum termo da pergunta não entram, por melhor que seja a posição;
+* sentenças quase iguais a uma já escolhida (Jaccard dos termos acima de
+  ``CONTEXTO_REDUNDANCIA``), como as da sobreposição entre trechos, são descartadas;
+* as melhores entram até o orçamento de ``CONTEXTO_MAX_TOKENS`` tokens e são
+  agrupadas por artigo, na ordem original, sob uma etiqueta ``[n] fonte | título | data``.
+  Uma sentença que não cabe inteira é cortada no que resta do orçamento, se
+  sobrarem ao menos ``MIN_TOKENS_CORTE`` tokens;
+* se nenhuma sentença entrar (todas curtas demais ou nenhuma cabendo), o
+  contexto é o texto do primeiro trecho cortado no orçamento: a recuperação
+  achou documentos, e o LLM não pode receber um contexto vazio;
+* se o resultado não for menor que os trechos inteiros (recuperações
+  curtas, em que as etiquetas pesam mais que o corte), vão os trechos inteiros.
+
+Os tokens são estimados por ``CARACTERES_POR_TOKEN`` (o tokenizador do Gemini
+não está disponível offline). Com ``CONTEXTO_MAX_TOKENS=0``, o prompt volta a
+receber os trechos inteiros, como antes.
+
+:func:`ancoragem` mede, sem LLM, quanto de uma resposta é sustentado por um
+contexto; ``benchmarks/bench_contexto.py`` a usa para conferir que a redução
+não tira das respostas a sua base.
+"""
+
+import os
+import math
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+from .bm25 import tokenizar
+from .knowledge.chunking import dividir_sentencas
+
+load_dotenv()
+
+CONTEXTO_MAX_TOKENS = int(os.getenv("CONTEXTO_MAX_TOKENS", "600"))
+CONTEXTO_REDUNDANCIA = float(os.getenv("CONTEXTO_REDUNDANCIA", "0.6"))
+CARACTERES_POR_TOKEN = float(os.getenv("CARACTERES_POR_TOKEN", "4"))
+# bônus do 1º trecho do reranqueamento; o do n-ésimo é BONUS_ORDEM / n
+BONUS_ORDEM = 0.2
+# sentenças com menos termos que isso ("Leia mais.", "Foto: ...") não entram
+MIN_TERMOS = 3
+# sobra mínima do orçamento para que uma sentença longa demais entre cortada
+MIN_TOKENS_CORTE = 32
+
+
+def estimar_tokens(texto: str) -> int:
+    """Tokens aproximados de ``texto`` para o LLM."""
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _cortar(texto: str, max_tokens: int) -> str:
+    """``texto`` cortado em uma fronteira de palavra para caber em ``max_tokens``."""
+    limite = int(max_tokens * CARACTERES_POR_TOKEN)
+    if len(texto) <= limite:
+        return texto
+    return (texto[:limite - 1].rsplit(" ", 1)[0] or texto[:limite - 1]) + "…"
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class Contexto:
+    """
+    Contexto montado para uma pergunta.
+
+    Attributes:
+        texto (str): O que vai no lugar de ``{contexto}`` no prompt.
+        tokens (int): Tokens estimados de ``texto``.
+        tokens_originais (int): Tokens estimados do contexto antigo (``repr`` dos trechos).
+        sentencas (int): Sentenças escolhidas.
+        sentencas_candidatas (int): Sentenças disponíveis nos trechos.
+        redundantes (int): Sentenças descartadas por repetirem uma já escolhida.
+        fontes (list[dict]): Metadados dos artigos que entraram, na ordem das etiquetas.
+        recorte (bool): Verdadeiro se nenhuma sentença entrou e o contexto é o
+            primeiro trecho cortado no orçamento.
+        original (bool): Verdadeiro se o contexto são os trechos inteiros, sem seleção.
+    """
+
+    def __init__(self, texto: str, tokens_originais: int, sentencas: int = 0, sentencas_candidatas: int = 0,
+                 redundantes: int = 0, fontes: list | None = None, recorte: bool = False, original: bool = False):
+        self.texto = texto
+        self.tokens = estimar_tokens(texto)
+        self.tokens_originais = tokens_originais
+        self.sentencas = sentencas
+        self.sentencas_candidatas = sentencas_candidatas
+        self.redundantes = redundantes
+        self.fontes = fontes or []
+        self.recorte = recorte
+        self.original = original
+
+    @property
+    def reducao(self) -> float:
+        """Fração dos tokens do contexto antigo que deixou de ser enviada."""
+        return 1 - self.tokens / self.tokens_originais if self.tokens_originais else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "contexto_tokens": self.tokens,
+            "contexto_tokens_originais": self.tokens_originais,
+            "contexto_reducao": round(self.reducao, 3),
+            "contexto_sentencas": self.sentencas,
+            "contexto_sentencas_candidatas": self.sentencas_candidatas,
+            "contexto_redundantes": self.redundantes,
+            "contexto_recorte": self.recorte,
+            "contexto_original": self.original,
+        }
+
+
+def _etiqueta(numero: int, meta: dict) -> str:
+    partes = [meta.get("fonte") or meta.get("source") or "fonte desconhecida"]
+    if meta.get("titulo"):
+        titulo = meta["titulo"].strip()
+        partes.append(titulo if len(titulo) <= 120 else titulo[:117] + "...")
+    if meta.get("data_coleta"):
+        partes.append(str(meta["data_coleta"])[:10])
+    return f"[{numero}] " + " | ".join(partes)
+
+
+def _corpo(doc) -> str:
+    """Texto do trecho sem o título repetido no início (ver ``chunking.dividir_artigo``)."""
+    texto = doc.page_content
+    titulo = (getattr(doc, "metadata", {}) or {}).get("titulo")
+    if titulo and texto.startswith(f"{titulo} - "):
+        texto = texto[len(titulo) + 3:]
+    return texto
+
+
+def montar(pergunta: str, docs: list, max_tokens: int = CONTEXTO_MAX_TOKENS, idf=None,
+           redundancia: float = CONTEXTO_REDUNDANCIA) -> Contexto:
+    """
+    Escolhe as sentenças dos ``docs`` mais relevantes para a pergunta e as formata até ``max_tokens``.
+
+    Args:
+        pergunta (str): Pergunta do usuário.
+        docs (list): Documentos reranqueados, do mais para o menos relevante.
+        max_tokens (int): Orçamento do contexto (<= 0 envia os trechos inteiros, sem seleção).
+        idf: Função ``idf(termos) -> dict`` com o peso de cada termo na base
+            (ex.: :meth:`chatbot.bm25.IndiceBM25.idf`); sem ela, o IDF é
+            calculado entre as próprias sentenças.
+        redundancia (float): Jaccard a partir do qual uma sentença repete outra.
+
+    Returns:
+        Contexto: O texto e as estatísticas da montagem.
+    """
+    tokens_originais = estimar_tokens(str([doc.page_content for doc in docs]))
+    # artigos na ordem do reranqueamento; trechos do mesmo artigo dividem a etiqueta
+    artigos = {}
+    for doc in docs:
+        meta = getattr(doc, "metadata", {}) or {}
+        artigos.setdefault(meta.get("link") or id(doc), (len(artigos) + 1, meta))
+    if max_tokens <= 0:
+        return _original(docs, artigos, Contexto("", tokens_originais))
+
+    candidatas = []
+    for ordem, doc in enumerate(docs):
+        meta = getattr(doc, "metadata", {}) or {}
+        chave = meta.get("link") or id(doc)
+        for i, sentenca in enumerate(dividir_sentencas(_corpo(doc))):
+            termos = set(tokenizar(sentenca))
+            if len(termos) >= MIN_TERMOS:
+                candidatas.append({
+                    "chave": chave, "ordem": ordem, "posicao": (meta.get("chunk", ordem), i),
+                    "texto": sentenca, "termos": termos,
+                })
+
+    termos_pergunta = set(tokenizar(pergunta))
+    if idf is not None:
+        pesos = idf(termos_pergunta)
+    else:
+        n = len(candidatas)
+        pesos = {
+            termo: math.log(1 + (n + 1) / (1 + sum(1 for c in candidatas if termo in c["termos"])))
+            for termo in termos_pergunta
+        }
+    peso_total = sum(pesos.get(termo, 0.0) for termo in termos_pergunta) or 1.0
+    for c in candidatas:
+        cobertura = sum(pesos.get(termo, 0.0) for termo in termos_pergunta & c["termos"]) / peso_total
+        c["cobertura"] = cobertura
+        c["score"] = cobertura + BONUS_ORDEM / (c["ordem"] + 1)
+
+    escolhidas, redundantes, usados = [], 0, 0
+    etiquetas_usadas = set()
+    for c in sorted(candidatas, key=lambda c: c["score"], reverse=True):
+        # o bônus de posição só desempata sentenças que têm algo da pergunta
+        if c["cobertura"] <= 0:
+            continue
+        if any(_jaccard(c["termos"], e["termos"]) >= redundancia for e in escolhidas):
+            redundantes += 1
+            continue
+        etiqueta = 0 if c["chave"] in etiquetas_usadas else estimar_tokens(_etiqueta(*artigos[c["chave"]])) + 1
+        custo = etiqueta + estimar_tokens(c["texto"]) + 1
+        if usados + custo > max_tokens:
+            sobra = max_tokens - usados - etiqueta - 1
+            if sobra < MIN_TOKENS_CORTE:
+                continue
+            # a sentença mais relevante que ainda não entrou ocupa o resto do orçamento, cortada
+            c = {**c, "texto": _cortar(c["texto"], sobra)}
+            custo = max_tokens - usados
+        escolhidas.append(c)
+        etiquetas_usadas.add(c["chave"])
+        usados += custo
+        if usados >= max_tokens:
+            break
+
+    if not escolhidas and docs:
+        doc = docs[0]
+        meta = getattr(doc, "metadata", {}) or {}
+        etiqueta = _etiqueta(1, meta)
+        sobra = max_tokens - estimar_tokens(etiqueta) - 1
+        texto = f"{etiqueta}\n{_cortar(_corpo(doc), sobra)}" if sobra > 0 else _cortar(_corpo(doc), max_tokens)
+        montado = Contexto(texto, tokens_originais, 0, len(candidatas), redundantes, [meta], recorte=True)
+        return montado if montado.tokens < tokens_originais else _original(docs, artigos, montado)
+
+    por_artigo = defaultdict(list)
+    for c in escolhidas:
+        por_artigo[c["chave"]].append(c)
+    blocos, fontes = [], []
+    for chave, (_, meta) in artigos.items():
+        if chave in por_artigo:
+            sentencas = sorted(por_artigo[chave], key=lambda c: c["posicao"])
+            blocos.append(_etiqueta(len(blocos) + 1, meta) + "\n" + " ".join(c["texto"] for c in sentencas))
+            fontes.append(meta)
+    montado = Contexto("\n\n".join(blocos), tokens_originais, len(escolhidas), len(candidatas), redundantes, fontes)
+    return montado if montado.tokens < tokens_originais else _original(docs, artigos, montado)
+
+
+def _original(docs: list, artigos: dict, montado: Contexto) -> Contexto:
+    """Os trechos inteiros, como o prompt recebia antes da montagem, com as contagens de ``montado``."""
+    fontes = [meta for _, meta in artigos.values()]
+    return Contexto(str([doc.page_content for doc in docs]), montado.tokens_originais, 0,
+                    montado.sentencas_candidatas, montado.redundantes, fontes, original=True)
+
+
+def ancoragem(resposta: str, contexto: str, minimo: float = 0.5) -> float:
+    """
+    Fração das sentenças da resposta sustentadas pelo contexto.
+
+    Uma sentença é sustentada quando ao menos ``minimo`` dos seus termos
+    (radicais, sem stopwords) aparecem no contexto. É uma checagem lexical,
+    barata e sem LLM: serve para comparar contextos, não para provar fidelidade.
+    """
+    termos_contexto = set(tokenizar(contexto))
+    sentencas = [set(tokenizar(s)) for s in dividir_sentencas(resposta)]
+    sentencas = [termos for termos in sentencas if len(termos) >= MIN_TERMOS]
+    if not sentencas:
+        return 1.0
+    sustentadas = sum(1 for termos in sentencas if len(termos & termos_contexto) / len(termos) >= minimo)
+    return sustentadas / len(sentencas)
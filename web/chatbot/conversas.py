@@ -0,0 +1,148 @@
+"""
+Histórico de conversa da interface de chat, limitado e guardado em cache.
+
+A ``chat_interface`` guardava cada pergunta e o ``str()`` de cada resposta
+(com fontes e trechos) em ``request.session["messages"]``. Com as sessões no
+banco, a linha da sessão crescia a cada mensagem e era regravada inteira a
+cada requisição.
+
+Agora a sessão guarda só o id da conversa, e as mensagens ficam em uma única
+entrada do cache ``conversas`` (ver ``CACHES`` em ``web/settings.py``):
+
+* a lista funciona como um buffer circular com no máximo
+  ``CONVERSA_MAX_MENSAGENS`` mensagens; as mais antigas são descartadas;
+* cada mensagem é compacta: remetente, texto (cortado em
+  ``CONVERSA_MAX_CARACTERES``) e, nas respostas, só nome e link das fontes;
+* cada requisição faz uma leitura e uma escrita de tamanho limitado, por mais
+  longa que seja a conversa, e a entrada expira após ``CONVERSA_TTL`` segundos
+  sem uso.
+
+O backend do cache é escolhido por ``CONVERSAS_BACKEND``: ``arquivo`` (padrão,
+compartilhado entre os workers de um host), ``redis`` (compartilhado entre
+hosts; qualquer servidor compatível com Redis em ``REDIS_URL``, com o pacote
+``redis`` instalado) ou ``locmem`` (um por processo, só para um único worker).
+
+Duas mensagens simultâneas na mesma conversa não podem fazer a leitura e a
+escrita intercaladas, ou uma delas se perde. :meth:`Conversa.adicionar` faz as
+duas sob um lock por conversa, uma chave criada com ``cache.add``. O ``add``
+é atômico no ``redis`` e no ``locmem``; no ``arquivo``, o Django verifica e
+grava em dois passos, então resta uma janela muito menor, mas não nula, entre
+processos. Se o lock não sair em ``CONVERSA_LOCK_ESPERA`` segundos (um
+processo morto no meio da escrita, por exemplo), a escrita segue sem ele.
+"""
+
+import os
+import time
+import logging
+from uuid import uuid4
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONVERSAS_CACHE = "conversas"
+CONVERSA_MAX_MENSAGENS = int(os.getenv("CONVERSA_MAX_MENSAGENS", "20"))
+CONVERSA_MAX_CARACTERES = int(os.getenv("CONVERSA_MAX_CARACTERES", "4000"))
+CONVERSA_TTL = int(os.getenv("CONVERSA_TTL", str(7 * 24 * 3600)))
+CONVERSA_LOCK_ESPERA = float(os.getenv("CONVERSA_LOCK_ESPERA", "2"))
+# o lock expira sozinho se o processo que o tem morrer
+CONVERSA_LOCK_TTL = 5
+SESSAO_CHAVE = "conversa_id"
+
+logger = logging.getLogger(__name__)
+
+# remetentes em uma letra na forma compacta
+_REMETENTES = {"user": "u", "bot": "b"}
+_NOMES = {letra: nome for nome, letra in _REMETENTES.items()}
+
+
+def _compactar(sender: str, text: str, fontes=()) -> list:
+    """``[remetente, texto]`` ou, com fontes, ``[remetente, texto, [[fonte, link], ...]]``."""
+    item = [_REMETENTES[sender], str(text)[:CONVERSA_MAX_CARACTERES]]
+    fontes = [[f.get("fonte"), f.get("link")] for f in fontes or ()]
+    if fontes:
+        item.append(fontes)
+    return item
+
+
+def _expandir(item: list) -> dict:
+    mensagem = {"sender": _NOMES[item[0]], "text": item[1]}
+    if len(item) > 2:
+        mensagem["fontes"] = [{"fonte": fonte, "link": link} for fonte, link in item[2]]
+    return mensagem
+
+
+class Conversa:
+    """
+    Conversa de uma sessão, guardada no cache como um buffer circular.
+
+    Args:
+        conversa_id (str): Id da conversa (guardado na sessão).
+        cache: Cache do Django; por padrão, ``caches["conversas"]``.
+        max_mensagens (int): Tamanho do buffer circular.
+        ttl (int): Segundos sem uso até a conversa expirar.
+    """
+
+    def __init__(self, conversa_id: str, cache=None, max_mensagens: int = CONVERSA_MAX_MENSAGENS,
+                 ttl: int = CONVERSA_TTL):
+        if cache is None:
+            from django.core.cache import caches
+
+            cache = caches[CONVERSAS_CACHE]
+        self.id = conversa_id
+        self.cache = cache
+        self.max_mensagens = max_mensagens
+        self.ttl = ttl
+
+    @classmethod
+    def da_sessao(cls, session, **kwargs) -> "Conversa":
+        """Conversa da sessão do Django; a sessão só é alterada ao criar o id."""
+        conversa_id = session.get(SESSAO_CHAVE)
+        if conversa_id is None:
+            conversa_id = session[SESSAO_CHAVE] = uuid4().hex
+        # sessões antigas guardavam o histórico inteiro
+        session.pop("messages", None)
+        return cls(conversa_id, **kwargs)
+
+    @property
+    def _chave(self) -> str:
+        return f"conversa:{self.id}"
+
+    def mensagens(self) -> list[dict]:
+        """Mensagens da conversa, da mais antiga para a mais recente (``sender``, ``text``, ``fontes``)."""
+        return [_expandir(item) for item in self.cache.get(self._chave, [])]
+
+    @contextmanager
+    def _bloqueio(self):
+        """Lock da conversa entre requisições (ver o docstring do módulo)."""
+        chave = f"{self._chave}:lock"
+        limite = time.monotonic() + CONVERSA_LOCK_ESPERA
+        while not self.cache.add(chave, 1, CONVERSA_LOCK_TTL):
+            if time.monotonic() >= limite:
+                logger.warning(f"Lock da conversa {self.id} não obtido em {CONVERSA_LOCK_ESPERA}s; gravando sem ele")
+                yield
+                return
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self.cache.delete(chave)
+
+    def adicionar(self, *mensagens: dict) -> list[dict]:
+        """
+        Acrescenta mensagens (dicionários com ``sender``, ``text`` e, opcionalmente,
+        ``fontes``) em uma única escrita, descartando as mais antigas além do limite.
+
+        Returns:
+            list[dict]: A conversa atualizada.
+        """
+        with self._bloqueio():
+            itens = self.cache.get(self._chave, [])
+            itens.extend(_compactar(m["sender"], m["text"], m.get("fontes")) for m in mensagens)
+            itens = itens[-self.max_mensagens:] if self.max_mensagens > 0 else []
+            self.cache.set(self._chave, itens, self.ttl)
+        return [_expandir(item) for item in itens]
+
+    def limpar(self):
+        self.cache.delete(self._chave)
@@ -0,0 +1,207 @@
+"""
+Docstore em SQLite para as versões do índice FAISS.
+
+O vector store do LangChain guarda o texto e os metadados de todos os trechos
+em um único pickle (``index.pkl``), que precisa ser desserializado inteiro ao
+subir cada worker, com ``allow_dangerous_deserialization=True``. O tempo de
+carga e a memória crescem com a base.
+
+Cada versão publicada por :func:`chatbot.index_store.publish` passa a trazer
+um ``docstore.sqlite3`` com uma linha por vetor, indexada pela posição do vetor
+no FAISS. O processo web abre o arquivo somente leitura e busca só as linhas
+dos ``k`` resultados de cada consulta (:class:`SQLiteDocstore`). O mapeamento
+posição -> id do documento deixa de ser um dicionário em memória
+(:class:`PosicoesDocstore`). Nada é desserializado com pickle.
+
+Versões antigas, só com ``index.pkl``, continuam sendo abertas pelo pickle.
+Para convertê-las::
+
+    python -m chatbot.docstore FAISS/
+"""
+
+import os
+import sys
+import json
+import pickle
+import sqlite3
+import threading
+from pathlib import Path
+from collections.abc import Mapping
+
+DOCSTORE_FILE = "docstore.sqlite3"
+LEGACY_FILE = "index.pkl"
+_LOTE = 5000
+
+
+def _documento(doc_id, texto, metadata):
+    from langchain_core.documents import Document
+
+    return Document(page_content=texto, metadata=json.loads(metadata), id=doc_id)
+
+
+def salvar(docstore, index_to_docstore_id: dict, destino) -> Path:
+    """
+    Grava os documentos de um vector store em ``<destino>/docstore.sqlite3``.
+
+    Args:
+        docstore: Docstore do LangChain com ``search(id)``.
+        index_to_docstore_id (dict): Posição no FAISS -> id do documento.
+        destino: Diretório da versão.
+    """
+    caminho = Path(destino) / DOCSTORE_FILE
+    tmp = caminho.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    db = sqlite3.connect(str(tmp))
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        db.execute("CREATE TABLE docs (pos INTEGER PRIMARY KEY, id TEXT, texto TEXT NOT NULL, metadata TEXT NOT NULL)")
+        linhas = []
+        for pos, doc_id in sorted(index_to_docstore_id.items()):
+            doc = docstore.search(doc_id)
+            if isinstance(doc, str):
+                raise ValueError(f"Documento {doc_id} (posição {pos}) não encontrado no docstore")
+            linhas.append((int(pos), str(doc_id), doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str)))
+            if len(linhas) >= _LOTE:
+                db.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", linhas)
+                linhas = []
+        db.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", linhas)
+        db.commit()
+    finally:
+        db.close()
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, caminho)
+    return caminho
+
+
+class SQLiteDocstore:
+    """
+    Docstore somente leitura que busca cada documento no SQLite sob demanda.
+
+    Segue a interface ``search(id) -> Document | str`` dos docstores do
+    LangChain, com a posição do vetor no FAISS como id.
+
+    Args:
+        caminho: Arquivo ``docstore.sqlite3`` de uma versão publicada.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._conectar()
+        self.total = self._db.execute("SELECT COALESCE(MAX(pos) + 1, 0) FROM docs").fetchone()[0]
+
+    def _conectar(self):
+        # as versões são imutáveis: immutable=1 dispensa locks de arquivo do SQLite
+        self._db = sqlite3.connect(
+            f"file:{self.caminho}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._pid = os.getpid()
+
+    def search(self, search):
+        with self._lock:
+            # uma conexão SQLite não pode ser usada por processos filhos (preload + fork)
+            if self._pid != os.getpid():
+                self._conectar()
+            linha = self._db.execute(
+                "SELECT id, texto, metadata FROM docs WHERE pos = ?", (int(search),)
+            ).fetchone()
+        if linha is None:
+            return f"ID {search} not found."
+        return _documento(*linha)
+
+    def todos(self):
+        """Itera ``(posição, Document)`` em ordem, sem carregar tudo de uma vez."""
+        db = sqlite3.connect(f"file:{self.caminho}?mode=ro&immutable=1", uri=True)
+        try:
+            for pos, *resto in db.execute("SELECT pos, id, texto, metadata FROM docs ORDER BY pos"):
+                yield pos, _documento(*resto)
+        finally:
+            db.close()
+
+    def add(self, texts: dict):
+        raise RuntimeError("SQLiteDocstore é somente leitura; publique uma nova versão do índice")
+
+    def delete(self, ids: list):
+        raise RuntimeError("SQLiteDocstore é somente leitura; publique uma nova versão do índice")
+
+    def fechar(self):
+        self._db.close()
+
+
+class PosicoesDocstore(Mapping):
+    """
+    Substitui o dicionário ``index_to_docstore_id`` do LangChain: a posição
+    ``i`` do FAISS é o próprio id no :class:`SQLiteDocstore`.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+
+    def __getitem__(self, i):
+        if not 0 <= int(i) < self.total:
+            raise KeyError(i)
+        return int(i)
+
+    def __iter__(self):
+        return iter(range(self.total))
+
+    def __len__(self):
+        return self.total
+
+
+def abrir(path):
+    """
+    Abre o docstore de uma versão para leitura.
+
+    Returns:
+        tuple: ``(docstore, index_to_docstore_id)`` prontos para o construtor
+        do ``FAISS`` do LangChain. Usa o ``docstore.sqlite3`` quando existe e,
+        em versões antigas, desserializa o ``index.pkl``.
+    """
+    path = Path(path)
+    if (path / DOCSTORE_FILE).exists():
+        docstore = SQLiteDocstore(path / DOCSTORE_FILE)
+        return docstore, PosicoesDocstore(docstore.total)
+    with open(path / LEGACY_FILE, "rb") as f:
+        return pickle.load(f)
+
+
+def carregar_em_memoria(path):
+    """
+    Carrega o docstore inteiro em um ``InMemoryDocstore``, para quem vai
+    acrescentar documentos (o crawler).
+
+    Returns:
+        tuple: ``(InMemoryDocstore, dict posição -> id)``.
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    docstore, ids = abrir(path)
+    if not isinstance(docstore, SQLiteDocstore):
+        return docstore, ids
+    documentos, index_to_docstore_id = {}, {}
+    for pos, doc in docstore.todos():
+        documentos[doc.id] = doc
+        index_to_docstore_id[pos] = doc.id
+    docstore.fechar()
+    return InMemoryDocstore(documentos), index_to_docstore_id
+
+
+def converter(path) -> Path:
+    """Gera ``docstore.sqlite3`` a partir do ``index.pkl`` de uma versão já publicada."""
+    path = Path(path)
+    with open(path / LEGACY_FILE, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return salvar(docstore, index_to_docstore_id, path)
+
+
+if __name__ == "__main__":
+    from chatbot import index_store
+
+    raiz = sys.argv[1] if len(sys.argv) > 1 else "FAISS/"
+    atual = index_store.current_path(raiz)
+    if atual is None:
+        sys.exit(f"Nenhum índice em {raiz}")
+    print(f"{atual}: {converter(atual)} gravado")
@@ -0,0 +1,228 @@
+"""
+Backends de embeddings para CPU e cache de embeddings de perguntas.
+
+O backend é escolhido pela variável ``EMBEDDINGS_BACKEND``:
+
+* ``torch`` (padrão): ``HuggingFaceEmbeddings`` com PyTorch, como antes;
+* ``int8``: o mesmo modelo com as camadas lineares quantizadas dinamicamente
+  para int8 (``torch.quantization.quantize_dynamic``). Os vetores mudam pouco
+  e continuam compatíveis com o índice existente; ``benchmarks/bench_embeddings.py``
+  mede o impacto no recall;
+* ``onnx``: o encoder exportado para ONNX e executado com ONNX Runtime
+  (requer ``pip install onnxruntime``). Aplica o mesmo mean pooling e
+  normalização do ``all-MiniLM-L6-v2``, então os vetores são equivalentes aos
+  do PyTorch e o índice existente continua válido.
+
+Se o backend escolhido produzir vetores incompatíveis com o índice (por exemplo,
+ao trocar de modelo), basta reindexar com o mesmo backend::
+
+    EMBEDDINGS_BACKEND=int8 python build_faiss.py
+
+Em qualquer backend, :class:`CachedQueryEmbeddings` guarda os embeddings das
+perguntas mais recentes em um LRU limitado.
+"""
+
+import os
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")
+EMBEDDINGS_CACHE_SIZE = int(os.getenv("EMBEDDINGS_CACHE_SIZE", "1024"))
+ONNX_DIR = Path(os.getenv("EMBEDDINGS_ONNX_DIR", Path(__file__).resolve().parent.parent / "models" / "onnx"))
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Embeddings do MiniLM executados com ONNX Runtime.
+
+    Na primeira execução o encoder é exportado de PyTorch para
+    ``<onnx_dir>/model.onnx``; as seguintes só carregam o arquivo.
+
+    Args:
+        model_id (str): Modelo do Hugging Face Hub.
+        onnx_dir (Path): Diretório do modelo exportado.
+        max_length (int): Tokens máximos por texto (o MiniLM foi treinado com 256).
+        batch_size (int): Textos por lote em :meth:`embed_documents`.
+    """
+
+    def __init__(self, model_id: str = HF_MODEL_ID, onnx_dir: Path = ONNX_DIR,
+                 max_length: int = 256, batch_size: int = 32):
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise ImportError(
+                "EMBEDDINGS_BACKEND=onnx requer o pacote 'onnxruntime' (pip install onnxruntime)."
+            ) from exc
+        from transformers import AutoTokenizer
+
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        caminho = Path(onnx_dir) / "model.onnx"
+        if not caminho.exists():
+            exportar_onnx(model_id, caminho)
+
+        opcoes = ort.SessionOptions()
+        opcoes.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(caminho), opcoes, providers=["CPUExecutionProvider"])
+        self._entradas = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, textos: list[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            textos, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        entradas = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._entradas}
+        ultima_camada = self.session.run(None, entradas)[0]
+        # mean pooling + normalização L2, como o pipeline do sentence-transformers
+        mascara = tokens["attention_mask"][..., None].astype(np.float32)
+        vetores = (ultima_camada * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+        return vetores / np.clip(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vetores = [
+            self._encode(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return np.vstack(vetores).tolist() if vetores else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0].tolist()
+
+
+def exportar_onnx(model_id: str, destino: Path):
+    """Exporta o encoder ``model_id`` para ONNX com eixos dinâmicos de lote e sequência."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    modelo = AutoModel.from_pretrained(model_id).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    exemplo = tokenizer(["exemplo de texto"], return_tensors="pt")
+    nomes = list(exemplo.keys())
+    eixos = {nome: {0: "lote", 1: "seq"} for nome in nomes}
+    eixos["last_hidden_state"] = {0: "lote", 1: "seq"}
+
+    tmp = destino.with_suffix(".tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            modelo,
+            tuple(exemplo[n] for n in nomes),
+            str(tmp),
+            input_names=nomes,
+            output_names=["last_hidden_state"],
+            dynamic_axes=eixos,
+            opset_version=14,
+        )
+    os.replace(tmp, destino)
+
+
+def _huggingface_int8():
+    import torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    emb = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    transformer = emb.client[0]
+    transformer.auto_model = torch.quantization.quantize_dynamic(
+        transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return emb
+
+
+def criar_embeddings(backend: str = EMBEDDINGS_BACKEND) -> Embeddings:
+    """
+    Cria o objeto de embeddings para o ``backend`` escolhido.
+
+    Args:
+        backend (str): ``"torch"``, ``"int8"`` ou ``"onnx"``.
+    """
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    if backend == "int8":
+        return _huggingface_int8()
+    if backend == "onnx":
+        return OnnxEmbeddings()
+    raise ValueError(f"EMBEDDINGS_BACKEND desconhecido: {backend!r} (use torch, int8 ou onnx)")
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Envolve um ``Embeddings`` guardando os embeddings de perguntas em um LRU.
+
+    Apenas :meth:`embed_query` usa o cache; :meth:`embed_documents` é repassado
+    direto, já que documentos raramente se repetem.
+
+    Args:
+        base (Embeddings): Embeddings reais.
+        max_entries (int): Tamanho máximo do cache (<= 0 desativa).
+    """
+
+    def __init__(self, base: Embeddings, max_entries: int = EMBEDDINGS_CACHE_SIZE):
+        self.base = base
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.max_entries <= 0:
+            return self.base.embed_query(text)
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return list(self._cache[text])
+            self.misses += 1
+
+        vetor = self.base.embed_query(text)
+        with self._lock:
+            self._cache[text] = tuple(vetor)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vetor
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeddings de várias perguntas: as que não estão no cache passam pelo
+        modelo em um único lote (``embed_documents``; o MiniLM não distingue
+        pergunta de documento).
+        """
+        vetores, faltantes = {}, []
+        with self._lock:
+            for text in texts:
+                if self.max_entries > 0 and text in self._cache:
+                    self._cache.move_to_end(text)
+                    self.hits += 1
+                    vetores[text] = list(self._cache[text])
+                elif text not in vetores and text not in faltantes:
+                    self.misses += 1
+                    faltantes.append(text)
+
+        if faltantes:
+            novos = self.base.embed_documents(faltantes)
+            with self._lock:
+                for text, vetor in zip(faltantes, novos):
+                    vetores[text] = list(vetor)
+                    if self.max_entries > 0:
+                        self._cache[text] = tuple(vetor)
+                while len(self._cache) > max(self.max_entries, 0):
+                    self._cache.popitem(last=False)
+        return [vetores[text] for text in texts]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
@@ -0,0 +1,343 @@
+"""
+Filtros por data e fonte e decaimento por recência na recuperação.
+
+Notícias envelhecem, mas a busca vetorial não sabe disso: um trecho antigo
+concorre em pé de igualdade com um recente, e filtrar os resultados depois da
+busca desperdiça as vagas do top-k. Este módulo permite restringir a busca
+*antes* dela:
+
+* :class:`IndiceMetadados` guarda, por posição do FAISS, o dia de
+  ``data_coleta`` e a fonte do trecho. As posições ficam também ordenadas por
+  dia, de modo que um intervalo de datas vira uma fatia contígua (uma partição)
+  encontrada por busca binária. O arquivo ``filtros.npz`` é gravado em cada
+  versão do índice por :func:`chatbot.index_store.publish`;
+* :class:`Filtros` descreve o que uma consulta pede (campos opcionais do JSON
+  de ``/ask/``) e :meth:`IndiceMetadados.posicoes` o converte nas posições
+  permitidas, que :func:`chatbot.ann.buscar` e :meth:`chatbot.bm25.IndiceBM25.buscar`
+  usam durante a busca;
+* com ``recencia_dias``, cada candidato tem o score multiplicado por
+  ``0.5 ** (idade / recencia_dias)`` (:meth:`IndiceMetadados.pesos`), antes e
+  depois do cross-encoder;
+* o FAISS, o docstore e o BM25 só crescem. Quando o crawler republica uma
+  página revisitada, os trechos antigos do mesmo ``link`` recebem
+  ``"removido": true`` nos metadados (:func:`marcar_removidos`) e ficam fora
+  de todas as buscas, com ou sem filtros. Sem filtros, enquanto forem até
+  ``FILTROS_SOBREBUSCA_MAX``, a busca continua sem seletor (o caminho mais
+  rápido, e com o recall normal do HNSW/IVF): pede ``k`` mais o número de
+  removidos e os descarta depois (:meth:`IndiceMetadados.sem_removidos`).
+  Acima disso, toda busca passa a levar as posições ativas, e o ``build_faiss.py``,
+  que refaz o índice sem os removidos, é o passo de compactação.
+
+Para gerar ``filtros.npz`` em uma versão já publicada::
+
+    python -m chatbot.filtros FAISS/
+"""
+
+import os
+import sys
+from pathlib import Path
+from datetime import date
+from urllib.parse import urlparse
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FILTROS_FILE = "filtros.npz"
+# até quantos trechos removidos uma busca sem filtros só pede mais resultados e os descarta
+FILTROS_SOBREBUSCA_MAX = int(os.getenv("FILTROS_SOBREBUSCA_MAX", "256"))
+# dia (ordinal) dos trechos sem data_coleta válida: ficam fora de qualquer filtro de data
+SEM_DATA = -1
+SEM_FONTE = ""
+# chave dos metadados que marca um trecho substituído por uma versão mais nova da página
+REMOVIDO = "removido"
+
+
+def _dia(valor) -> int:
+    """Ordinal do dia de uma data ISO (``2025-08-26`` ou ``2025-08-26T15:19:26``)."""
+    try:
+        return date.fromisoformat(str(valor)[:10]).toordinal()
+    except ValueError:
+        return SEM_DATA
+
+
+def _host(fonte: str) -> str:
+    """Normaliza uma fonte (host ou URL) para comparação: minúsculas, sem esquema nem ``www.``."""
+    fonte = str(fonte or "").strip().lower()
+    if "//" in fonte:
+        fonte = urlparse(fonte).netloc
+    fonte = fonte.split("/")[0]
+    return fonte[4:] if fonte.startswith("www.") else fonte
+
+
+class Filtros:
+    """
+    Restrições de uma consulta.
+
+    Args:
+        data_inicio (date | None): Primeiro dia de ``data_coleta`` aceito.
+        data_fim (date | None): Último dia aceito.
+        fontes (list[str]): Fontes aceitas; ``gov.br`` aceita também os
+            subdomínios (``www.gov.br``, ``educacao.df.gov.br``).
+        recencia_dias (float | None): Meia-vida, em dias, do decaimento por
+            recência; ``None`` desativa o decaimento.
+    """
+
+    CAMPOS = ("data_inicio", "data_fim", "fontes", "recencia_dias")
+
+    def __init__(self, data_inicio: date | None = None, data_fim: date | None = None,
+                 fontes: list[str] = (), recencia_dias: float | None = None):
+        if data_inicio and data_fim and data_inicio > data_fim:
+            raise ValueError("data_inicio posterior a data_fim")
+        if recencia_dias is not None and recencia_dias <= 0:
+            raise ValueError("recencia_dias deve ser positivo")
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.fontes = tuple(sorted({_host(f) for f in fontes if _host(f)}))
+        self.recencia_dias = recencia_dias
+
+    @classmethod
+    def de_json(cls, dados: dict) -> "Filtros | None":
+        """
+        Lê os campos opcionais ``data_inicio``, ``data_fim`` (``AAAA-MM-DD``),
+        ``fontes`` (texto ou lista) e ``recencia_dias`` de um corpo JSON.
+
+        Returns:
+            Filtros | None: ``None`` se nenhum dos campos foi enviado.
+
+        Raises:
+            ValueError: Se algum campo for inválido.
+        """
+        if not any(dados.get(campo) not in (None, "", []) for campo in cls.CAMPOS):
+            return None
+
+        datas = {}
+        for campo in ("data_inicio", "data_fim"):
+            valor = dados.get(campo)
+            try:
+                datas[campo] = date.fromisoformat(valor) if valor else None
+            except (TypeError, ValueError):
+                raise ValueError(f"{campo} inválida: use AAAA-MM-DD") from None
+
+        fontes = dados.get("fontes") or []
+        if isinstance(fontes, str):
+            fontes = [fontes]
+        if not isinstance(fontes, list) or not all(isinstance(f, str) for f in fontes):
+            raise ValueError("fontes deve ser um texto ou uma lista de textos")
+
+        recencia = dados.get("recencia_dias")
+        if recencia is not None:
+            try:
+                recencia = float(recencia)
+            except (TypeError, ValueError):
+                raise ValueError("recencia_dias deve ser um número") from None
+
+        return cls(fontes=fontes, recencia_dias=recencia, **datas)
+
+    @property
+    def restringe(self) -> bool:
+        """Verdadeiro se o filtro exclui trechos (e não só os reordena)."""
+        return bool(self.data_inicio or self.data_fim or self.fontes)
+
+    def chave(self) -> str:
+        """Representação estável, usada para separar as entradas do cache semântico."""
+        return "|".join([
+            self.data_inicio.isoformat() if self.data_inicio else "",
+            self.data_fim.isoformat() if self.data_fim else "",
+            ",".join(self.fontes),
+            f"{self.recencia_dias:g}" if self.recencia_dias else "",
+        ])
+
+    def __repr__(self):
+        return f"Filtros({self.chave()!r})"
+
+
+class IndiceMetadados:
+    """
+    Dia de coleta e fonte de cada trecho, indexados pela posição no FAISS.
+
+    Como no :class:`chatbot.bm25.IndiceBM25`, trechos só são acrescentados no
+    fim (:meth:`adicionar`), na mesma ordem dos vetores. Os trechos removidos
+    (ver :func:`marcar_removidos`) continuam ocupando a sua posição.
+    """
+
+    def __init__(self):
+        self.dias = np.empty(0, dtype=np.int32)
+        self.fontes = np.empty(0, dtype=np.int32)  # código em self.nomes
+        self.removidos = np.empty(0, dtype=bool)
+        self.nomes = []
+        self._codigos = {}
+        self._ordem = None  # posições ordenadas por dia (partições por data)
+        self._ativas = None  # posições não removidas, quando há removidas demais para a sobrebusca
+        self._total_removidos = None
+
+    @property
+    def total(self) -> int:
+        return len(self.dias)
+
+    def _codigo(self, fonte: str) -> int:
+        nome = _host(fonte) or SEM_FONTE
+        if nome not in self._codigos:
+            self._codigos[nome] = len(self.nomes)
+            self.nomes.append(nome)
+        return self._codigos[nome]
+
+    def adicionar(self, metadados: list[dict]) -> int:
+        """Registra os metadados dos trechos seguintes aos já existentes; retorna a primeira posição."""
+        inicio = self.total
+        dias = np.fromiter((_dia(m.get("data_coleta")) for m in metadados), dtype=np.int32, count=len(metadados))
+        fontes = np.fromiter((self._codigo(m.get("fonte")) for m in metadados), dtype=np.int32, count=len(metadados))
+        removidos = np.fromiter((bool(m.get(REMOVIDO)) for m in metadados), dtype=bool, count=len(metadados))
+        self.dias = np.concatenate([self.dias, dias])
+        self.fontes = np.concatenate([self.fontes, fontes])
+        self.removidos = np.concatenate([self.removidos, removidos])
+        self._ordem = None
+        self._ativas = None
+        self._total_removidos = None
+        return inicio
+
+    @property
+    def total_removidos(self) -> int:
+        if self._total_removidos is None:
+            self._total_removidos = int(self.removidos.sum())
+        return self._total_removidos
+
+    @property
+    def sobrebusca(self) -> int:
+        """Resultados a mais que uma busca sem posições deve pedir para descartar os removidos."""
+        removidos = self.total_removidos
+        return removidos if removidos <= FILTROS_SOBREBUSCA_MAX else 0
+
+    def sem_removidos(self, pares: list[tuple], k: int) -> list[tuple]:
+        """Os ``k`` primeiros pares ``(posição, score)`` que não são de trechos removidos."""
+        return [par for par in pares if not self.removidos[par[0]]][:k]
+
+    def _particoes(self):
+        if self._ordem is None:
+            ordem = np.argsort(self.dias, kind="stable")
+            self._ordem = (ordem, self.dias[ordem])
+        return self._ordem
+
+    def posicoes(self, filtros: Filtros | None) -> np.ndarray | None:
+        """
+        Posições permitidas por ``filtros``, em ordem crescente, sem as removidas.
+
+        Returns:
+            numpy.ndarray | None: ``None`` quando o filtro não restringe nada
+            e os removidos cabem na :attr:`sobrebusca` (a busca deve percorrer
+            o índice todo e descartar os removidos com :meth:`sem_removidos`).
+        """
+        if filtros is None or not filtros.restringe:
+            if self.total_removidos <= FILTROS_SOBREBUSCA_MAX:
+                return None
+            if self._ativas is None:
+                self._ativas = np.flatnonzero(~self.removidos).astype(np.int64)
+            return self._ativas
+
+        if filtros.data_inicio or filtros.data_fim:
+            ordem, dias = self._particoes()
+            inicio = filtros.data_inicio.toordinal() if filtros.data_inicio else SEM_DATA + 1
+            fim = filtros.data_fim.toordinal() if filtros.data_fim else np.iinfo(np.int32).max
+            posicoes = ordem[np.searchsorted(dias, inicio, "left"):np.searchsorted(dias, fim, "right")]
+        else:
+            posicoes = np.arange(self.total)
+
+        if filtros.fontes:
+            codigos = [
+                codigo for nome, codigo in self._codigos.items()
+                if any(nome == f or nome.endswith("." + f) for f in filtros.fontes)
+            ]
+            posicoes = posicoes[np.isin(self.fontes[posicoes], codigos)]
+        posicoes = posicoes[~self.removidos[posicoes]]
+        return np.sort(posicoes).astype(np.int64)
+
+    def pesos(self, posicoes, recencia_dias: float, hoje: date | None = None) -> np.ndarray:
+        """
+        Peso de recência ``0.5 ** (idade / recencia_dias)`` de cada posição.
+
+        Trechos sem data recebem o peso do trecho mais antigo da base.
+        """
+        dias = self.dias[np.asarray(posicoes, dtype=np.int64)]
+        conhecidos = self.dias[self.dias != SEM_DATA]
+        mais_antigo = int(conhecidos.min()) if len(conhecidos) else 0
+        dias = np.where(dias == SEM_DATA, mais_antigo, dias)
+        idade = np.maximum((hoje or date.today()).toordinal() - dias, 0)
+        return np.power(0.5, idade / recencia_dias)
+
+    def salvar(self, destino) -> Path:
+        """Grava o índice em ``<destino>/filtros.npz`` (sem pickle)."""
+        caminho = Path(destino) / FILTROS_FILE
+        with open(caminho, "wb") as f:
+            np.savez(f, dias=self.dias, fontes=self.fontes, removidos=self.removidos,
+                     nomes=np.array(self.nomes, dtype=str))
+            f.flush()
+            os.fsync(f.fileno())
+        return caminho
+
+    @classmethod
+    def carregar(cls, caminho) -> "IndiceMetadados":
+        indice = cls()
+        with np.load(caminho, allow_pickle=False) as dados:
+            indice.dias = dados["dias"]
+            indice.fontes = dados["fontes"]
+            # arquivos anteriores às remoções não têm o campo
+            indice.removidos = dados["removidos"] if "removidos" in dados.files else np.zeros(len(indice.dias), dtype=bool)
+            indice.nomes = [str(nome) for nome in dados["nomes"]]
+        indice._codigos = {nome: i for i, nome in enumerate(indice.nomes)}
+        return indice
+
+
+def abrir(path) -> IndiceMetadados | None:
+    """Carrega o ``filtros.npz`` de uma versão do índice, ou ``None`` se ela não tiver um."""
+    caminho = Path(path) / FILTROS_FILE
+    return IndiceMetadados.carregar(caminho) if caminho.exists() else None
+
+
+def construir(docstore, index_to_docstore_id, total: int) -> IndiceMetadados:
+    """Lê, em ordem de posição, os metadados de ``total`` trechos de um docstore."""
+    indice = IndiceMetadados()
+    indice.adicionar([docstore.search(index_to_docstore_id[pos]).metadata for pos in range(total)])
+    return indice
+
+
+def marcar_removidos(docstore, index_to_docstore_id, links) -> int:
+    """
+    Marca como removidos os trechos de ``links`` ainda ativos em um docstore em memória.
+
+    Usado pelo crawler antes de acrescentar a versão nova de páginas
+    revisitadas; a marca vai para o ``docstore.sqlite3`` e o ``filtros.npz``
+    da versão publicada em seguida.
+
+    Returns:
+        int: Quantos trechos foram marcados.
+    """
+    links = set(links)
+    if not links:
+        return 0
+    marcados = 0
+    for doc_id in index_to_docstore_id.values():
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, str) and doc.metadata.get("link") in links and not doc.metadata.get(REMOVIDO):
+            doc.metadata[REMOVIDO] = True
+            marcados += 1
+    return marcados
+
+
+def converter(path) -> Path:
+    """Gera ``filtros.npz`` para uma versão já publicada a partir do seu docstore."""
+    from . import docstore
+
+    path = Path(path)
+    documentos, index_to_docstore_id = docstore.abrir(path)
+    return construir(documentos, index_to_docstore_id, len(index_to_docstore_id)).salvar(path)
+
+
+if __name__ == "__main__":
+    from chatbot import index_store
+
+    raiz = sys.argv[1] if len(sys.argv) > 1 else "FAISS/"
+    atual = index_store.current_path(raiz)
+    if atual is None:
+        sys.exit(f"Nenhum índice em {raiz}")
+    print(f"{atual}: {converter(atual)} gravado")
@@ -0,0 +1,342 @@
+"""
+Armazenamento versionado do índice FAISS.
+
+Cada publicação do índice (``build_faiss.py`` ou crawler) grava uma nova versão
+imutável em ``FAISS/versions/<versao>/`` e, em seguida, troca atomicamente o
+ponteiro ``FAISS/CURRENT`` para ela. Leitores sempre resolvem o ponteiro e
+nunca veem um índice pela metade.
+
+Cada versão traz o ``index.faiss``, os textos e metadados dos trechos em
+``docstore.sqlite3`` (ver :mod:`chatbot.docstore`, no lugar do ``index.pkl`` do
+LangChain), os vetores brutos em ``vetores.npy``, que o processo web abre por
+memória mapeada (ver :mod:`chatbot.mmap_index`), o índice léxico ``bm25.npz``
+(ver :mod:`chatbot.bm25`) e a data e a fonte de cada trecho em ``filtros.npz``
+(ver :mod:`chatbot.filtros`).
+
+Diretórios antigos, sem ``CURRENT``, continuam funcionando: o próprio
+``FAISS/`` é tratado como a versão ``legacy`` até a primeira publicação.
+
+Quem escreve (``build_faiss.py``, o crawler ou o worker da fila de coletas,
+ver :mod:`crawler.fila`) lê a versão atual, acrescenta trechos e publica outra.
+Duas escritas simultâneas perderiam os trechos de uma delas, por isso elas
+acontecem dentro de :func:`bloqueio_escrita`, um lock de arquivo em
+``FAISS/.escrita.lock`` que vale entre processos.
+
+O :class:`IndexManager` é usado pelo processo web para perceber novas versões,
+carregá-las em segundo plano e trocá-las sem bloquear requisições em andamento.
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from uuid import uuid4
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+from . import docstore, filtros, mmap_index
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+INDEX_FILES = ("index.faiss", docstore.DOCSTORE_FILE)
+LOCK_FILE = ".escrita.lock"
+# raízes cujo lock de escrita a thread atual já tem (bloqueio_escrita é reentrante)
+_bloqueios = threading.local()
+
+
+# -------------------------------------------------------------------------
+# Layout em disco
+# -------------------------------------------------------------------------
+def _fsync(path: Path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def current_version(root) -> str | None:
+    """Retorna o nome da versão apontada por ``CURRENT`` (ou ``legacy``/``None``)."""
+    root = Path(root)
+    try:
+        versao = (root / CURRENT_FILE).read_text(encoding="utf-8").strip()
+        if versao:
+            return versao
+    except OSError:
+        pass
+    if (root / "index.faiss").exists():
+        return LEGACY_VERSION
+    return None
+
+
+def version_path(root, versao: str) -> Path:
+    """Diretório onde a versão ``versao`` está gravada."""
+    root = Path(root)
+    if versao == LEGACY_VERSION:
+        return root
+    return root / VERSIONS_DIR / versao
+
+
+def current_path(root) -> Path | None:
+    """Diretório da versão atual, ou ``None`` se ainda não existe índice."""
+    versao = current_version(root)
+    return version_path(root, versao) if versao else None
+
+
+def publish(vs, root, keep: int = 3, bm25=None) -> str:
+    """
+    Grava ``vs`` como uma nova versão e a torna a versão atual.
+
+    Args:
+        vs: Vector store do LangChain (``FAISS``) a ser salvo.
+        root: Diretório raiz do índice (ex.: ``FAISS/``).
+        keep (int): Quantas versões manter em disco (incluindo a nova).
+        bm25 (chatbot.bm25.IndiceBM25 | None): Índice léxico dos mesmos trechos,
+            na mesma ordem dos vetores.
+
+    Returns:
+        str: Nome da versão publicada.
+    """
+    root = Path(root)
+    versions = root / VERSIONS_DIR
+    versions.mkdir(parents=True, exist_ok=True)
+
+    if bm25 is not None and bm25.total != vs.index.ntotal:
+        raise ValueError(f"Índice BM25 com {bm25.total} trechos para {vs.index.ntotal} vetores")
+
+    versao = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid4().hex[:6]}"
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{versao}-", dir=versions))
+    try:
+        import faiss
+
+        faiss.write_index(vs.index, str(tmp_dir / "index.faiss"))
+        docstore.salvar(vs.docstore, vs.index_to_docstore_id, tmp_dir)
+        for nome in INDEX_FILES:
+            _fsync(tmp_dir / nome)
+        mmap_index.salvar_vetores(vs.index, tmp_dir)
+        filtros.construir(vs.docstore, vs.index_to_docstore_id, vs.index.ntotal).salvar(tmp_dir)
+        if bm25 is not None:
+            bm25.salvar(tmp_dir)
+        os.rename(tmp_dir, versions / versao)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    ponteiro_tmp = root / f".{CURRENT_FILE}.{versao}"
+    ponteiro_tmp.write_text(versao, encoding="utf-8")
+    _fsync(ponteiro_tmp)
+    os.replace(ponteiro_tmp, root / CURRENT_FILE)
+    logger.info(f"Índice FAISS publicado: versão {versao}")
+
+    _prune(root, keep)
+    return versao
+
+
+def _travar(f, bloquear: bool) -> bool:
+    """Tenta obter o lock exclusivo de ``f``; falso se outro processo o tem e ``bloquear`` é falso."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+            return True
+        while True:
+            try:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not bloquear:
+                    return False
+                time.sleep(0.5)
+    except BlockingIOError:
+        return False
+
+
+def _destravar(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueio_escrita(root):
+    """
+    Exclusão mútua entre processos que alteram o índice em ``root``.
+
+    Deve envolver toda a sequência ler a versão atual → alterar → :func:`publish`;
+    quem chega com o lock ocupado espera a escrita em andamento terminar. O
+    lock é do sistema operacional e é liberado mesmo se o processo morrer.
+    Na mesma thread ele é reentrante.
+    """
+    root = Path(root).resolve()
+    root.mkdir(parents=True, exist_ok=True)
+    travados = _bloqueios.__dict__.setdefault("raizes", set())
+    if root in travados:
+        yield
+        return
+    with open(root / LOCK_FILE, "a+b") as f:
+        if not _travar(f, bloquear=False):
+            logger.info(f"Aguardando outra escrita no índice em {root} terminar")
+            inicio = time.monotonic()
+            _travar(f, bloquear=True)
+            logger.info(f"Lock de escrita do índice obtido após {time.monotonic() - inicio:.1f} s")
+        travados.add(root)
+        try:
+            yield
+        finally:
+            travados.discard(root)
+            _destravar(f)
+
+
+def load_for_update(path, embeddings):
+    """
+    Carrega uma versão inteira em memória, como vector store ``FAISS`` mutável.
+
+    Usado por quem acrescenta trechos e publica uma nova versão (o crawler);
+    o processo web usa :func:`chatbot.mmap_index.carregar`.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    path = Path(path)
+    documentos, index_to_docstore_id = docstore.carregar_em_memoria(path)
+    return FAISS(embeddings, faiss.read_index(str(path / "index.faiss")), documentos, index_to_docstore_id)
+
+
+def _prune(root: Path, keep: int):
+    """Remove as versões mais antigas, preservando sempre a atual."""
+    atual = current_version(root)
+    versoes = sorted(
+        p for p in (root / VERSIONS_DIR).iterdir()
+        if p.is_dir() and not p.name.startswith(".")
+    )
+    for p in versoes[:-keep] if keep > 0 else []:
+        if p.name != atual:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+# -------------------------------------------------------------------------
+# Troca a quente no processo web
+# -------------------------------------------------------------------------
+class IndexHandle:
+    """
+    Uma versão carregada do índice e o número de requisições que a usam.
+
+    Attributes:
+        version (str): Nome da versão.
+        value: Objeto devolvido pelo ``loader`` do :class:`IndexManager`.
+        refs (int): Requisições em andamento usando esta versão.
+        retired (bool): Verdadeiro depois que uma versão mais nova foi publicada.
+    """
+
+    def __init__(self, version: str, value):
+        self.version = version
+        self.value = value
+        self.refs = 0
+        self.retired = False
+
+
+class IndexManager:
+    """
+    Mantém a versão atual do índice e a troca quando ``CURRENT`` muda.
+
+    O carregamento de uma nova versão acontece fora do lock (em uma thread de
+    monitoramento ou em :meth:`refresh`); apenas a troca do ponteiro em memória
+    é feita sob o lock. Versões antigas são liberadas quando a última
+    requisição que as usava termina.
+
+    Args:
+        root: Diretório raiz do índice.
+        loader: Função ``loader(path) -> value`` que carrega uma versão.
+        poll_interval (float): Intervalo, em segundos, entre verificações.
+        on_swap: Callback opcional chamado com o novo :class:`IndexHandle`.
+    """
+
+    def __init__(self, root, loader, poll_interval: float = 10.0, on_swap=None):
+        self.root = Path(root)
+        self.loader = loader
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self._current: IndexHandle | None = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self) -> str | None:
+        handle = self._current
+        return handle.version if handle else None
+
+    def refresh(self) -> bool:
+        """Carrega e ativa a versão apontada por ``CURRENT`` se ela for nova."""
+        with self._load_lock:
+            versao = current_version(self.root)
+            if versao is None or versao == self.version:
+                return False
+
+            value = self.loader(version_path(self.root, versao))
+            novo = IndexHandle(versao, value)
+
+            with self._lock:
+                antigo, self._current = self._current, novo
+                if antigo is not None:
+                    antigo.retired = True
+                    self._release_if_unused(antigo)
+
+        logger.info(f"Índice FAISS ativo: versão {versao}")
+        if self.on_swap is not None:
+            self.on_swap(novo)
+        return True
+
+    def start(self):
+        """Inicia a thread que verifica periodicamente novas versões."""
+        if self._thread is not None or self.poll_interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._watch, name="faiss-index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Falha ao carregar nova versão do índice: {e}")
+
+    @contextmanager
+    def acquire(self):
+        """
+        Reserva a versão atual durante o bloco ``with``.
+
+        Yields:
+            IndexHandle | None: A versão em uso, ou ``None`` se não há índice.
+        """
+        with self._lock:
+            handle = self._current
+            if handle is not None:
+                handle.refs += 1
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                with self._lock:
+                    handle.refs -= 1
+                    self._release_if_unused(handle)
+
+    def _release_if_unused(self, handle: IndexHandle):
+        if handle.retired and handle.refs == 0 and handle.value is not None:
+            handle.value = None
+            logger.info(f"Versão {handle.version} do índice liberada")
@@ -0,0 +1,151 @@
+"""
+Divisão de artigos em trechos (chunks) para indexação.
+
+Os artigos são quebrados em sentenças e as sentenças são agrupadas em trechos
+que respeitam um orçamento de tokens (o MiniLM trunca entradas longas), com
+sobreposição de algumas sentenças entre trechos vizinhos. Cada trecho carrega
+os metadados do artigo (``fonte``, ``link``, ``titulo``, ``data_coleta``) mais
+a sua posição no artigo.
+
+Usado tanto por ``build_faiss.py`` quanto pelo ingestor do crawler, para que o
+build completo e a atualização incremental gerem exatamente os mesmos trechos.
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+SOBREPOSICAO_TOKENS = int(os.getenv("CHUNK_SOBREPOSICAO_TOKENS", "40"))
+CAMPOS_METADADOS = ("fonte", "link", "titulo", "data_coleta")
+
+_FIM_SENTENCA = re.compile(r"(?<=[.!?…])\s+(?=[\"“'(\[]?[A-ZÀ-Ú0-9])")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def contar_tokens_aproximado(texto: str) -> int:
+    """
+    Estimativa barata do número de tokens WordPiece.
+
+    Palavras longas costumam virar mais de um sub-token; a estimativa conta
+    uma peça a cada 6 caracteres de cada palavra, mais a pontuação.
+    """
+    return sum(1 + (len(t) - 1) // 6 for t in _TOKEN.findall(texto))
+
+
+def contador_hf(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    """Retorna um contador de tokens exato usando o tokenizador do modelo de embeddings."""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return lambda texto: len(tokenizer.tokenize(texto))
+
+
+def dividir_sentencas(texto: str) -> list[str]:
+    """Quebra ``texto`` em sentenças, tratando quebras de linha como limites de parágrafo."""
+    sentencas = []
+    for paragrafo in re.split(r"\n\s*\n|\n", texto):
+        paragrafo = paragrafo.strip()
+        if paragrafo:
+            sentencas.extend(s.strip() for s in _FIM_SENTENCA.split(paragrafo) if s.strip())
+    return sentencas
+
+
+def _quebrar_sentenca_longa(sentenca: str, max_tokens: int, contar) -> list[str]:
+    partes, atual = [], []
+    for palavra in sentenca.split():
+        if atual and contar(" ".join(atual + [palavra])) > max_tokens:
+            partes.append(" ".join(atual))
+            atual = []
+        atual.append(palavra)
+    if atual:
+        partes.append(" ".join(atual))
+    return partes
+
+
+def dividir_texto(
+    texto: str,
+    max_tokens: int = MAX_TOKENS,
+    sobreposicao: int = SOBREPOSICAO_TOKENS,
+    contar=contar_tokens_aproximado,
+) -> list[str]:
+    """
+    Agrupa as sentenças de ``texto`` em trechos de até ``max_tokens`` tokens.
+
+    Args:
+        texto (str): Texto do artigo.
+        max_tokens (int): Orçamento de tokens por trecho.
+        sobreposicao (int): Tokens (em sentenças inteiras) repetidos no início
+            do trecho seguinte.
+        contar: Função ``contar(texto) -> int`` usada para medir tokens.
+
+    Returns:
+        list[str]: Trechos na ordem em que aparecem no texto.
+    """
+    sentencas = []
+    for s in dividir_sentencas(texto):
+        n = contar(s)
+        if n > max_tokens:
+            sentencas.extend((p, contar(p)) for p in _quebrar_sentenca_longa(s, max_tokens, contar))
+        else:
+            sentencas.append((s, n))
+
+    trechos, atual, tokens = [], [], 0
+    for sentenca, n in sentencas:
+        if atual and tokens + n > max_tokens:
+            trechos.append(" ".join(s for s, _ in atual))
+            # mantém as últimas sentenças que cabem na sobreposição
+            cauda, total = [], 0
+            for s, m in reversed(atual):
+                if total + m > sobreposicao or total + m + n > max_tokens:
+                    break
+                cauda.insert(0, (s, m))
+                total += m
+            atual, tokens = cauda, total
+        atual.append((sentenca, n))
+        tokens += n
+    if atual:
+        trechos.append(" ".join(s for s, _ in atual))
+    return trechos
+
+
+def dividir_artigo(artigo: dict, **kwargs) -> list[dict]:
+    """
+    Divide um artigo (no formato da camada bronze) em trechos com metadados.
+
+    O título é repetido no início de cada trecho para que trechos do meio do
+    artigo continuem identificáveis na busca.
+
+    Args:
+        artigo (dict): Artigo com ``texto`` e, opcionalmente, ``titulo``,
+            ``fonte``, ``link`` e ``data_coleta``.
+        **kwargs: Repassados para :func:`dividir_texto`.
+
+    Returns:
+        list[dict]: Itens ``{"texto": ..., "metadata": {...}}``.
+    """
+    titulo = artigo.get("titulo") or ""
+    contar = kwargs.get("contar", contar_tokens_aproximado)
+    # o título repetido também consome o orçamento de tokens do trecho
+    kwargs["max_tokens"] = max(32, kwargs.get("max_tokens", MAX_TOKENS) - contar(titulo) - 1)
+    trechos = dividir_texto(artigo.get("texto", ""), **kwargs)
+    base = {campo: artigo.get(campo) for campo in CAMPOS_METADADOS}
+    return [
+        {
+            "texto": f"{titulo} - {trecho}" if titulo else trecho,
+            "metadata": {**base, "chunk": i, "n_chunks": len(trechos)},
+        }
+        for i, trecho in enumerate(trechos)
+    ]
+
+
+def dividir_artigos(artigos: list[dict], **kwargs) -> tuple[list[str], list[dict]]:
+    """Divide vários artigos, retornando as listas paralelas ``(textos, metadados)``."""
+    textos, metadados = [], []
+    for artigo in artigos:
+        for trecho in dividir_artigo(artigo, **kwargs):
+            textos.append(trecho["texto"])
+            metadados.append(trecho["metadata"])
+    return textos, metadados
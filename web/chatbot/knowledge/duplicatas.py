@@ -0,0 +1,206 @@
+"""
+Detecção de quase-duplicatas antes da vetorização.
+
+Cada texto recebe uma assinatura MinHash calculada sobre shingles de palavras.
+As assinaturas ficam em um SQLite junto com um índice LSH (bandas), de modo que
+verificar um documento novo consulta apenas os candidatos que colidem em alguma
+banda, e não a base inteira. Os candidatos são confirmados pela similaridade de
+Jaccard estimada a partir das assinaturas.
+
+Usado por ``build_faiss.py`` (que recria as impressões a cada build completo)
+e pelo crawler (que consulta e acrescenta impressões a cada coleta).
+"""
+
+import os
+import re
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_PRIMO = np.uint64(4294967311)  # primo > 2**32
+_SEMENTE = 20250826
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+IMPRESSOES_PATH = DATA_DIR / "duplicatas.sqlite3"
+RELATORIO_PATH = DATA_DIR / "duplicatas_relatorio.json"
+DEDUP_LIMIAR = float(os.getenv("DEDUP_LIMIAR", "0.6"))
+
+
+def _normalizar(texto: str) -> list[str]:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"\w+", texto)
+
+
+def shingles(texto: str, tamanho: int = 3) -> set[int]:
+    """Conjunto de shingles de ``tamanho`` palavras, como hashes de 32 bits."""
+    palavras = _normalizar(texto)
+    if len(palavras) < tamanho:
+        return {zlib.crc32(" ".join(palavras).encode())} if palavras else set()
+    return {
+        zlib.crc32(" ".join(palavras[i:i + tamanho]).encode())
+        for i in range(len(palavras) - tamanho + 1)
+    }
+
+
+class IndiceDuplicatas:
+    """
+    Índice persistente de impressões MinHash com LSH.
+
+    Args:
+        caminho: Arquivo SQLite das impressões (``":memory:"`` para uso temporário).
+        limiar (float): Similaridade de Jaccard estimada a partir da qual um
+            texto é considerado duplicata.
+        num_perm (int): Número de permutações (tamanho da assinatura).
+        bandas (int): Número de bandas do LSH; ``num_perm`` deve ser divisível
+            por ele. Mais bandas encontram pares menos parecidos (mais candidatos).
+        tamanho_shingle (int): Palavras por shingle.
+        recriar (bool): Se verdadeiro, descarta as impressões existentes.
+    """
+
+    def __init__(
+        self,
+        caminho,
+        limiar: float = 0.6,
+        num_perm: int = 128,
+        bandas: int = 32,
+        tamanho_shingle: int = 3,
+        recriar: bool = False,
+    ):
+        if num_perm % bandas:
+            raise ValueError("num_perm deve ser divisível por bandas")
+        self.limiar = limiar
+        self.num_perm = num_perm
+        self.bandas = bandas
+        self.linhas = num_perm // bandas
+        self.tamanho_shingle = tamanho_shingle
+
+        rnd = np.random.RandomState(_SEMENTE)
+        self._a = rnd.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rnd.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+
+        if caminho != ":memory:":
+            Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(caminho), check_same_thread=False)
+        self._criar_tabelas(recriar)
+        self.ignorados: dict[str, list[dict]] = {}
+
+    def _criar_tabelas(self, recriar: bool):
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            config = f"{self.num_perm}:{self.bandas}:{self.tamanho_shingle}:{_SEMENTE}"
+            atual = self._db.execute("SELECT valor FROM meta WHERE chave = 'config'").fetchone()
+            if recriar or (atual and atual[0] != config):
+                self._db.execute("DROP TABLE IF EXISTS docs")
+                self._db.execute("DROP TABLE IF EXISTS bandas")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, assinatura BLOB NOT NULL, titulo TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS bandas (banda INTEGER NOT NULL, hash INTEGER NOT NULL, doc_id TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_bandas ON bandas (banda, hash)")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (config,))
+
+    def assinatura(self, texto: str) -> np.ndarray:
+        """Assinatura MinHash (``num_perm`` inteiros sem sinal) de ``texto``."""
+        hashes = np.fromiter(shingles(texto, self.tamanho_shingle), dtype=np.uint64)
+        if hashes.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        valores = (np.outer(hashes, self._a) + self._b) % _PRIMO
+        return valores.min(axis=0)
+
+    def _hashes_bandas(self, assinatura: np.ndarray) -> list[int]:
+        return [
+            zlib.crc32(assinatura[i * self.linhas:(i + 1) * self.linhas].tobytes())
+            for i in range(self.bandas)
+        ]
+
+    def buscar(self, texto: str, assinatura: np.ndarray | None = None) -> tuple[str | None, float]:
+        """
+        Procura um documento já indexado parecido com ``texto``.
+
+        Returns:
+            tuple: ``(id, similaridade)`` do documento mais parecido acima do
+            limiar, ou ``(None, 0.0)``.
+        """
+        if assinatura is None:
+            assinatura = self.assinatura(texto)
+        consultas = list(enumerate(self._hashes_bandas(assinatura)))
+        with self._lock:
+            candidatos = set()
+            for banda, h in consultas:
+                linhas = self._db.execute(
+                    "SELECT doc_id FROM bandas WHERE banda = ? AND hash = ?", (banda, h)
+                ).fetchall()
+                candidatos.update(r[0] for r in linhas)
+            melhor, similaridade = None, 0.0
+            for doc_id in candidatos:
+                linha = self._db.execute("SELECT assinatura FROM docs WHERE id = ?", (doc_id,)).fetchone()
+                outra = np.frombuffer(linha[0], dtype=np.uint64)
+                sim = float(np.mean(outra == assinatura))
+                if sim > similaridade:
+                    melhor, similaridade = doc_id, sim
+        if similaridade >= self.limiar:
+            return melhor, similaridade
+        return None, 0.0
+
+    def adicionar(self, doc_id: str, texto: str, titulo: str | None = None, assinatura: np.ndarray | None = None):
+        """Registra a impressão de ``texto`` sob ``doc_id``."""
+        if assinatura is None:
+            assinatura = self.assinatura(texto)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", (doc_id, assinatura.tobytes(), titulo)
+            )
+            self._db.execute("DELETE FROM bandas WHERE doc_id = ?", (doc_id,))
+            self._db.executemany(
+                "INSERT INTO bandas VALUES (?, ?, ?)",
+                [(banda, h, doc_id) for banda, h in enumerate(self._hashes_bandas(assinatura))],
+            )
+
+    def verificar_e_adicionar(self, doc_id: str, texto: str, titulo: str | None = None) -> str | None:
+        """
+        Registra o texto se ele for novo.
+
+        Returns:
+            str | None: O id do documento original se ``texto`` for uma
+            quase-duplicata (nesse caso nada é registrado), ou ``None``.
+        """
+        assinatura = self.assinatura(texto)
+        original, similaridade = self.buscar(texto, assinatura)
+        if original is not None and original != doc_id:
+            self.ignorados.setdefault(original, []).append(
+                {"id": doc_id, "titulo": titulo, "similaridade": round(similaridade, 3)}
+            )
+            logger.info(f"Quase-duplicata ignorada: {doc_id} ~ {original} ({similaridade:.2f})")
+            return original
+        self.adicionar(doc_id, texto, titulo, assinatura)
+        return None
+
+    def relatorio(self) -> dict:
+        """Clusters ignorados nesta execução: original -> lista de duplicatas."""
+        return {
+            "limiar": self.limiar,
+            "ignorados": sum(len(v) for v in self.ignorados.values()),
+            "clusters": self.ignorados,
+        }
+
+    def salvar_relatorio(self, caminho=RELATORIO_PATH):
+        """Grava :meth:`relatorio` em JSON."""
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=4)
+
+    def fechar(self):
+        self._db.close()
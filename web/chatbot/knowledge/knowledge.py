@@ -5,15 +5,29 @@ Módulo para manipulação de conhecimento no chatbot.
 import os
 import json
 
+from data import camadas
+
 data_path = "data/bronze/"
 
-def create_dummies() -> list:
-    """Lê arquivos na pasta 'data/bronze/' e cria uma lista com os textos das notícias"""
-    texts_list = []
-    for f in os.listdir(data_path):
+def carregar_artigos(colunas: list[str] | None = None) -> list[dict]:
+    """
+    Retorna os artigos da camada gold (ver :mod:`data.camadas`), projetando só ``colunas``.
+
+    Se o gold ainda não foi compactado, lê os arquivos JSON da pasta 'data/bronze/' e
+    retorna os artigos completos, com o nome do arquivo em 'arquivo'.
+    """
+    if camadas.gold_disponivel():
+        return list(camadas.ler_artigos(colunas))
+    artigos = []
+    for f in sorted(os.listdir(data_path)):
         file_path = os.path.join(data_path, f)
         if f.endswith(".json"):
             with open(file_path, encoding="utf-8") as j:
                 d = json.load(j)
-                texts_list.append(d.get("texto", ""))
-    return texts_list
\ No newline at end of file
+                d["arquivo"] = f
+                artigos.append(d)
+    return artigos
+
+def create_dummies() -> list:
+    """Lê os artigos (gold ou 'data/bronze/') e cria uma lista com os textos das notícias"""
+    return [a.get("texto", "") for a in carregar_artigos(["texto"])]
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""
+Métricas do chatbot e do crawler no formato de texto do Prometheus.
+
+Contadores e histogramas simples, sem dependências, pensados para ficar
+ligados em produção: cada observação custa um ``perf_counter``, uma busca
+binária nos limites do histograma e um lock curto.
+
+Para saber onde foi o tempo de uma requisição, o código instrumentado marca
+as etapas com :func:`etapa` dentro de :func:`requisicao`::
+
+    with metricas.requisicao("ask"):
+        with metricas.etapa("embedding"):
+            ...
+
+Cada etapa alimenta o histograma ``pqr_etapa_segundos{operacao, etapa}`` e,
+ao fim da requisição, o detalhamento vai para o log ``chatbot.metricas`` como
+uma linha JSON (desligável com ``METRICAS_LOG=0``)::
+
+    {"evento": "ask", "total_ms": 812.4, "etapas": {"embedding": 6.1, "faiss": 1.2, ...}}
+
+A rota ``/metrics/`` expõe :func:`exportar`. Os valores são de cada processo:
+com vários workers, cada scrape vê o worker que o atendeu (o rótulo ``pid`` de
+``pqr_processo_info`` identifica qual).
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Loga o detalhamento por etapa de cada requisição
+METRICAS_LOG = os.getenv("METRICAS_LOG", "1") == "1"
+
+# Limites (em segundos) dos histogramas de latência: de 1 ms a 30 s
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Limites (em caracteres) dos histogramas de tamanho de prompt e resposta
+LIMITES_CARACTERES = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+logger = logging.getLogger(__name__)
+
+
+def _rotulos(nomes: tuple, valores: tuple) -> str:
+    if not nomes:
+        return ""
+    pares = ",".join(
+        f'{nome}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for nome, valor in zip(nomes, valores)
+    )
+    return "{" + pares + "}"
+
+
+class Contador:
+    """
+    Contador monotônico, opcionalmente com rótulos.
+
+    Args:
+        nome (str): Nome da métrica (terminado em ``_total``).
+        ajuda (str): Descrição exibida no ``# HELP``.
+        rotulos (tuple): Nomes dos rótulos, passados como argumentos nomeados a :meth:`inc`.
+    """
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        with self._lock:
+            return self._valores.get(tuple(rotulos.get(r, "") for r in self.rotulos), 0)
+
+    def linhas(self) -> list[str]:
+        with self._lock:
+            valores = dict(self._valores)
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {v}" for chave, v in sorted(valores.items())]
+
+
+class Histograma:
+    """
+    Histograma com limites fixos, opcionalmente com rótulos.
+
+    Args:
+        nome (str): Nome da métrica.
+        ajuda (str): Descrição exibida no ``# HELP``.
+        limites (tuple): Limites superiores dos buckets, em ordem crescente.
+        rotulos (tuple): Nomes dos rótulos, passados como argumentos nomeados a :meth:`observar`.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, limites: tuple = LIMITES_SEGUNDOS, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self.rotulos = tuple(rotulos)
+        self._series = {}  # rótulos -> [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos):
+        chave = tuple(rotulos.get(r, "") for r in self.rotulos)
+        posicao = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[posicao] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def linhas(self) -> list[str]:
+        with self._lock:
+            series = {chave: list(serie) for chave, serie in self._series.items()}
+        linhas = []
+        for chave, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), serie):
+                acumulado += contagem
+                linhas.append(
+                    f"{self.nome}_bucket{_rotulos(self.rotulos + ('le',), chave + (limite,))} {acumulado}"
+                )
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {round(serie[-2], 6)}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie[-1]}")
+        return linhas
+
+
+class Medidor:
+    """
+    Valor instantâneo lido de uma função no momento da exportação.
+
+    Útil para expor estatísticas que já existem em outros objetos (caches,
+    reranker) sem duplicar contagens.
+
+    Args:
+        nome (str): Nome da métrica.
+        ajuda (str): Descrição exibida no ``# HELP``.
+        ler: Função sem argumentos que retorna um número ou um dicionário
+            ``{valor_do_rotulo: numero}`` (quando há um rótulo).
+        rotulo (str | None): Nome do rótulo, se ``ler`` retornar um dicionário.
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, ler, rotulo: str | None = None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.ler = ler
+        self.rotulo = rotulo
+
+    def linhas(self) -> list[str]:
+        try:
+            valor = self.ler()
+        except Exception:
+            return []
+        if valor is None:
+            return []
+        if self.rotulo is None:
+            return [f"{self.nome} {valor}"]
+        return [f"{self.nome}{_rotulos((self.rotulo,), (chave,))} {v}" for chave, v in sorted(valor.items())]
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas por :meth:`exportar`."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica):
+        with self._lock:
+            # reimportações (autoreload do Django) reaproveitam a métrica existente
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        blocos = []
+        for metrica in metricas:
+            blocos.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            blocos.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            blocos.extend(metrica.linhas())
+        return "\n".join(blocos) + "\n"
+
+
+registro = Registro()
+
+
+def contador(nome: str, ajuda: str, rotulos: tuple = ()) -> Contador:
+    return registro.registrar(Contador(nome, ajuda, rotulos))
+
+
+def histograma(nome: str, ajuda: str, limites: tuple = LIMITES_SEGUNDOS, rotulos: tuple = ()) -> Histograma:
+    return registro.registrar(Histograma(nome, ajuda, limites, rotulos))
+
+
+def medidor(nome: str, ajuda: str, ler, rotulo: str | None = None) -> Medidor:
+    return registro.registrar(Medidor(nome, ajuda, ler, rotulo))
+
+
+def exportar() -> str:
+    """Texto de todas as métricas no formato de exposição do Prometheus."""
+    return registro.exportar()
+
+
+# -------------------------------------------------------------------------
+# Etapas por requisição
+# -------------------------------------------------------------------------
+ETAPA_SEGUNDOS = histograma(
+    "pqr_etapa_segundos", "Duração de cada etapa das operações do chatbot e do crawler", rotulos=("operacao", "etapa")
+)
+OPERACAO_SEGUNDOS = histograma(
+    "pqr_operacao_segundos", "Duração total de cada operação", rotulos=("operacao", "resultado")
+)
+medidor("pqr_processo_info", "Processo que respondeu a este scrape", lambda: {os.getpid(): 1}, rotulo="pid")
+
+
+class _Requisicao:
+    def __init__(self, operacao: str):
+        self.operacao = operacao
+        self.etapas = {}
+        self.campos = {}
+        # o lote do /ask/ gera respostas em threads que compartilham a requisição
+        self._trava = threading.Lock()
+
+    def somar(self, etapa: str, duracao: float):
+        with self._trava:
+            self.etapas[etapa] = self.etapas.get(etapa, 0.0) + duracao
+
+    def anotar(self, **campos):
+        """Acrescenta campos à linha de log da requisição (ex.: ``cache="hit"``)."""
+        self.campos.update(campos)
+
+
+_atual: ContextVar[_Requisicao | None] = ContextVar("pqr_requisicao", default=None)
+
+
+@contextmanager
+def requisicao(operacao: str, **campos):
+    """
+    Delimita uma operação (ex.: uma pergunta ao ``/ask/``).
+
+    As etapas marcadas dentro dela são somadas por nome e, na saída, a duração
+    total vai para ``pqr_operacao_segundos`` e o detalhamento para o log.
+    Requisições aninhadas são tratadas como parte da mais externa.
+    """
+    if _atual.get() is not None:
+        yield _atual.get()
+        return
+    req = _Requisicao(operacao)
+    req.campos.update(campos)
+    token = _atual.set(req)
+    resultado = "ok"
+    inicio = time.perf_counter()
+    try:
+        yield req
+    except BaseException:
+        resultado = "erro"
+        raise
+    finally:
+        total = time.perf_counter() - inicio
+        try:
+            _atual.reset(token)
+        except ValueError:
+            # geradores assíncronos podem terminar em outro contexto (streaming)
+            _atual.set(None)
+        OPERACAO_SEGUNDOS.observar(total, operacao=operacao, resultado=resultado)
+        if METRICAS_LOG:
+            logger.info(json.dumps({
+                "evento": operacao,
+                "resultado": resultado,
+                "total_ms": round(1000 * total, 1),
+                "etapas": {nome: round(1000 * s, 1) for nome, s in req.etapas.items()},
+                **req.campos,
+            }, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def etapa(nome: str):
+    """Cronometra uma etapa da requisição atual (ou avulsa, se não houver uma)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        req = _atual.get()
+        operacao = req.operacao if req is not None else ""
+        ETAPA_SEGUNDOS.observar(duracao, operacao=operacao, etapa=nome)
+        if req is not None:
+            req.somar(nome, duracao)
+
+
+def anotar(**campos):
+    """Acrescenta campos ao log da requisição atual; sem requisição, não faz nada."""
+    req = _atual.get()
+    if req is not None:
+        req.anotar(**campos)
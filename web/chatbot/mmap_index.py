@@ -0,0 +1,184 @@
+"""
+Índice FAISS plano servido por memória mapeada.
+
+Ao carregar um ``index.faiss`` com ``FAISS.load_local``, cada processo web
+copia todos os vetores para a própria memória. Com vários workers do
+gunicorn/uvicorn, o índice é duplicado uma vez por worker.
+
+Por isso :func:`chatbot.index_store.publish` também grava, em cada versão, os
+vetores brutos em ``vetores.npy`` (float32, linha a linha). O processo web
+abre esse arquivo somente leitura com ``numpy.memmap`` e busca nele com
+:class:`MmapFlatIndex`, que reproduz a busca exata L2 do ``IndexFlatL2``.
+As páginas do arquivo ficam no page cache do sistema operacional e são
+compartilhadas entre todos os workers, em vez de copiadas para cada um.
+
+Versões antigas, sem ``vetores.npy``, continuam sendo carregadas pelo caminho
+normal. Para gerar o arquivo em uma versão já publicada::
+
+    python -m chatbot.mmap_index FAISS/
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from . import docstore
+
+VECTORS_FILE = "vetores.npy"
+# linhas por bloco na busca, para limitar a memória temporária das distâncias
+BLOCO = 65536
+
+
+class MmapFlatIndex:
+    """
+    Busca exata por distância L2 ao quadrado sobre vetores mapeados em memória.
+
+    Implementa a parte da interface de ``faiss.Index`` usada pelo vector store
+    do LangChain (``search``, ``reconstruct``, ``ntotal`` e ``d``). O índice é
+    somente leitura.
+
+    Args:
+        caminho: Arquivo ``.npy`` com uma matriz float32 ``(ntotal, d)``.
+    """
+
+    is_trained = True
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.vetores = np.load(self.caminho, mmap_mode="r")
+        if self.vetores.dtype != np.float32 or self.vetores.ndim != 2:
+            raise ValueError(f"{caminho} deve conter uma matriz float32 (ntotal, d)")
+        self.ntotal, self.d = self.vetores.shape
+        # ||x||² de cada vetor: 4 bytes por vetor, privado ao processo
+        self.normas = np.empty(self.ntotal, dtype=np.float32)
+        for inicio in range(0, self.ntotal, BLOCO):
+            bloco = self.vetores[inicio:inicio + BLOCO]
+            self.normas[inicio:inicio + len(bloco)] = np.einsum("ij,ij->i", bloco, bloco)
+
+    def search(self, consultas, k: int):
+        """
+        Retorna ``(distancias, indices)`` dos ``k`` vizinhos mais próximos, como o FAISS.
+
+        Posições sem vizinho (``k > ntotal``) recebem índice ``-1``.
+        """
+        blocos = (
+            (np.arange(inicio, min(inicio + BLOCO, self.ntotal)), self.vetores[inicio:inicio + BLOCO])
+            for inicio in range(0, self.ntotal, BLOCO)
+        )
+        return self._buscar(consultas, k, blocos)
+
+    def buscar_em(self, consultas, k: int, posicoes):
+        """
+        Como :meth:`search`, mas só entre as ``posicoes`` dadas (pré-filtro).
+
+        Só as linhas selecionadas são lidas do arquivo, então o custo é
+        proporcional ao tamanho da seleção, não ao do índice.
+        """
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        blocos = (
+            (posicoes[inicio:inicio + BLOCO], self.vetores[posicoes[inicio:inicio + BLOCO]])
+            for inicio in range(0, len(posicoes), BLOCO)
+        )
+        return self._buscar(consultas, k, blocos)
+
+    def _buscar(self, consultas, k: int, blocos):
+        """Top-``k`` L2 sobre ``blocos`` de pares ``(posições, vetores)``."""
+        consultas = np.ascontiguousarray(consultas, dtype=np.float32).reshape(-1, self.d)
+        n = len(consultas)
+        distancias = np.full((n, k), np.finfo(np.float32).max, dtype=np.float32)
+        indices = np.full((n, k), -1, dtype=np.int64)
+        if self.ntotal == 0 or k <= 0:
+            return distancias, indices
+
+        normas_q = np.einsum("ij,ij->i", consultas, consultas)[:, None]
+        for posicoes, bloco in blocos:
+            if not len(posicoes):
+                continue
+            d = self.normas[None, posicoes] - 2.0 * (consultas @ bloco.T) + normas_q
+            np.maximum(d, 0.0, out=d)
+            kb = min(k, d.shape[1])
+            parcial = np.argpartition(d, kb - 1, axis=1)[:, :kb]
+            # junta o top-k acumulado com o top-k do bloco
+            cand_d = np.concatenate([distancias, np.take_along_axis(d, parcial, axis=1)], axis=1)
+            cand_i = np.concatenate([indices, posicoes[parcial]], axis=1)
+            ordem = np.argsort(cand_d, axis=1, kind="stable")[:, :k]
+            distancias = np.take_along_axis(cand_d, ordem, axis=1)
+            indices = np.take_along_axis(cand_i, ordem, axis=1)
+        indices[distancias == np.finfo(np.float32).max] = -1
+        return distancias, indices
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.vetores[int(i)])
+
+    def add(self, *args, **kwargs):
+        raise RuntimeError("MmapFlatIndex é somente leitura; atualize o índice pelo crawler ou build_faiss.py")
+
+
+def salvar_vetores(index, destino) -> bool:
+    """
+    Grava os vetores de ``index`` em ``<destino>/vetores.npy``.
+
+    Só índices ``IndexFlatL2`` (o padrão do vector store do LangChain) são
+    gravados, pois :class:`MmapFlatIndex` reproduz apenas a busca exata L2.
+
+    Returns:
+        bool: Verdadeiro se o arquivo foi gravado.
+    """
+    import faiss
+
+    if not isinstance(index, faiss.IndexFlatL2):
+        return False
+    vetores = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), np.float32)
+    caminho = Path(destino) / VECTORS_FILE
+    with open(caminho, "wb") as f:
+        np.save(f, np.ascontiguousarray(vetores, dtype=np.float32))
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def carregar(path, embeddings, mmap: bool = True):
+    """
+    Carrega o vector store de uma versão do índice.
+
+    Se ``mmap`` for verdadeiro e a versão tiver ``vetores.npy``, o índice é
+    um :class:`MmapFlatIndex` (somente leitura). Índices IVF (ver
+    :mod:`chatbot.ann`) são lidos com ``IO_FLAG_MMAP``, que mapeia as listas
+    invertidas do arquivo em vez de copiá-las. Sem ``mmap``, o ``index.faiss``
+    é lido inteiro para a memória.
+
+    Os documentos ficam no SQLite da versão e são lidos sob demanda (ver
+    :mod:`chatbot.docstore`).
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    path = Path(path)
+    if mmap and (path / VECTORS_FILE).exists():
+        index = MmapFlatIndex(path / VECTORS_FILE)
+    elif mmap:
+        index = faiss.read_index(str(path / "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    else:
+        index = faiss.read_index(str(path / "index.faiss"))
+    documentos, index_to_docstore_id = docstore.abrir(path)
+    return FAISS(embeddings, index, documentos, index_to_docstore_id)
+
+
+def converter(path) -> bool:
+    """Gera ``vetores.npy`` para uma versão já publicada a partir do seu ``index.faiss``."""
+    import faiss
+
+    path = Path(path)
+    return salvar_vetores(faiss.read_index(str(path / "index.faiss")), path)
+
+
+if __name__ == "__main__":
+    from chatbot import index_store
+
+    raiz = sys.argv[1] if len(sys.argv) > 1 else "FAISS/"
+    atual = index_store.current_path(raiz)
+    if atual is None:
+        sys.exit(f"Nenhum índice em {raiz}")
+    print(f"{atual}: {'vetores.npy gravado' if converter(atual) else 'índice não é IndexFlatL2, nada a fazer'}")
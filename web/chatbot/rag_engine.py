@@ -2,20 +2,47 @@
 Módulo de engine RAG para o chatbot.
 
 Responsável por carregar o vetor FAISS e fornecer funções de recuperação de contexto.
+
+Importar o módulo não carrega nada pesado (modelos, índice, cliente do Gemini);
+os componentes são carregados em etapas, cada uma cronometrada no log:
+
+* :func:`preload`: embeddings, cross-encoder, índice e prompt. Não cria threads
+  nem o cliente do LLM, então pode rodar no processo master do gunicorn antes do
+  fork (``preload_app``), e os workers herdam os modelos por copy-on-write;
+* :func:`init_components`: completa o que falta no processo atual (LLM e
+  monitor de versões do índice);
+* :func:`warmup`: passa uma pergunta fictícia por embeddings, FAISS e
+  cross-encoder (e, com ``RAG_WARMUP_LLM=1``, pelo LLM) para que a primeira
+  requisição real não pague a inicialização preguiçosa das bibliotecas.
+
+:func:`startup` escolhe entre esses modos pela variável ``RAG_STARTUP`` e é
+chamado por ``web/wsgi.py``/``web/asgi.py``; ``web/gunicorn.conf.py`` mostra o
+uso com preload. :func:`readiness` informa o estado de cada componente (rota
+``/ready/``).
 """
 
 import sys
 import os
+import copy
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.cross_encoders.huggingface import HuggingFaceCrossEncoder
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from . import ann, bm25, filtros, index_store, metricas, mmap_index
+from .concorrencia import ControleAdmissao, LiderDesistiu, SemContexto, SingleFlight, Sobrecarga
+from .contexto import CONTEXTO_MAX_TOKENS, estimar_tokens, montar as montar_contexto
+from .embeddings import CachedQueryEmbeddings, criar_embeddings
+from .filtros import Filtros
+from .reranking import AdaptiveReranker, RerankingRetriever
+
 # -------------------------------------------------------------------------
 # Configuração base
 # -------------------------------------------------------------------------
@@ -25,115 +52,970 @@ sys.path.append(BASE_DIR)
 FAISS_DIR = os.path.join(BASE_DIR, "FAISS")
 load_dotenv()
 
+# Cache semântico de respostas (ver SemanticCache)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+
+# Intervalo (s) entre verificações de nova versão do índice; 0 desativa
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "10"))
+# Abre os vetores do índice por memória mapeada, compartilhada entre workers (ver chatbot.mmap_index)
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+
+# Ciclo de vida: "full" (carrega tudo e aquece ao subir o servidor), "preload"
+# (só o que pode ser compartilhado antes do fork) ou "lazy" (na primeira requisição)
+RAG_STARTUP = os.getenv("RAG_STARTUP", "full")
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") == "1"
+RAG_WARMUP_LLM = os.getenv("RAG_WARMUP_LLM", "0") == "1"
+
+# Reranqueamento adaptativo (ver chatbot.reranking)
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_K_MIN = int(os.getenv("RERANK_K_MIN", "5"))
+RERANK_K_MAX = int(os.getenv("RERANK_K_MAX", "10"))
+RERANK_DELTA = float(os.getenv("RERANK_DELTA", "0.15"))
+RERANK_MARGEM = float(os.getenv("RERANK_MARGEM", "0.08"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+# Busca híbrida (ver chatbot.bm25): usada quando a versão do índice tem bm25.npz.
+# HIBRIDO_K candidatos da fusão RRF vão para o cross-encoder (no lugar de até RERANK_K_MAX);
+# com HIBRIDO_CONCORDANCIA, o cross-encoder é pulado quando a busca densa é decisiva
+# (RERANK_MARGEM) e o BM25 não muda o top-n (ver chatbot.reranking)
+BM25_ATIVO = os.getenv("BM25_ATIVO", "1") == "1"
+HIBRIDO_K = int(os.getenv("HIBRIDO_K", "6"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+HIBRIDO_CONCORDANCIA = os.getenv("HIBRIDO_CONCORDANCIA", "1") == "1"
+
+# Controle de admissão das chamadas ao LLM, por processo (ver chatbot.concorrencia);
+# LLM_MAX_CONCORRENTES <= 0 desativa o limite
+LLM_MAX_CONCORRENTES = int(os.getenv("LLM_MAX_CONCORRENTES", "8"))
+LLM_MAX_FILA = int(os.getenv("LLM_MAX_FILA", "32"))
+LLM_MAX_ESPERA = float(os.getenv("LLM_MAX_ESPERA", "10"))
+# Perguntas iguais em andamento compartilham a execução (mesmo limiar do cache semântico)
+COALESCER = os.getenv("COALESCER", "1") == "1"
+COALESCER_MAX_ESPERA = float(os.getenv("COALESCER_MAX_ESPERA", "60"))
+
+# /ask/batch/ (ver answer_batch): perguntas por lote, gerações simultâneas de um
+# lote (cada uma ainda ocupa uma vaga do controle de admissão) e pares por
+# chamada ao cross-encoder
+BATCH_MAX_PERGUNTAS = int(os.getenv("BATCH_MAX_PERGUNTAS", "200"))
+BATCH_LLM_CONCORRENTES = int(os.getenv("BATCH_LLM_CONCORRENTES", "4"))
+RERANK_LOTE = int(os.getenv("RERANK_LOTE", "64"))
+
 # -------------------------------------------------------------------------
-# Lazy init – evita quebrar no Sphinx
+# Ciclo de vida dos componentes (nada é carregado ao importar o módulo)
 # -------------------------------------------------------------------------
+logger = logging.getLogger(__name__)
+
 embeddings = None
 vector_store = None
 base_retriever = None
 retriever = None
+reranker = None
 llm = None
 prompt = None
+index_manager = None
+
+PROMPT_TEMPLATE = """Você é um assistente que responde perguntas sobre educação na região da RIDE-DF. Use o contexto fornecido para responder de forma precisa e concisa. O contexto traz trechos de notícias, cada notícia identificada por [n] com fonte, título e data. Se a pergunta não estiver relacionada ao contexto, responda que não encontrou informações específicas sobre a pergunta. Não invente respostas.
+
+CONTEXTO:
+{contexto}
+
+PERGUNTA:
+{pergunta}
+
+RESPOSTA:
+"""
+
+# Métricas de /ask/ (ver chatbot.metricas; a duração das etapas fica em pqr_etapa_segundos)
+RESPOSTAS = metricas.contador(
+    "pqr_respostas_total",
+    "Respostas por caminho: cache, coalescida, sem_contexto, llm, sobrecarga, erro (lotes) ou sem_indice",
+    rotulos=("caminho",),
+)
+LLM_CHAMADAS = metricas.contador("pqr_llm_chamadas_total", "Chamadas ao LLM", rotulos=("origem", "resultado"))
+PROMPT_CARACTERES = metricas.histograma(
+    "pqr_llm_prompt_caracteres", "Tamanho dos prompts enviados ao LLM", metricas.LIMITES_CARACTERES, rotulos=("origem",)
+)
+LIMITES_TOKENS = (100, 200, 400, 600, 800, 1200, 1600, 2400, 3200, 4800)
+PROMPT_TOKENS = metricas.histograma(
+    "pqr_llm_prompt_tokens_estimados", "Tokens estimados dos prompts enviados ao LLM",
+    LIMITES_TOKENS, rotulos=("origem",),
+)
+CONTEXTO_TOKENS = metricas.histograma(
+    "pqr_contexto_tokens_estimados",
+    "Tokens estimados do contexto: montado (enviado) e original (repr dos trechos, como antes da montagem)",
+    LIMITES_TOKENS, rotulos=("versao",),
+)
+CONTEXTO_REDUCAO = metricas.histograma(
+    "pqr_contexto_reducao", "Fração dos tokens do contexto original cortada pela montagem",
+    (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9),
+)
+RESPOSTA_CARACTERES = metricas.histograma(
+    "pqr_llm_resposta_caracteres", "Tamanho das respostas do LLM", metricas.LIMITES_CARACTERES, rotulos=("origem",)
+)
+
+# Estado de cada etapa de inicialização, exposto por readiness()
+ETAPAS = ("embeddings", "reranker", "indice", "prompt", "llm")
+componentes = {
+    etapa: {"pronto": False, "segundos": None, "erro": None}
+    for etapa in ETAPAS + ("warmup",)
+}
+_init_lock = threading.RLock()
+_pid_monitor = None  # processo em que a thread do monitor do índice foi criada
+
+
+def _load_index(path) -> dict:
+    """Carrega uma versão do índice FAISS e monta os retrievers sobre ela."""
+    vs = mmap_index.carregar(path, embeddings, mmap=FAISS_MMAP)
+    # nprobe/efSearch vêm de FAISS_NPROBE/FAISS_EF_SEARCH (ver chatbot.ann)
+    ann.ajustar_busca(vs.index)
+    lexico = bm25.abrir(path) if BM25_ATIVO else None
+    if lexico is not None and lexico.total != vs.index.ntotal:
+        logger.warning(f"bm25.npz de {path} não corresponde ao FAISS; usando só a busca densa")
+        lexico = None
+    metadados = filtros.abrir(path)
+    if metadados is None or metadados.total != vs.index.ntotal:
+        # versões anteriores ao filtros.npz: lê os metadados do docstore
+        logger.warning(f"{path} sem filtros.npz válido; lendo data e fonte dos trechos do docstore")
+        metadados = filtros.construir(vs.docstore, vs.index_to_docstore_id, vs.index.ntotal)
+    return {
+        "vector_store": vs,
+        "base_retriever": vs.as_retriever(search_kwargs={"k": RERANK_K_MAX}),
+        "retriever": RerankingRetriever(
+            vs, reranker, lexico=lexico, fusao_k=HIBRIDO_K, rrf_k=RRF_K, metadados=metadados,
+            concordancia=HIBRIDO_CONCORDANCIA,
+        ),
+    }
+
+
+def _on_index_swap(handle):
+    """Mantém os atalhos globais apontando para a versão ativa do índice."""
+    global vector_store, base_retriever, retriever
+    vector_store = handle.value["vector_store"]
+    base_retriever = handle.value["base_retriever"]
+    retriever = handle.value["retriever"]
+    componentes["indice"]["pronto"] = True
+
+
+def _etapa(nome: str, carregar, tolerar_erro: bool = False):
+    """Executa uma etapa de inicialização uma única vez, registrando tempo e erro."""
+    info = componentes[nome]
+    if info["pronto"] or (tolerar_erro and info["erro"] is not None):
+        return
+    inicio = time.perf_counter()
+    try:
+        carregar()
+    except Exception as e:
+        info["erro"] = str(e)
+        logger.error(f"[startup] {nome}: falhou após {time.perf_counter() - inicio:.2f}s: {e}")
+        if not tolerar_erro:
+            raise
+        return
+    info["segundos"] = round(time.perf_counter() - inicio, 3)
+    info["erro"] = None
+    info["pronto"] = nome != "indice" or index_manager.version is not None
+    logger.info(f"[startup] {nome}: {info['segundos']:.2f}s")
+
+
+def _carregar_embeddings():
+    global embeddings
+    # backend escolhido por EMBEDDINGS_BACKEND, com LRU de perguntas
+    embeddings = CachedQueryEmbeddings(criar_embeddings())
+
+
+def _carregar_reranker():
+    global reranker
+    from langchain_community.cross_encoders.huggingface import HuggingFaceCrossEncoder
+
+    hf_encoder = HuggingFaceCrossEncoder(
+        model_name="cross-encoder/ms-marco-MiniLM-L-6-v2",
+        model_kwargs={"max_length": RERANK_MAX_LENGTH},
+    )
+    reranker = AdaptiveReranker(
+        hf_encoder.client,
+        top_n=RERANK_TOP_N,
+        k_min=RERANK_K_MIN,
+        k_max=RERANK_K_MAX,
+        delta=RERANK_DELTA,
+        margem=RERANK_MARGEM,
+    )
+
+
+def _carregar_indice():
+    global index_manager
+    if index_manager is None:
+        index_manager = index_store.IndexManager(
+            FAISS_DIR,
+            loader=_load_index,
+            poll_interval=INDEX_POLL_INTERVAL,
+            on_swap=_on_index_swap,
+        )
+    index_manager.refresh()
+    if index_manager.version is None:
+        logger.warning(f"[startup] nenhum índice publicado em {FAISS_DIR}; aguardando o monitor")
+
+
+def _criar_prompt():
+    global prompt
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+
+def _criar_llm():
+    global llm
+    if llm is not None:
+        # um chat model atribuído antes da inicialização (ex.: o falso dos benchmarks) é mantido
+        return
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+    )
+
+
+def preload():
+    """
+    Carrega embeddings, cross-encoder, índice e prompt no processo atual.
+
+    Não cria threads nem o cliente do LLM (cujas conexões gRPC não sobrevivem
+    a um fork), então é seguro chamar no master antes de criar os workers.
+    """
+    with _init_lock:
+        pendentes = [etapa for etapa in ("embeddings", "reranker", "prompt") if not componentes[etapa]["pronto"]]
+        inicio = time.perf_counter()
+        _etapa("embeddings", _carregar_embeddings)
+        _etapa("reranker", _carregar_reranker)
+        _etapa("indice", _carregar_indice, tolerar_erro=True)
+        _etapa("prompt", _criar_prompt)
+        if pendentes:
+            logger.info(f"[startup] preload concluído em {time.perf_counter() - inicio:.2f}s (pid {os.getpid()})")
+
 
 def init_components():
     """Inicializa embeddings, FAISS, retriever e LLM (usado em runtime)."""
-    global embeddings, vector_store, base_retriever, retriever, llm, prompt
+    global _pid_monitor
+    if _pid_monitor == os.getpid() and all(componentes[etapa]["pronto"] for etapa in ETAPAS):
+        return
+    with _init_lock:
+        preload()
+        _etapa("llm", _criar_llm)
+        # a thread do monitor é criada no próprio worker, nunca antes do fork
+        if _pid_monitor != os.getpid():
+            # um worker recriado pelo gunicorn herda a versão que o master carregou, que
+            # o index_store pode já ter apagado (publish(keep=3)): troca pela atual
+            # antes de atender, em vez de esperar o monitor
+            try:
+                index_manager.refresh()
+            except Exception as e:
+                logger.error(f"[startup] falha ao carregar a versão atual do índice: {e}")
+            index_manager.start()
+            _pid_monitor = os.getpid()
 
-    if embeddings is None:
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
-    if vector_store is None:
-        try:
-            vs = FAISS.load_local(
-                FAISS_DIR,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            vector_store = vs
-            base_retriever = vs.as_retriever(search_kwargs={"k": 10})
-        except Exception:
-            vector_store = None
-            base_retriever = None
+def warmup(com_llm: bool = RAG_WARMUP_LLM):
+    """
+    Passa uma pergunta fictícia por todas as etapas do pipeline.
 
-    if retriever is None and base_retriever is not None:
-        hf_encoder = HuggingFaceCrossEncoder(
-            model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"
-        )
-        reranker = CrossEncoderReranker(model=hf_encoder, top_n=5)
-        retriever = ContextualCompressionRetriever(
-            base_compressor=reranker,
-            base_retriever=base_retriever,
-        )
+    Embeddings, FAISS e cross-encoder sempre rodam (o cross-encoder é chamado
+    direto, sem o atalho do reranqueamento adaptativo, e sem contar nas suas
+    estatísticas); o LLM só com ``com_llm``, pois gera custo na API.
+    """
+    def aquecer():
+        pergunta = "Quais são as notícias recentes sobre educação no Distrito Federal?"
+        vetor = _embed_query(pergunta)
+        with index_manager.acquire() as handle:
+            candidatos = handle.value["retriever"].candidatos(pergunta, vetor) if handle else []
+        textos = [doc.page_content for doc, _ in candidatos] or ["Educação no Distrito Federal."]
+        reranker.cross_encoder.predict([(pergunta, t) for t in textos], batch_size=len(textos))
+        if com_llm:
+            llm.invoke("Responda apenas: ok")
 
-    if llm is None:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0,
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-        )
+    init_components()
+    _etapa("warmup", aquecer, tolerar_erro=True)
 
-    if prompt is None:
-        template = """Você é um assistente que responde perguntas sobre educação na região da RIDE-DF. Use o contexto fornecido para responder de forma precisa e concisa. Se a pergunta não estiver relacionada ao contexto, responda que não encontrou informações específicas sobre a pergunta. Não invente respostas.
 
-CONTEXTO:
-{contexto}
+def init_worker():
+    """Completa a inicialização em um worker recém-criado (hook ``post_fork`` do gunicorn)."""
+    init_components()
+    if RAG_WARMUP:
+        warmup()
 
-PERGUNTA:
-{pergunta}
 
-RESPOSTA:
-"""
-        prompt = ChatPromptTemplate.from_template(template)
+def startup(modo: str = RAG_STARTUP):
+    """
+    Ponto de entrada chamado ao carregar a aplicação WSGI/ASGI.
+
+    Args:
+        modo (str): ``"full"`` carrega tudo e aquece no processo atual;
+            ``"preload"`` só faz o :func:`preload` (o worker completa com
+            :func:`init_worker`); ``"lazy"`` não carrega nada até a primeira
+            requisição.
+    """
+    if os.environ.get("SPHINX_BUILD") == "1" or modo == "lazy":
+        return
+    if modo == "preload":
+        preload()
+    else:
+        init_worker()
+
+
+def readiness() -> dict:
+    """
+    Estado de cada componente: se está pronto, quanto levou para carregar e o último erro.
+
+    Returns:
+        dict: ``{"pronto": bool, "pid": int, "versao_indice": str | None, "componentes": {...}}``.
+    """
+    estado = {nome: dict(info) for nome, info in componentes.items()}
+    return {
+        "pronto": all(estado[etapa]["pronto"] for etapa in ETAPAS),
+        "pid": os.getpid(),
+        "versao_indice": index_manager.version if index_manager is not None else None,
+        "componentes": estado,
+    }
+
+
+# -------------------------------------------------------------------------
+# Cache semântico
+# -------------------------------------------------------------------------
+class SemanticCache:
+    """
+    Cache de respostas indexado pela similaridade do embedding da pergunta.
+
+    Perguntas cujo embedding tem similaridade de cosseno >= ``threshold`` com
+    uma pergunta já respondida reutilizam a resposta armazenada. As entradas
+    expiram após ``ttl`` segundos, o tamanho é limitado a ``max_entries``
+    (política LRU) e todo o cache é descartado quando a versão do índice FAISS
+    muda. Perguntas com filtros diferentes (``escopo``, ver
+    :meth:`chatbot.filtros.Filtros.chave`) nunca compartilham respostas.
+
+    Args:
+        threshold (float): Similaridade mínima para considerar um acerto.
+        ttl (float): Tempo de vida das entradas em segundos (<= 0 desativa a expiração).
+        max_entries (int): Número máximo de entradas (<= 0 desativa o cache).
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # (escopo, chave) -> (vetor, resposta, criado_em)
+        self._index_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(pergunta: str) -> str:
+        return " ".join(pergunta.lower().split())
+
+    def _check_version(self, index_version):
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _expired(self, criado_em: float, agora: float) -> bool:
+        return self.ttl > 0 and agora - criado_em > self.ttl
+
+    def get(self, pergunta: str, vetor, index_version, escopo: str = "") -> dict | None:
+        """Retorna uma cópia da resposta em cache ou ``None`` (miss)."""
+        if self.max_entries <= 0:
+            return None
+
+        with self._lock:
+            self._check_version(index_version)
+            agora = time.monotonic()
+            for chave in [c for c, e in self._entries.items() if self._expired(e[2], agora)]:
+                del self._entries[chave]
+
+            chave = (escopo, self._key(pergunta))
+            chaves = [c for c in self._entries if c[0] == escopo]
+            if chave not in self._entries and chaves:
+                matriz = np.stack([self._entries[c][0] for c in chaves])
+                sims = matriz @ vetor
+                melhor = int(np.argmax(sims))
+                if sims[melhor] >= self.threshold:
+                    chave = chaves[melhor]
+
+            if chave not in self._entries:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(chave)
+            self.hits += 1
+            return copy.deepcopy(self._entries[chave][1])
+
+    def put(self, pergunta: str, vetor, resposta: dict, index_version, escopo: str = ""):
+        """Armazena a resposta para a pergunta, descartando a entrada menos usada se necessário."""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._check_version(index_version)
+            chave = (escopo, self._key(pergunta))
+            self._entries[chave] = (vetor, copy.deepcopy(resposta), time.monotonic())
+            self._entries.move_to_end(chave)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove todas as entradas (os contadores são mantidos)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Retorna contadores de acertos, falhas, invalidações e tamanho atual."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl=SEMANTIC_CACHE_TTL,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+metricas.medidor("pqr_cache_semantico", "Estatísticas do cache semântico", semantic_cache.stats, rotulo="estatistica")
+metricas.medidor(
+    "pqr_cache_embeddings", "Estatísticas do LRU de embeddings de perguntas",
+    lambda: embeddings.stats() if embeddings is not None else None, rotulo="estatistica",
+)
+metricas.medidor(
+    "pqr_reranker", "Estatísticas do reranqueamento adaptativo",
+    lambda: reranker.stats() if reranker is not None else None, rotulo="estatistica",
+)
+admissao = ControleAdmissao(LLM_MAX_CONCORRENTES, LLM_MAX_FILA, LLM_MAX_ESPERA)
+single_flight = SingleFlight(SEMANTIC_CACHE_THRESHOLD, COALESCER_MAX_ESPERA) if COALESCER else None
+
+metricas.medidor("pqr_llm_admissao", "Vagas e fila das chamadas ao LLM", admissao.stats, rotulo="estatistica")
+metricas.medidor(
+    "pqr_coalescencia_em_andamento", "Execuções do pipeline compartilháveis em andamento",
+    lambda: single_flight.em_andamento() if single_flight is not None else None,
+)
+metricas.medidor(
+    "pqr_componente_pronto", "Componentes do RAG carregados neste processo (1 = pronto)",
+    lambda: {nome: int(info["pronto"]) for nome, info in componentes.items()}, rotulo="componente",
+)
+
+
+def _embed_query(pergunta: str):
+    """Gera o embedding normalizado (norma L2 = 1) da pergunta."""
+    vetor = np.asarray(embeddings.embed_query(pergunta), dtype="float32")
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma > 0 else vetor
+
+
+def _embed_queries(perguntas: list[str]) -> np.ndarray:
+    """Embeddings normalizados de várias perguntas, em um único lote do modelo."""
+    matriz = np.asarray(embeddings.embed_queries(perguntas), dtype="float32").reshape(len(perguntas), -1)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas > 0, normas, 1.0)
 
 
 # -------------------------------------------------------------------------
 # API pública
 # -------------------------------------------------------------------------
-def answer_question(pergunta: str) -> dict:
+def answer_question(pergunta: str, filtros: Filtros | None = None) -> dict:
     """
     Responde a uma pergunta utilizando RAG (Retrieval-Augmented Generation).
 
     Args:
         pergunta (str): Pergunta a ser respondida.
+        filtros (chatbot.filtros.Filtros | None): Restrições de data e fonte e
+            decaimento por recência aplicados à recuperação.
 
     Returns:
         dict: Um dicionário contendo:
             - "resposta" (str): A resposta gerada.
             - "fontes" (list): Lista de até 3 fontes relevantes.
+
+    Raises:
+        chatbot.concorrencia.Sobrecarga: Sem vaga para chamar o LLM (a view
+            responde ``503`` com ``Retry-After``).
     """
-    # Inicializa só quando necessário
-    init_components()
+    with metricas.requisicao("ask"):
+        # Inicializa só quando necessário
+        init_components()
 
-    if retriever is None:
-        return {
-            "resposta": "Não foi possível inicializar o mecanismo RAG.",
-            "fontes": [],
-        }
+        # A versão do índice fica reservada até o fim da resposta, mesmo que
+        # uma versão nova seja ativada no meio do caminho.
+        with index_manager.acquire() as handle:
+            if handle is None:
+                _contar_resposta("sem_indice")
+                return {
+                    "resposta": "Não foi possível inicializar o mecanismo RAG.",
+                    "fontes": [],
+                }
+            try:
+                return _answer_with_index(pergunta, handle, filtros)
+            except Sobrecarga:
+                _contar_resposta("sobrecarga")
+                raise
 
-    docs = retriever.invoke(pergunta)
-    contexto = [doc.page_content for doc in docs]
 
-    if not contexto or len(" ".join(contexto)) < 50:
-        return {
-            "resposta": f"Não encontrei notícias específicas sobre '{pergunta}', mas posso trazer informações gerais sobre educação no DF.",
-            "fontes": [],
-        }
+def _contar_resposta(caminho: str):
+    RESPOSTAS.inc(caminho=caminho)
+    metricas.anotar(caminho=caminho)
 
-    rag_chain = prompt | llm | StrOutputParser()
-    resposta = rag_chain.invoke({"pergunta": pergunta, "contexto": contexto})
 
+def _tamanho_prompt(pergunta: str, contexto: str) -> int:
+    """Caracteres do prompt montado com ``PROMPT_TEMPLATE``, sem formatá-lo."""
+    return len(PROMPT_TEMPLATE) - len("{contexto}{pergunta}") + len(pergunta) + len(contexto)
+
+
+def _registrar_llm(pergunta: str, contexto: str, resposta: str | None):
+    """Conta a chamada ao LLM e os tamanhos de prompt e resposta (``None`` = erro)."""
+    LLM_CHAMADAS.inc(origem="rag", resultado="ok" if resposta is not None else "erro")
+    tamanho = _tamanho_prompt(pergunta, contexto)
+    tokens = estimar_tokens(PROMPT_TEMPLATE) + estimar_tokens(pergunta) + estimar_tokens(contexto)
+    PROMPT_CARACTERES.observar(tamanho, origem="rag")
+    PROMPT_TOKENS.observar(tokens, origem="rag")
+    metricas.anotar(prompt_caracteres=tamanho, prompt_tokens_estimados=tokens)
+    if resposta is not None:
+        RESPOSTA_CARACTERES.observar(len(resposta), origem="rag")
+        metricas.anotar(resposta_caracteres=len(resposta))
+
+
+def _montar_contexto(pergunta: str, docs, retriever) -> str:
+    """
+    Contexto do prompt dentro do orçamento ``CONTEXTO_MAX_TOKENS`` (ver
+    :mod:`chatbot.contexto`), com o IDF do BM25 da versão quando houver.
+    """
+    lexico = getattr(retriever, "lexico", None)
+    with metricas.etapa("contexto"):
+        montado = montar_contexto(
+            pergunta, docs, CONTEXTO_MAX_TOKENS, idf=lexico.idf if lexico is not None else None
+        )
+    CONTEXTO_TOKENS.observar(montado.tokens, versao="montado")
+    CONTEXTO_TOKENS.observar(montado.tokens_originais, versao="original")
+    CONTEXTO_REDUCAO.observar(montado.reducao)
+    metricas.anotar(**montado.stats())
+    return montado.texto
+
+
+def _resposta_sem_contexto(pergunta: str) -> dict:
+    """
+    Resposta sem notícias recuperadas. Ela cita a pergunta, por isso nunca vai
+    para o cache semântico nem é repassada às perguntas coalescidas (ver
+    :func:`_concluir_voo`): uma pergunta parecida receberia a de outra pessoa.
+    """
+    return {
+        "resposta": f"Não encontrei notícias específicas sobre '{pergunta}', mas posso trazer informações gerais sobre educação no DF.",
+        "fontes": [],
+    }
+
+
+def _extrair_fontes(docs) -> list:
+    """
+    Monta a lista de até 3 fontes (nome + trecho) a partir dos documentos.
+
+    Vários trechos do mesmo artigo contam como uma única fonte.
+    """
     fontes = []
-    for doc in docs[:3]:
+    vistos = set()
+    for doc in docs:
         meta = getattr(doc, "metadata", {})
+        chave = meta.get("link") or doc.page_content
+        if chave in vistos:
+            continue
+        vistos.add(chave)
         fonte = meta.get("fonte") or meta.get("source") or "Fonte desconhecida"
         snippet = doc.page_content[:200].replace("\n", " ") + "..."
-        fontes.append({"fonte": fonte, "snippet": snippet})
+        fontes.append({"fonte": fonte, "snippet": snippet, "link": meta.get("link")})
+        if len(fontes) == 3:
+            break
+    return fontes
 
-    return {"resposta": resposta, "fontes": fontes}
 
+def _escopo(filtros) -> str:
+    """Chave dos filtros no cache semântico (vazia sem filtros)."""
+    if filtros is None:
+        return ""
+    escopo = filtros.chave()
+    metricas.anotar(filtros=escopo)
+    return escopo
 
-# -------------------------------------------------------------------------
-# Evitar que o Sphinx quebre
-# -------------------------------------------------------------------------
-if os.environ.get("SPHINX_BUILD") != "1":
-    init_components()
+
+def _erro_do_lider(erro: BaseException) -> Exception:
+    """Erro repassado às perguntas que esperavam o líder (cancelamentos viram :class:`LiderDesistiu`)."""
+    return erro if isinstance(erro, Exception) else LiderDesistiu()
+
+
+def _concluir_voo(voo, pergunta: str, resultado):
+    """Entrega o resultado do líder aos seguidores, exceto a resposta sem contexto, que cita a pergunta dele."""
+    if resultado == _resposta_sem_contexto(pergunta):
+        single_flight.concluir(voo, erro=SemContexto())
+    else:
+        single_flight.concluir(voo, resultado)
+
+
+def _seguidor_sem_contexto(voo, pergunta: str) -> dict | None:
+    """
+    Resposta de um seguidor cujo líder não achou contexto: a mesma pergunta
+    (pelo texto) recebe a sua própria resposta sem contexto; uma só parecida
+    (pelo embedding) devolve ``None`` e deve executar a própria recuperação.
+    """
+    if not single_flight.mesmo_texto(voo, pergunta):
+        return None
+    _contar_resposta("sem_contexto")
+    return _resposta_sem_contexto(pergunta)
+
+
+def _answer_with_index(pergunta: str, handle, filtros=None) -> dict:
+    """
+    Executa o pipeline RAG sobre uma versão específica do índice.
+
+    Se a mesma pergunta (ver :class:`chatbot.concorrencia.SingleFlight`) já
+    está sendo respondida, espera por ela em vez de repetir recuperação e LLM.
+    """
+    versao = handle.version
+    escopo = _escopo(filtros)
+    with metricas.etapa("embedding"):
+        vetor = _embed_query(pergunta)
+
+    voo = None
+    while True:
+        em_cache = semantic_cache.get(pergunta, vetor, versao, escopo)
+        if em_cache is not None:
+            _contar_resposta("cache")
+            return em_cache
+        if single_flight is None:
+            break
+        voo, lider = single_flight.entrar(pergunta, vetor, versao, escopo)
+        if lider:
+            break
+        try:
+            with metricas.etapa("coalescida"):
+                resultado = single_flight.aguardar(voo)
+        except LiderDesistiu:
+            # quem executava foi abandonado: tenta de novo (provavelmente como líder)
+            continue
+        except SemContexto:
+            resultado = _seguidor_sem_contexto(voo, pergunta)
+            if resultado is None:
+                continue
+            return resultado
+        _contar_resposta("coalescida")
+        return copy.deepcopy(resultado)
+
+    try:
+        resultado = _executar_pipeline(pergunta, vetor, handle, filtros, escopo)
+    except BaseException as e:
+        if voo is not None:
+            single_flight.concluir(voo, erro=_erro_do_lider(e))
+        raise
+    if voo is not None:
+        _concluir_voo(voo, pergunta, resultado)
+    return resultado
+
+
+def _executar_pipeline(pergunta: str, vetor, handle, filtros, escopo: str) -> dict:
+    """Recuperação, reranqueamento e LLM (com vaga no controle de admissão)."""
+    versao = handle.version
+    # recusa antes da recuperação se a fila do LLM já está cheia
+    admissao.verificar()
+    docs = handle.value["retriever"].invoke(pergunta, vetor, filtros)
+    contexto = [doc.page_content for doc in docs]
+
+    if not contexto or len(" ".join(contexto)) < 50:
+        _contar_resposta("sem_contexto")
+        resultado = _resposta_sem_contexto(pergunta)
+        return resultado
+
+    contexto = _montar_contexto(pergunta, docs, handle.value["retriever"])
+    rag_chain = prompt | llm | StrOutputParser()
+    with admissao.vaga():
+        _contar_resposta("llm")
+        try:
+            with metricas.etapa("llm"):
+                resposta = rag_chain.invoke({"pergunta": pergunta, "contexto": contexto})
+        except Exception:
+            _registrar_llm(pergunta, contexto, None)
+            raise
+    _registrar_llm(pergunta, contexto, resposta)
+
+    resultado = {"resposta": resposta, "fontes": _extrair_fontes(docs)}
+    semantic_cache.put(pergunta, vetor, resultado, versao, escopo)
+    return resultado
+
+
+def answer_batch(perguntas: list[str], filtros: Filtros | None = None) -> list[dict]:
+    """
+    Responde a várias perguntas de uma vez (rota ``/ask/batch/``).
+
+    Em vez de repetir o pipeline de :func:`answer_question` para cada uma:
+
+    * perguntas repetidas no lote (mesmo texto normalizado) são respondidas uma vez;
+    * os embeddings das perguntas fora do cache saem de uma única passada do modelo;
+    * as que não estão no cache semântico fazem uma única busca no índice com
+      todos os vetores, e os pares de todas vão juntos ao cross-encoder, em
+      lotes de ``RERANK_LOTE`` (ver :meth:`chatbot.reranking.RerankingRetriever.invoke_lote`);
+    * as chamadas ao LLM rodam em até ``BATCH_LLM_CONCORRENTES`` threads, cada
+      uma ocupando uma vaga do controle de admissão, como no ``/ask/``.
+
+    Uma pergunta que falha não derruba o lote: o item dela traz ``erro`` (e,
+    por falta de vaga no LLM, ``retry_after``) no lugar de ``resposta``.
+
+    Args:
+        perguntas (list[str]): Perguntas, na ordem em que as respostas são devolvidas.
+        filtros (chatbot.filtros.Filtros | None): Restrições aplicadas a todas as perguntas.
+
+    Returns:
+        list[dict]: Para cada pergunta, ``{"resposta", "fontes"}`` ou ``{"erro", ...}``.
+    """
+    with metricas.requisicao("ask_batch", perguntas=len(perguntas)):
+        init_components()
+
+        with index_manager.acquire() as handle:
+            if handle is None:
+                RESPOSTAS.inc(len(perguntas), caminho="sem_indice")
+                return [
+                    {"resposta": "Não foi possível inicializar o mecanismo RAG.", "fontes": []}
+                    for _ in perguntas
+                ]
+            return _answer_batch_with_index(perguntas, handle, filtros)
+
+
+def _answer_batch_with_index(perguntas: list[str], handle, filtros=None) -> list[dict]:
+    versao = handle.version
+    escopo = _escopo(filtros)
+
+    # perguntas repetidas no lote são respondidas uma única vez
+    posicao_de, unicas = {}, []
+    for pergunta in perguntas:
+        chave = SemanticCache._key(pergunta)
+        if chave not in posicao_de:
+            posicao_de[chave] = len(unicas)
+            unicas.append(pergunta)
+
+    with metricas.etapa("embedding"):
+        vetores = _embed_queries(unicas)
+
+    resultados, caminhos, pendentes = [None] * len(unicas), [None] * len(unicas), []
+    for i, (pergunta, vetor) in enumerate(zip(unicas, vetores)):
+        em_cache = semantic_cache.get(pergunta, vetor, versao, escopo)
+        if em_cache is not None:
+            resultados[i], caminhos[i] = em_cache, "cache"
+        else:
+            pendentes.append(i)
+
+    geracoes = []
+    if pendentes:
+        try:
+            docs_lote = handle.value["retriever"].invoke_lote(
+                [unicas[i] for i in pendentes], vetores[pendentes], filtros, batch_size=RERANK_LOTE
+            )
+        except Exception as e:
+            logger.exception("Falha na recuperação do lote")
+            docs_lote = [None] * len(pendentes)
+            for i in pendentes:
+                resultados[i], caminhos[i] = {"erro": str(e)}, "erro"
+
+        for i, docs in zip(pendentes, docs_lote):
+            if docs is None:
+                continue
+            contexto = [doc.page_content for doc in docs]
+            if not contexto or len(" ".join(contexto)) < 50:
+                resultados[i], caminhos[i] = _resposta_sem_contexto(unicas[i]), "sem_contexto"
+            else:
+                geracoes.append((i, docs))
+
+    if geracoes:
+        rag_chain = prompt | llm | StrOutputParser()
+        with metricas.etapa("llm"), ThreadPoolExecutor(
+            max_workers=max(1, min(BATCH_LLM_CONCORRENTES, len(geracoes))), thread_name_prefix="ask-batch"
+        ) as executor:
+            # cada tarefa leva uma cópia do contexto atual, como o asyncio.to_thread faz no
+            # streaming; sem isso a requisição de métricas se perde nas threads do executor
+            futuros = [
+                executor.submit(
+                    contextvars.copy_context().run, _gerar, rag_chain, unicas[i], docs, handle.value["retriever"]
+                )
+                for i, docs in geracoes
+            ]
+        for (i, docs), futuro in zip(geracoes, futuros):
+            try:
+                resposta = futuro.result()
+            except Sobrecarga as e:
+                resultados[i], caminhos[i] = {"erro": str(e), "retry_after": e.retry_after}, "sobrecarga"
+            except Exception as e:
+                logger.error(f"Falha ao gerar a resposta de {unicas[i]!r} no lote: {e}")
+                resultados[i], caminhos[i] = {"erro": str(e)}, "erro"
+            else:
+                resultados[i], caminhos[i] = {"resposta": resposta, "fontes": _extrair_fontes(docs)}, "llm"
+                semantic_cache.put(unicas[i], vetores[i], resultados[i], versao, escopo)
+
+    respostas, contagem, vistas = [], Counter(), set()
+    for pergunta in perguntas:
+        i = posicao_de[SemanticCache._key(pergunta)]
+        contagem["coalescida" if i in vistas else caminhos[i]] += 1
+        vistas.add(i)
+        respostas.append(copy.deepcopy(resultados[i]))
+    for caminho, n in contagem.items():
+        RESPOSTAS.inc(n, caminho=caminho)
+    metricas.anotar(unicas=len(unicas), caminhos=dict(contagem))
+    return respostas
+
+
+def _gerar(rag_chain, pergunta: str, docs, retriever) -> str:
+    """Uma chamada ao LLM de :func:`answer_batch`, com vaga no controle de admissão."""
+    contexto = _montar_contexto(pergunta, docs, retriever)
+    with admissao.vaga():
+        try:
+            resposta = rag_chain.invoke({"pergunta": pergunta, "contexto": contexto})
+        except Exception:
+            _registrar_llm(pergunta, contexto, None)
+            raise
+    _registrar_llm(pergunta, contexto, resposta)
+    return resposta
+
+
+def _eventos_prontos(resultado: dict):
+    """Eventos de uma resposta já pronta (cache ou pergunta coalescida)."""
+    yield "fontes", resultado["fontes"]
+    yield "token", resultado["resposta"]
+    yield "fim", resultado
+
+
+async def astream_answer(pergunta: str, filtros: Filtros | None = None):
+    """
+    Versão em streaming de :func:`answer_question`.
+
+    Gera eventos na ordem em que ficam prontos: primeiro as fontes (assim que
+    a recuperação termina), depois os pedaços da resposta à medida que o LLM
+    os produz e, por fim, um evento de encerramento com a resposta completa.
+    As etapas bloqueantes (modelos e FAISS) rodam em threads, sem travar o
+    event loop. Para testes, basta substituir ``rag_engine.llm`` por um chat
+    model falso com suporte a streaming.
+
+    Uma pergunta igual a outra em andamento espera o resultado dela e o recebe
+    de uma vez, como uma resposta do cache.
+
+    Args:
+        pergunta (str): Pergunta a ser respondida.
+        filtros (chatbot.filtros.Filtros | None): Como em :func:`answer_question`.
+
+    Yields:
+        tuple[str, object]: Pares ``(evento, dados)``, onde ``evento`` é
+        ``"fontes"``, ``"token"`` ou ``"fim"``.
+
+    Raises:
+        chatbot.concorrencia.Sobrecarga: Sem vaga para chamar o LLM.
+    """
+    with metricas.requisicao("ask_stream"):
+        await asyncio.to_thread(init_components)
+
+        with index_manager.acquire() as handle:
+            if handle is None:
+                _contar_resposta("sem_indice")
+                for evento in _eventos_prontos({
+                    "resposta": "Não foi possível inicializar o mecanismo RAG.",
+                    "fontes": [],
+                }):
+                    yield evento
+                return
+
+            versao = handle.version
+            escopo = _escopo(filtros)
+            with metricas.etapa("embedding"):
+                vetor = await asyncio.to_thread(_embed_query, pergunta)
+
+            voo = None
+            while True:
+                em_cache = semantic_cache.get(pergunta, vetor, versao, escopo)
+                if em_cache is not None:
+                    _contar_resposta("cache")
+                    for evento in _eventos_prontos(em_cache):
+                        yield evento
+                    return
+                if single_flight is None:
+                    break
+                voo, lider = single_flight.entrar(pergunta, vetor, versao, escopo)
+                if lider:
+                    break
+                try:
+                    with metricas.etapa("coalescida"):
+                        resultado = await single_flight.aguardar_async(voo)
+                except LiderDesistiu:
+                    continue
+                except SemContexto:
+                    resultado = _seguidor_sem_contexto(voo, pergunta)
+                    if resultado is None:
+                        continue
+                    for evento in _eventos_prontos(resultado):
+                        yield evento
+                    return
+                except Sobrecarga:
+                    _contar_resposta("sobrecarga")
+                    raise
+                _contar_resposta("coalescida")
+                for evento in _eventos_prontos(copy.deepcopy(resultado)):
+                    yield evento
+                return
+
+            resultado = None
+            try:
+                async for evento, dados in _stream_pipeline(pergunta, vetor, handle, filtros, escopo):
+                    if evento == "fim":
+                        resultado = dados
+                    yield evento, dados
+            except BaseException as e:
+                if voo is not None:
+                    single_flight.concluir(voo, erro=_erro_do_lider(e))
+                if isinstance(e, Sobrecarga):
+                    _contar_resposta("sobrecarga")
+                raise
+            if voo is not None:
+                _concluir_voo(voo, pergunta, resultado)
+
+
+async def _stream_pipeline(pergunta: str, vetor, handle, filtros, escopo: str):
+    """Recuperação, reranqueamento e LLM em streaming (ver :func:`astream_answer`)."""
+    versao = handle.version
+    admissao.verificar()
+    docs = await asyncio.to_thread(handle.value["retriever"].invoke, pergunta, vetor, filtros)
+    contexto = [doc.page_content for doc in docs]
+
+    if not contexto or len(" ".join(contexto)) < 50:
+        _contar_resposta("sem_contexto")
+        resultado = _resposta_sem_contexto(pergunta)
+        for evento in _eventos_prontos(resultado):
+            yield evento
+        return
+
+    fontes = _extrair_fontes(docs)
+    yield "fontes", fontes
+
+    contexto = _montar_contexto(pergunta, docs, handle.value["retriever"])
+    rag_chain = prompt | llm | StrOutputParser()
+    partes = []
+    async with admissao.vaga_async():
+        _contar_resposta("llm")
+        inicio = time.perf_counter()
+        try:
+            with metricas.etapa("llm"):
+                async for parte in rag_chain.astream({"pergunta": pergunta, "contexto": contexto}):
+                    if parte:
+                        if not partes:
+                            metricas.anotar(primeiro_token_ms=round(1000 * (time.perf_counter() - inicio), 1))
+                        partes.append(parte)
+                        yield "token", parte
+        except Exception:
+            _registrar_llm(pergunta, contexto, None)
+            raise
+    _registrar_llm(pergunta, contexto, "".join(partes))
+
+    resultado = {"resposta": "".join(partes), "fontes": fontes}
+    semantic_cache.put(pergunta, vetor, resultado, versao, escopo)
+    yield "fim", resultado
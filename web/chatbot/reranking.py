@@ -0,0 +1,389 @@
+"""
+Etapa de reranqueamento adaptativo.
+
+Em vez de sempre passar os ``k`` candidatos do FAISS pelo cross-encoder, esta
+etapa:
+
+* escolhe a profundidade de candidatos por pergunta: só entram candidatos cuja
+  similaridade densa está a até ``delta`` do melhor, entre ``k_min`` e ``k_max``;
+* pula o cross-encoder quando a fronteira do top-n já é decisiva, isto é,
+  quando a diferença entre o n-ésimo e o (n+1)-ésimo candidato supera ``margem``
+  (ou quando não há mais candidatos que o top-n);
+* quando o cross-encoder roda, todos os pares vão em um único lote com
+  padding, truncados no ``max_length`` com que o cross-encoder foi criado. No
+  ``/ask/batch/`` (:meth:`AdaptiveReranker.rerank_lote`), os pares de todas as
+  perguntas do lote são avaliados juntos.
+
+As estatísticas de quantas perguntas pularam o cross-encoder e da latência
+economizada ficam em :meth:`AdaptiveReranker.stats`.
+
+Quando a versão do índice tem um índice BM25 (ver :mod:`chatbot.bm25`), o
+:class:`RerankingRetriever` faz a busca híbrida: funde os candidatos densos e
+léxicos por RRF e passa ao cross-encoder só os primeiros da fusão. Os scores
+RRF não são similaridades, então a profundidade e a margem acima não se
+aplicam a eles; o atalho da busca híbrida é a concordância: quando a ordem
+densa é decisiva pela margem e o BM25 não muda o conjunto do top-n (os
+``top_n`` primeiros da fusão são os ``top_n`` primeiros da busca densa), o
+cross-encoder é pulado e vale a ordem da fusão. Sem concordância, todos os
+``fusao_k`` candidatos são avaliados.
+
+Com :class:`chatbot.filtros.Filtros`, as duas buscas ficam restritas às
+posições permitidas, e o decaimento por recência multiplica tanto o score
+usado para escolher os candidatos quanto o do cross-encoder.
+"""
+
+import time
+import threading
+
+import numpy as np
+
+from . import ann, metricas
+from .bm25 import fundir_rrf
+
+
+def similaridade_l2(distancia: float) -> float:
+    """
+    Converte a distância L2 ao quadrado do FAISS em similaridade de cosseno.
+
+    Válido para embeddings normalizados (como os do ``all-MiniLM-L6-v2``),
+    para os quais ``||a - b||² = 2 - 2·cos(a, b)``.
+    """
+    return 1.0 - float(distancia) / 2.0
+
+
+class AdaptiveReranker:
+    """
+    Reranqueador com profundidade adaptativa e atalho por margem densa.
+
+    Args:
+        cross_encoder: Objeto com ``predict(pares, batch_size=...)`` (por exemplo
+            ``sentence_transformers.CrossEncoder`` ou o ``client`` de
+            ``HuggingFaceCrossEncoder``).
+        top_n (int): Documentos devolvidos.
+        k_min (int): Profundidade mínima de candidatos.
+        k_max (int): Profundidade máxima de candidatos (o que é buscado no FAISS).
+        delta (float): Distância máxima de similaridade para o melhor candidato.
+        margem (float): Diferença entre o n-ésimo e o (n+1)-ésimo candidato a
+            partir da qual o cross-encoder é pulado.
+    """
+
+    def __init__(self, cross_encoder, top_n: int = 5, k_min: int = 5, k_max: int = 10,
+                 delta: float = 0.15, margem: float = 0.08):
+        self.cross_encoder = cross_encoder
+        self.top_n = top_n
+        self.k_min = max(k_min, top_n)
+        self.k_max = max(k_max, self.k_min)
+        self.delta = delta
+        self.margem = margem
+        self._lock = threading.Lock()
+        self._consultas = 0
+        self._puladas = 0
+        self._pares = 0
+        self._pares_evitados = 0
+        self._segundos_rerank = 0.0
+
+    def profundidade(self, similaridades: list[float]) -> int:
+        """Quantos candidatos, em ordem densa, merecem ir para o reranqueamento."""
+        if not similaridades:
+            return 0
+        melhor = similaridades[0]
+        proximos = sum(1 for s in similaridades if melhor - s <= self.delta)
+        return min(len(similaridades), max(self.k_min, min(self.k_max, proximos)))
+
+    def decisivo(self, similaridades: list[float]) -> bool:
+        """Verdadeiro se a ordem densa já define o top-n com folga."""
+        if len(similaridades) <= self.top_n:
+            return True
+        return similaridades[self.top_n - 1] - similaridades[self.top_n] >= self.margem
+
+    def rerank(self, pergunta: str, docs_com_score: list, adaptativo: bool = True, pesos=None,
+               atalho: bool = False) -> list:
+        """
+        Reordena os candidatos e devolve os ``top_n`` melhores.
+
+        Args:
+            pergunta (str): Pergunta do usuário.
+            docs_com_score (list): Pares ``(Document, similaridade)`` em ordem
+                decrescente de similaridade densa.
+            adaptativo (bool): Se falso, todos os candidatos vão para o
+                cross-encoder (usado quando os scores não são similaridades
+                densas, como na fusão híbrida).
+            pesos (list[float] | None): Peso de cada candidato (recência). O
+                score do cross-encoder, levado a (0, 1) pela sigmoide, é
+                multiplicado por ele.
+            atalho (bool): Pula o cross-encoder mesmo sem ``adaptativo``: quem
+                chama já sabe que a ordem dos candidatos define o top-n (a
+                concordância da busca híbrida).
+
+        Returns:
+            list: Os documentos escolhidos.
+        """
+        candidatos, atalho = self._selecionar(docs_com_score, adaptativo, atalho)
+        metricas.anotar(candidatos=len(candidatos), cross_encoder=not atalho)
+        if atalho:
+            self._contar_atalhos([candidatos])
+            return [doc for doc, _ in candidatos[:self.top_n]]
+
+        pares = [(pergunta, doc.page_content) for doc, _ in candidatos]
+        scores = self._pontuar(pares, batch_size=len(pares), consultas=1)
+        return self._ordenar(candidatos, scores, pesos)
+
+    def rerank_lote(self, perguntas: list[str], listas: list[list], adaptativo: bool = True,
+                    pesos: list | None = None, batch_size: int = 64, atalhos: list | None = None) -> list[list]:
+        """
+        Como :meth:`rerank` para várias perguntas: os pares de todas as que
+        precisam do cross-encoder são avaliados juntos, em lotes de ``batch_size``.
+
+        Args:
+            listas (list[list]): Candidatos de cada pergunta, como em :meth:`rerank`.
+            pesos (list | None): Pesos de cada pergunta (ou ``None`` em cada posição).
+            atalhos (list[bool] | None): ``atalho`` de :meth:`rerank` para cada pergunta.
+
+        Returns:
+            list[list]: Os documentos escolhidos para cada pergunta.
+        """
+        pesos = pesos or [None] * len(perguntas)
+        atalhos = atalhos or [False] * len(perguntas)
+        selecoes = [self._selecionar(docs, adaptativo, atalho) for docs, atalho in zip(listas, atalhos)]
+        self._contar_atalhos([candidatos for candidatos, atalho in selecoes if atalho])
+
+        pares, fatias = [], []
+        for pergunta, (candidatos, atalho) in zip(perguntas, selecoes):
+            inicio = len(pares)
+            if not atalho:
+                pares.extend((pergunta, doc.page_content) for doc, _ in candidatos)
+            fatias.append((inicio, len(pares)))
+        consultas = sum(1 for _, atalho in selecoes if not atalho)
+        metricas.anotar(pares_cross_encoder=len(pares), cross_encoder_consultas=consultas)
+        scores = self._pontuar(pares, batch_size=batch_size, consultas=consultas) if pares else []
+
+        return [
+            [doc for doc, _ in candidatos[:self.top_n]] if atalho
+            else self._ordenar(candidatos, scores[inicio:fim], pesos_pergunta)
+            for (candidatos, atalho), (inicio, fim), pesos_pergunta in zip(selecoes, fatias, pesos)
+        ]
+
+    def _selecionar(self, docs_com_score: list, adaptativo: bool, atalho: bool = False) -> tuple[list, bool]:
+        """Candidatos que vão ao reranqueamento e se o cross-encoder pode ser pulado."""
+        if adaptativo:
+            similaridades = [s for _, s in docs_com_score]
+            candidatos = docs_com_score[:self.profundidade(similaridades)]
+            return candidatos, atalho or self.decisivo(similaridades[:len(candidatos)])
+        return docs_com_score, atalho or len(docs_com_score) <= 1
+
+    def _contar_atalhos(self, listas: list[list]):
+        with self._lock:
+            self._consultas += len(listas)
+            self._puladas += len(listas)
+            self._pares_evitados += sum(len(candidatos) for candidatos in listas)
+
+    def _pontuar(self, pares: list, batch_size: int, consultas: int) -> np.ndarray:
+        inicio = time.perf_counter()
+        scores = self.cross_encoder.predict(pares, batch_size=batch_size)
+        duracao = time.perf_counter() - inicio
+
+        with self._lock:
+            self._consultas += consultas
+            self._pares += len(pares)
+            self._segundos_rerank += duracao
+        return np.asarray(scores, dtype=np.float64)
+
+    def _ordenar(self, candidatos: list, scores, pesos=None) -> list:
+        if pesos is not None:
+            scores = np.asarray(pesos[:len(candidatos)]) / (1.0 + np.exp(-scores))
+        ordem = sorted(range(len(candidatos)), key=lambda i: float(scores[i]), reverse=True)
+        return [candidatos[i][0] for i in ordem[:self.top_n]]
+
+    def stats(self) -> dict:
+        """
+        Retorna a taxa de atalhos e a latência economizada (estimada).
+
+        A economia é estimada pelo custo médio por par medido nas consultas que
+        rodaram o cross-encoder, multiplicado pelos pares evitados.
+        """
+        with self._lock:
+            custo_par = self._segundos_rerank / self._pares if self._pares else 0.0
+            return {
+                "consultas": self._consultas,
+                "puladas": self._puladas,
+                "taxa_pulo": round(self._puladas / self._consultas, 3) if self._consultas else 0.0,
+                "pares_reranqueados": self._pares,
+                "pares_evitados": self._pares_evitados,
+                "ms_rerank_total": round(1000 * self._segundos_rerank, 1),
+                "ms_economizados_estimados": round(1000 * custo_par * self._pares_evitados, 1),
+            }
+
+
+class RerankingRetriever:
+    """
+    Retriever que busca ``k_max`` candidatos no FAISS e aplica o :class:`AdaptiveReranker`.
+
+    Com um índice BM25 (``lexico``), a busca é híbrida: os ``k_max`` melhores
+    do FAISS e os ``k_max`` melhores do BM25 são fundidos por RRF e só os
+    ``fusao_k`` primeiros da fusão vão, todos, para o cross-encoder.
+
+    Com os metadados dos trechos (``metadados``), aceita
+    :class:`chatbot.filtros.Filtros`: as buscas só consideram as posições
+    permitidas e, com ``recencia_dias``, os scores decaem com a idade. Os
+    trechos removidos dos metadados nunca são devolvidos.
+
+    Expõe ``invoke(pergunta)`` como os retrievers do LangChain e
+    ``invoke_lote(perguntas, vetores)`` para o ``/ask/batch/``.
+
+    Args:
+        vector_store: Vector store ``FAISS`` do LangChain.
+        reranker (AdaptiveReranker): Reranqueador.
+        lexico (chatbot.bm25.IndiceBM25 | None): Índice BM25 dos mesmos trechos.
+        fusao_k (int): Candidatos da fusão passados ao cross-encoder.
+        rrf_k (int): Constante do RRF.
+        metadados (chatbot.filtros.IndiceMetadados | None): Data e fonte de cada trecho.
+        concordancia (bool): Na busca híbrida, pula o cross-encoder quando a
+            busca densa e a fusão concordam no top-n (ver o docstring do módulo).
+    """
+
+    def __init__(self, vector_store, reranker: AdaptiveReranker, lexico=None, fusao_k: int = 6, rrf_k: int = 60,
+                 metadados=None, concordancia: bool = True):
+        self.vector_store = vector_store
+        self.reranker = reranker
+        self.lexico = lexico
+        self.fusao_k = fusao_k
+        self.rrf_k = rrf_k
+        self.metadados = metadados
+        self.concordancia = concordancia
+
+    def candidatos(self, pergunta: str, vetor=None, filtros=None) -> list:
+        """
+        Pares ``(Document, similaridade)`` do FAISS, do mais para o menos similar.
+
+        Na busca híbrida, os pares trazem o score RRF no lugar da similaridade;
+        com decaimento por recência, o score já vem multiplicado pelo peso.
+        Se o embedding da pergunta já foi calculado, ``vetor`` evita recalculá-lo.
+        """
+        return self._buscar(pergunta, vetor, filtros)[0]
+
+    def _buscar(self, pergunta: str, vetor=None, filtros=None) -> tuple[list, list | None, bool]:
+        """
+        Candidatos, o peso de cada um (com decaimento por recência) e se a
+        busca híbrida concordou com a densa (o cross-encoder pode ser pulado).
+        """
+        if vetor is None:
+            vetor = self.vector_store._embed_query(pergunta)
+        return self._buscar_lote([pergunta], [vetor], filtros)[0]
+
+    def _buscar_lote(self, perguntas: list[str], vetores, filtros=None) -> list[tuple[list, list | None, bool]]:
+        """
+        Como :meth:`_buscar` para várias perguntas com os mesmos filtros: as
+        posições permitidas são calculadas uma vez e a busca densa é uma única
+        chamada ao índice com todos os vetores.
+        """
+        posicoes, extra = None, 0
+        if self.metadados is not None:
+            # os trechos removidos (chatbot.filtros.marcar_removidos) saem pelas posições
+            # ou, sem elas, por uma busca com folga seguida de descarte
+            posicoes = self.metadados.posicoes(filtros)
+            if posicoes is None:
+                extra = self.metadados.sobrebusca
+            elif filtros is not None:
+                metricas.anotar(posicoes_filtradas=len(posicoes))
+
+        densos = self._densos(vetores, self.reranker.k_max, posicoes, extra)
+        resultados = []
+        for pergunta, vizinhos in zip(perguntas, densos):
+            concordam = False
+            if self.lexico is not None:
+                pares = self._candidatos_hibridos(pergunta, [pos for pos, _ in vizinhos], posicoes, extra)
+                concordam = self.concordancia and self._concordam(vizinhos, pares)
+                metricas.anotar(concordancia=concordam)
+            else:
+                pares = [(pos, similaridade_l2(dist)) for pos, dist in vizinhos]
+            resultados.append((*self._documentos(pares, filtros), concordam))
+        return resultados
+
+    def _concordam(self, densos: list[tuple[int, float]], fundidos: list[tuple[int, float]]) -> bool:
+        """
+        Verdadeiro se a ordem densa é decisiva pela margem do :class:`AdaptiveReranker`
+        e os ``top_n`` primeiros da fusão são os ``top_n`` primeiros da busca densa.
+        """
+        n = self.reranker.top_n
+        if not self.reranker.decisivo([similaridade_l2(dist) for _, dist in densos]):
+            return False
+        return {pos for pos, _ in densos[:n]} == {pos for pos, _ in fundidos[:n]}
+
+    def _documentos(self, pares: list[tuple[int, float]], filtros=None) -> tuple[list, list | None]:
+        """Aplica o decaimento por recência e o corte da fusão e troca as posições pelos documentos."""
+        pesos = None
+        if filtros is not None and filtros.recencia_dias and self.metadados is not None and pares:
+            pesos = self.metadados.pesos([pos for pos, _ in pares], filtros.recencia_dias)
+            ordem = sorted(range(len(pares)), key=lambda i: pares[i][1] * pesos[i], reverse=True)
+            pares = [(pares[i][0], pares[i][1] * pesos[i]) for i in ordem]
+            pesos = [float(pesos[i]) for i in ordem]
+        if self.lexico is not None:
+            pares = pares[:self.fusao_k]
+            pesos = pesos[:self.fusao_k] if pesos is not None else None
+
+        candidatos, pesos_docs = [], []
+        vs = self.vector_store
+        for i, (pos, score) in enumerate(pares):
+            doc = vs.docstore.search(vs.index_to_docstore_id[pos])
+            if not isinstance(doc, str):
+                candidatos.append((doc, score))
+                pesos_docs.append(pesos[i] if pesos is not None else 1.0)
+        return candidatos, (pesos_docs if pesos is not None else None)
+
+    def _densos(self, vetores, k: int, posicoes=None, extra: int = 0) -> list[list[tuple[int, float]]]:
+        """
+        Pares ``(posição, distância L2²)`` dos ``k`` vizinhos de cada vetor
+        (uma única busca no índice), só entre ``posicoes`` se dadas. Com
+        ``extra``, pede ``k + extra`` e descarta os trechos removidos.
+        """
+        with metricas.etapa("faiss"):
+            distancias, indices = ann.buscar(
+                self.vector_store.index, np.asarray(vetores, dtype=np.float32), k + extra, posicoes
+            )
+        densos = [
+            [(int(pos), float(dist)) for pos, dist in zip(linha_i, linha_d) if pos >= 0]
+            for linha_i, linha_d in zip(indices, distancias)
+        ]
+        if extra:
+            densos = [self.metadados.sem_removidos(pares, k) for pares in densos]
+        return densos
+
+    def _candidatos_hibridos(
+        self, pergunta: str, densos: list[int], posicoes=None, extra: int = 0
+    ) -> list[tuple[int, float]]:
+        k = self.reranker.k_max
+        with metricas.etapa("bm25"):
+            pares = self.lexico.buscar(pergunta, k + extra, posicoes)
+            if extra:
+                pares = self.metadados.sem_removidos(pares, k)
+            lexicos = [pos for pos, _ in pares]
+
+        # com decaimento por recência, o corte em fusao_k é feito depois de aplicar os pesos
+        fundidos = fundir_rrf([densos, lexicos], k=self.rrf_k)
+        metricas.anotar(so_bm25=sum(1 for pos, _ in fundidos[:self.fusao_k] if pos not in densos))
+        return fundidos
+
+    def reranquear(self, pergunta: str, candidatos: list, pesos=None, concordam: bool = False) -> list:
+        """Aplica o reranqueador aos pares de :meth:`candidatos`."""
+        return self.reranker.rerank(
+            pergunta, candidatos, adaptativo=self.lexico is None, pesos=pesos, atalho=concordam
+        )
+
+    def invoke(self, pergunta: str, vetor=None, filtros=None) -> list:
+        candidatos, pesos, concordam = self._buscar(pergunta, vetor, filtros)
+        with metricas.etapa("rerank"):
+            return self.reranquear(pergunta, candidatos, pesos, concordam)
+
+    def invoke_lote(self, perguntas: list[str], vetores, filtros=None, batch_size: int = 64) -> list[list]:
+        """
+        Documentos de várias perguntas (com os mesmos filtros): uma busca densa
+        com todos os vetores e os pares de todas as perguntas avaliados juntos
+        pelo cross-encoder (ver :meth:`AdaptiveReranker.rerank_lote`).
+        """
+        buscas = self._buscar_lote(perguntas, vetores, filtros)
+        with metricas.etapa("rerank"):
+            return self.reranker.rerank_lote(
+                perguntas, [candidatos for candidatos, _, _ in buscas], adaptativo=self.lexico is None,
+                pesos=[pesos for _, pesos, _ in buscas], batch_size=batch_size,
+                atalhos=[concordam for _, _, concordam in buscas],
+            )
@@ -5,7 +5,12 @@ Este módulo define os padrões de URL para o app chatbot, mapeando URLs para su
 
 Rotas:
     - "ask/": Mapeia para a view 'ask', que lida com requisições de API para interações com o chatbot (retorna JSON).
+    - "ask/batch/": Mapeia para a view 'ask_batch', que responde a uma lista de perguntas em uma única requisição.
     - "interface/": Mapeia para a view 'chat_interface', que serve a interface web do chatbot.
+    - "ready/": Mapeia para a view 'ready', que informa se os componentes do RAG já foram carregados.
+    - "metrics/": Mapeia para a view 'metrics', que expõe as métricas no formato do Prometheus.
+    - "update_news/": Mapeia para a view 'update_news', que enfileira uma coleta de notícias.
+    - "update_news/<id>/": Mapeia para a view 'tarefa_coleta', com o status e o progresso da coleta.
 
 Importações:
     - path: Função do Django para definir padrões de URL.
@@ -14,10 +19,14 @@ Importações:
 """
 from django.urls import path
 from . import views
-from .views import ask, chat_interface, update_news
+from .views import ask, ask_batch, chat_interface, metrics, ready, tarefa_coleta, update_news
 
 urlpatterns = [
     path("ask/", ask, name="ask"),     # API JSON em /ask/
+    path("ask/batch/", ask_batch, name="ask_batch"),  # várias perguntas por requisição
     path("", chat_interface, name="chat"),  # interface web direto na raiz
-    path("update_news/", update_news, name="update_news"),  # novo endpoint
+    path("update_news/", update_news, name="update_news"),  # enfileira uma coleta (202 + id da tarefa)
+    path("update_news/<int:tarefa_id>/", tarefa_coleta, name="tarefa_coleta"),  # status da coleta
+    path("ready/", ready, name="ready"),  # readiness dos componentes do RAG
+    path("metrics/", metrics, name="metrics"),  # métricas no formato do Prometheus
 ]
\ No newline at end of file
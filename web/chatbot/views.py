@@ -1,20 +1,77 @@
 import os
 import json
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from .rag_engine import answer_question
+from . import metricas, rag_engine
+from .rag_engine import answer_question, astream_answer
+from .filtros import Filtros
+from .conversas import Conversa
+from .concorrencia import Sobrecarga
 from django.shortcuts import render
+from django.urls import reverse
 import subprocess
 from pathlib import Path
 
+def _quer_streaming(request, data: dict) -> bool:
+    """Streaming é pedido via ``Accept: text/event-stream``, ``?stream=1`` ou ``"stream": true`` no JSON."""
+    return (
+        "text/event-stream" in request.headers.get("Accept", "")
+        or request.GET.get("stream") == "1"
+        or data.get("stream") is True
+    )
+
+
+def _evento_sse(evento: str, dados) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+async def _stream_sse(pergunta: str, filtros=None):
+    """Converte os eventos de :func:`astream_answer` para o formato Server-Sent Events."""
+    try:
+        async for evento, dados in astream_answer(pergunta, filtros):
+            yield _evento_sse(evento, dados)
+    except Sobrecarga as e:
+        yield _evento_sse("erro", {"erro": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        yield _evento_sse("erro", {"erro": str(e)})
+
+
+def _resposta_sobrecarga(erro: Sobrecarga) -> JsonResponse:
+    response = JsonResponse({"erro": str(erro), "retry_after": erro.retry_after}, status=503)
+    response["Retry-After"] = str(erro.retry_after)
+    return response
+
+
+def _resposta_streaming(pergunta: str, filtros=None) -> StreamingHttpResponse:
+    # iterador assíncrono: sob ASGI (web/asgi.py) o stream não ocupa uma thread
+    response = StreamingHttpResponse(_stream_sse(pergunta, filtros), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @csrf_exempt
 def ask(request):
     """
     Lida com requisições POST (JSON) e GET para responder à pergunta de um usuário.
     Sempre retorna 'resposta' como string.
+
+    Se o cliente pedir streaming (``Accept: text/event-stream``, ``?stream=1``
+    ou ``"stream": true`` no JSON), a resposta é enviada como Server-Sent Events:
+    ``fontes`` assim que a recuperação termina, vários ``token`` com pedaços da
+    resposta e um ``fim`` com o resultado completo.
+
+    Campos opcionais do JSON restringem a recuperação (ver ``chatbot.filtros``):
+    ``data_inicio`` e ``data_fim`` (``AAAA-MM-DD``, pela data de coleta),
+    ``fontes`` (lista de sites, ex.: ``["g1.globo.com", "df.gov.br"]``) e
+    ``recencia_dias`` (meia-vida, em dias, do peso que favorece notícias recentes).
+
+    Com o LLM saturado (fila do controle de admissão cheia ou espera esgotada,
+    ver ``chatbot.concorrencia``), responde ``503`` com ``Retry-After``.
     """
     if request.method == "POST":
         try:
+            data = {}
             if request.content_type == "application/json":
                 data = json.loads(request.body)
                 pergunta = data.get("pergunta", "")
@@ -24,8 +81,16 @@ def ask(request):
             if not pergunta:
                 return JsonResponse({"erro": "Pergunta vazia"}, status=400)
 
+            # ValueError com filtros inválidos vira 400 no except abaixo
+            filtros = Filtros.de_json(data)
+
+            if _quer_streaming(request, data):
+                # depois que o stream começa, o status não pode mais virar 503
+                rag_engine.admissao.verificar()
+                return _resposta_streaming(pergunta, filtros)
+
             # resposta pode ser dict (com 'resposta' e 'fontes') ou string
-            resposta = answer_question(pergunta)
+            resposta = answer_question(pergunta, filtros)
 
             if isinstance(resposta, dict):
                 return JsonResponse({
@@ -40,42 +105,96 @@ def ask(request):
                     "fontes": []
                 })
 
+        except Sobrecarga as e:
+            return _resposta_sobrecarga(e)
         except Exception as e:
             return JsonResponse({"erro": str(e)}, status=400)
 
     return JsonResponse({"erro": "Use POST (JSON) ou GET (?q=...)"}, status=400)
 
 
+@csrf_exempt
+def ask_batch(request):
+    """
+    Responde a várias perguntas em uma requisição POST (JSON).
+
+    O corpo traz ``"perguntas"`` (lista de textos, até ``BATCH_MAX_PERGUNTAS``)
+    e, opcionalmente, os mesmos filtros do ``/ask/``, aplicados a todas. As
+    perguntas passam juntas por embeddings, FAISS e cross-encoder, e as
+    chamadas ao LLM rodam em paralelo (ver ``rag_engine.answer_batch``).
+
+    A resposta traz um item por pergunta, na mesma ordem: ``resposta`` e
+    ``fontes``, ou ``erro`` (com ``retry_after`` quando faltou vaga no LLM).
+    Falhas em algumas perguntas não impedem as outras.
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": 'Use POST (JSON) com {"perguntas": [...]}'}, status=405)
+    try:
+        data = json.loads(request.body)
+        perguntas = data.get("perguntas")
+        if not isinstance(perguntas, list) or not perguntas or not all(isinstance(p, str) for p in perguntas):
+            return JsonResponse({"erro": "perguntas deve ser uma lista de textos"}, status=400)
+        if len(perguntas) > rag_engine.BATCH_MAX_PERGUNTAS:
+            return JsonResponse(
+                {"erro": f"No máximo {rag_engine.BATCH_MAX_PERGUNTAS} perguntas por lote"}, status=400
+            )
+
+        # ValueError com filtros inválidos vira 400 no except abaixo
+        filtros = Filtros.de_json(data)
+
+        validas = [i for i, pergunta in enumerate(perguntas) if pergunta.strip()]
+        respostas = dict(zip(validas, rag_engine.answer_batch([perguntas[i] for i in validas], filtros)))
+    except Exception as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+
+    resultados = [
+        {"pergunta": pergunta, **respostas.get(i, {"erro": "Pergunta vazia"})}
+        for i, pergunta in enumerate(perguntas)
+    ]
+    falhas = sum(1 for item in resultados if "erro" in item)
+    return JsonResponse({
+        "resultados": resultados,
+        "respondidas": len(resultados) - falhas,
+        "falhas": falhas,
+    })
+
+
 def chat_interface(request):
     """
     Gerencia a interface de chat para a aplicação chatbot.
 
-    Esta view controla a conversa entre o usuário e o chatbot, armazenando as mensagens na sessão.
-    Suporta limpar a conversa e gerar respostas do bot para as perguntas do usuário.
+    Esta view controla a conversa entre o usuário e o chatbot. As mensagens
+    ficam em um histórico limitado no cache (ver ``chatbot.conversas``); a
+    sessão guarda só o id da conversa. Suporta limpar a conversa e gerar
+    respostas do bot para as perguntas do usuário.
     """
-    if "messages" not in request.session:
-        request.session["messages"] = []
-
-    messages = request.session["messages"]
+    conversa = Conversa.da_sessao(request.session)
     thinking = False
 
     if request.method == "POST":
         if "clear" in request.POST:
             # botão limpar conversa
-            request.session["messages"] = []
+            conversa.limpar()
             messages = []
         else:
             pergunta = request.POST.get("pergunta")
             if pergunta:
-                # adiciona pergunta do usuário
-                messages.append({"sender": "user", "text": pergunta})
-                request.session["messages"] = messages
                 thinking = True
 
-                # gera resposta do bot
-                resposta = answer_question(pergunta)
-                messages.append({"sender": "bot", "text": str(resposta)})
-                request.session["messages"] = messages
+                # gera resposta do bot; pergunta e resposta são gravadas juntas
+                try:
+                    resposta = answer_question(pergunta)
+                except Sobrecarga as e:
+                    resposta = f"Muitas perguntas no momento. Tente de novo em {e.retry_after} s."
+                if isinstance(resposta, dict):
+                    bot = {"sender": "bot", "text": resposta.get("resposta", ""), "fontes": resposta.get("fontes", [])}
+                else:
+                    bot = {"sender": "bot", "text": str(resposta)}
+                messages = conversa.adicionar({"sender": "user", "text": pergunta}, bot)
+            else:
+                messages = conversa.mensagens()
+    else:
+        messages = conversa.mensagens()
 
     return render(
         request,
@@ -84,23 +203,62 @@ def chat_interface(request):
     )
 
 
-from crawler import crawler_exec
+def ready(request):
+    """
+    Readiness: 200 quando embeddings, reranker, índice, prompt e LLM estão
+    carregados neste processo, 503 enquanto não estão. O corpo traz o estado
+    e o tempo de carga de cada componente (ver ``rag_engine.readiness``).
+    """
+    estado = rag_engine.readiness()
+    return JsonResponse(estado, status=200 if estado["pronto"] else 503)
+
+
+def metrics(request):
+    """
+    Métricas deste processo no formato de texto do Prometheus: latência por
+    etapa, chamadas ao LLM, tamanhos de prompt, caches e crawler (ver
+    ``chatbot.metricas``).
+    """
+    return HttpResponse(metricas.exportar(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 def update_news(request):
+    """
+    Enfileira uma coleta de notícias e responde ``202`` com o id da tarefa,
+    sem esperar a coleta (ver ``crawler.fila``; as tarefas são executadas pelo
+    worker ``python -m crawler.fila``). Se uma coleta igual ainda está
+    pendente, devolve a mesma tarefa. ``?teste=1`` coleta sem gravar nada.
+
+    O andamento é consultado na URL de ``status`` da resposta.
+    """
     try:
-        test_mode = request.GET.get("teste") == "1"
-        query = "notícias recentes sobre educação na Região Integrada de Desenvolvimento do Distrito Federal e Entorno (RIDE-DF)"
-        artigos = crawler_exec.executar_coleta(query, test_mode=test_mode)
+        from crawler import fila
 
+        test_mode = request.GET.get("teste") == "1"
+        tarefa, criada = fila.abrir().enfileirar(fila.COLETA_QUERY, test_mode=test_mode)
         return JsonResponse({
-            "status": "sucesso",
+            "status": "enfileirada" if criada else "ja_enfileirada",
             "modo_teste": test_mode,
-            "qtde_artigos": len(artigos),
-            "artigos": artigos if test_mode else [a["titulo"] for a in artigos],
-        })
+            "tarefa": tarefa["id"],
+            "url_status": reverse("tarefa_coleta", args=[tarefa["id"]]),
+        }, status=202)
 
     except Exception as e:
         return JsonResponse({
             "status": "erro",
             "mensagem": str(e)
-        })
\ No newline at end of file
+        }, status=500)
+
+
+def tarefa_coleta(request, tarefa_id: int):
+    """
+    Status de uma tarefa de coleta: ``pendente``, ``executando`` (com ``etapa``
+    e ``progresso`` de 0 a 1), ``concluida`` (com ``resultado``) ou ``falhou``
+    (com ``erro``). ``404`` se a tarefa não existe.
+    """
+    from crawler import fila
+
+    tarefa = fila.abrir().obter(tarefa_id)
+    if tarefa is None:
+        return JsonResponse({"erro": "Tarefa não encontrada"}, status=404)
+    return JsonResponse(tarefa)
@@ -0,0 +1,336 @@
+"""
+Motor de coleta concorrente do crawler.
+
+Baixa várias páginas em paralelo respeitando três limites independentes:
+
+* um limite global de downloads/processamentos simultâneos (``max_workers``);
+* um limite de cortesia por host: conexões simultâneas e intervalo mínimo
+  entre requisições ao mesmo domínio (``max_por_host``/``intervalo_host``);
+* um limite separado de chamadas simultâneas ao LLM de extração (``max_llm``).
+
+Opcionalmente, um extrator local (``extrair_local``) é tentado antes do LLM;
+quando ele resolve a página, a chamada ao LLM é evitada.
+
+Cada host tem sua própria ``requests.Session`` com pool de conexões, e falhas
+transitórias (erros de rede, 429 e 5xx) são repetidas com backoff exponencial.
+Com um :class:`crawler.estado.EstadoColeta` (``estado``), URLs já
+processadas são buscadas com GET condicional e páginas inalteradas (``304``
+ou mesmo hash de conteúdo) são puladas antes da extração.
+O módulo não depende de Tavily nem do Gemini, então pode ser exercitado contra
+um servidor HTTP local e um LLM falso (ver ``benchmarks/bench_crawler.py``).
+"""
+
+import time
+import random
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crawler.estado import hash_conteudo
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+
+def salvar_html(html_dir: Path, url: str, html: str) -> Path:
+    """Salva o HTML bruto de ``url`` com a URL num comentário na primeira linha."""
+    html_dir.mkdir(parents=True, exist_ok=True)
+    caminho = html_dir / (hashlib.md5(url.encode()).hexdigest()[:10] + ".html")
+    caminho.write_text(f"<!-- {url} -->\n{html}", encoding="utf-8")
+    return caminho
+
+
+class LimiteHost:
+    """
+    Limita a concorrência e o ritmo das requisições a um único host.
+
+    Args:
+        max_concorrentes (int): Requisições simultâneas permitidas ao host.
+        intervalo (float): Intervalo mínimo, em segundos, entre o início de
+            duas requisições ao host.
+    """
+
+    def __init__(self, max_concorrentes: int, intervalo: float):
+        self.semaforo = threading.BoundedSemaphore(max_concorrentes)
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._proximo = 0.0
+
+    @contextmanager
+    def reservar(self):
+        with self.semaforo:
+            with self._lock:
+                agora = time.monotonic()
+                espera = self._proximo - agora
+                self._proximo = max(agora, self._proximo) + self.intervalo
+            if espera > 0:
+                time.sleep(espera)
+            yield
+
+
+class ColetorConcorrente:
+    """
+    Baixa e extrai páginas em paralelo.
+
+    O processamento de cada URL é ``download -> extrair_local(html)`` e, se a
+    extração local não resolver, ``preparar(html) -> extrair(texto)``.
+    ``preparar`` roda sem limite próprio (é CPU local) e ``extrair`` roda sob o
+    semáforo de LLM.
+
+    Args:
+        preparar: Função ``preparar(html) -> str | None``; ``None`` descarta a página.
+        extrair: Função ``extrair(texto) -> dict | None`` (chamada ao LLM).
+        extrair_local: Função opcional ``extrair_local(html) -> dict | None``;
+            quando devolve um artigo, o LLM não é chamado.
+        html_dir: Se informado, o HTML bruto de cada página baixada é salvo
+            nesse diretório (útil para montar corpus de avaliação offline).
+        estado: :class:`crawler.estado.EstadoColeta` opcional, consultado para
+            GETs condicionais e para pular conteúdo inalterado. O coletor só
+            atualiza nele o horário de páginas inalteradas; o resultado das
+            demais fica em :attr:`buscas` para quem chama registrar depois.
+        max_workers (int): Limite global de URLs processadas ao mesmo tempo.
+        max_por_host (int): Requisições simultâneas por host.
+        intervalo_host (float): Intervalo mínimo entre requisições ao mesmo host.
+        max_llm (int): Chamadas simultâneas ao LLM.
+        tentativas (int): Número máximo de tentativas por download.
+        backoff (float): Espera base, em segundos, do backoff exponencial.
+        timeout (float): Timeout de cada requisição HTTP.
+    """
+
+    def __init__(
+        self,
+        preparar,
+        extrair,
+        extrair_local=None,
+        html_dir=None,
+        estado=None,
+        max_workers: int = 8,
+        max_por_host: int = 2,
+        intervalo_host: float = 0.5,
+        max_llm: int = 3,
+        tentativas: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 20,
+    ):
+        self.preparar = preparar
+        self.extrair = extrair
+        self.extrair_local = extrair_local
+        self.html_dir = Path(html_dir) if html_dir else None
+        self.estado = estado
+        # url -> {"situacao", "http_status", "etag", "last_modified", "hash_conteudo"}
+        self.buscas: dict[str, dict] = {}
+        self.max_workers = max_workers
+        self.max_por_host = max_por_host
+        self.intervalo_host = intervalo_host
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.timeout = timeout
+        self._semaforo_llm = threading.BoundedSemaphore(max_llm)
+        self._hosts: dict[str, tuple[requests.Session, LimiteHost]] = {}
+        self._lock = threading.Lock()
+        self.estatisticas = {
+            "baixadas": 0,
+            "falhas_download": 0,
+            "falhas_processamento": 0,
+            "nao_modificadas": 0,
+            "retentativas": 0,
+            "descartadas": 0,
+            "extraidas_localmente": 0,
+            "chamadas_llm": 0,
+            "erros_llm": 0,
+        }
+
+    def _contar(self, chave: str, n: int = 1):
+        with self._lock:
+            self.estatisticas[chave] += n
+
+    def _host(self, url: str) -> tuple[requests.Session, LimiteHost]:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                sessao = requests.Session()
+                sessao.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_por_host, max_retries=0)
+                sessao.mount("http://", adapter)
+                sessao.mount("https://", adapter)
+                self._hosts[host] = (sessao, LimiteHost(self.max_por_host, self.intervalo_host))
+            return self._hosts[host]
+
+    def _espera(self, tentativa: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** tentativa) * (0.5 + random.random())
+
+    def baixar(self, url: str) -> str | None:
+        """Baixa ``url`` com retentativas; retorna o HTML ou ``None`` em caso de falha."""
+        response = self.requisitar(url)
+        return response.text if response is not None and response.status_code != 304 else None
+
+    def requisitar(self, url: str, cabecalhos: dict | None = None) -> requests.Response | None:
+        """
+        Faz o GET de ``url`` com retentativas.
+
+        Returns:
+            requests.Response | None: A resposta (``200`` ou ``304``, se
+            ``cabecalhos`` tiver validadores), ou ``None`` em caso de falha.
+        """
+        sessao, limite = self._host(url)
+        for tentativa in range(self.tentativas):
+            response = None
+            try:
+                with limite.reservar():
+                    response = sessao.get(url, headers=cabecalhos, timeout=self.timeout)
+                if response.status_code == 304:
+                    return response
+                if response.status_code not in STATUS_RETENTAVEIS:
+                    response.raise_for_status()
+                    self._contar("baixadas")
+                    return response
+                erro = f"HTTP {response.status_code}"
+            except requests.HTTPError as e:
+                logging.error(f"Erro ao baixar {url}: {e}")
+                break
+            except requests.RequestException as e:
+                erro = str(e)
+
+            if tentativa + 1 < self.tentativas:
+                espera = self._espera(tentativa, response)
+                logging.warning(f"Falha ao baixar {url} ({erro}); nova tentativa em {espera:.1f}s")
+                self._contar("retentativas")
+                time.sleep(espera)
+            else:
+                logging.error(f"Erro ao baixar {url}: {erro}")
+
+        self._contar("falhas_download")
+        return None
+
+    def _registrar_busca(self, url: str, situacao: str, response=None, hash_atual: str | None = None):
+        busca = {"situacao": situacao, "hash_conteudo": hash_atual}
+        if response is not None:
+            busca["http_status"] = response.status_code
+            busca["etag"] = response.headers.get("ETag")
+            busca["last_modified"] = response.headers.get("Last-Modified")
+        with self._lock:
+            self.buscas[url] = busca
+
+    def processar(self, url: str) -> dict | None:
+        """
+        Baixa, prepara e extrai uma única URL.
+
+        Qualquer erro fica restrito à URL: é registrado como ``falha`` em
+        :attr:`buscas` e o resultado é ``None``, sem interromper a coleta.
+        """
+        try:
+            return self._processar(url)
+        except Exception as e:
+            logging.error(f"Erro ao processar {url}: {e}")
+            self._contar("falhas_processamento")
+            self._registrar_busca(url, "falha")
+            return None
+
+    def _processar(self, url: str) -> dict | None:
+        logging.info(f"Processando: {url}")
+        cabecalhos = self.estado.cabecalhos_condicionais(url) if self.estado is not None else None
+        response = self.requisitar(url, cabecalhos)
+        if response is None:
+            self._registrar_busca(url, "falha")
+            return None
+        if response.status_code == 304:
+            logging.info(f"Não modificada (304): {url}")
+            self._contar("nao_modificadas")
+            self._registrar_busca(url, "inalterada", response)
+            if self.estado is not None:
+                self.estado.tocar(url, 304)
+            return None
+
+        html = response.text
+        if self.html_dir is not None:
+            self._salvar_html(url, html)
+
+        # o hash é do texto limpo, para que mudanças só de scripts/estilos não contem
+        texto = self.preparar(html)
+        hash_atual = hash_conteudo(texto if texto is not None else html)
+        if self.estado is not None and self.estado.conteudo_inalterado(url, hash_atual):
+            logging.info(f"Conteúdo inalterado: {url}")
+            self._contar("nao_modificadas")
+            self._registrar_busca(url, "inalterada", response, hash_atual)
+            self.estado.tocar(url, response.status_code)
+            return None
+        self._registrar_busca(url, "baixada", response, hash_atual)
+
+        if self.extrair_local is not None:
+            try:
+                resultado = self.extrair_local(html)
+            except Exception as e:
+                logging.warning(f"Extração local falhou em {url}: {e}")
+                resultado = None
+            if resultado is not None:
+                self._contar("extraidas_localmente")
+                return resultado
+
+        if texto is None:
+            self._contar("descartadas")
+            return None
+
+        with self._semaforo_llm:
+            self._contar("chamadas_llm")
+            try:
+                resultado = self.extrair(texto)
+            except Exception as e:
+                # erro do LLM, não veredito sobre a página: fica como falha e é tentada de novo
+                logging.error(f"Erro ao extrair {url}: {e}")
+                self._contar("erros_llm")
+                self._registrar_busca(url, "falha", response, hash_atual)
+                return None
+
+        if resultado is None:
+            self._contar("descartadas")
+        return resultado
+
+    def _salvar_html(self, url: str, html: str):
+        salvar_html(self.html_dir, url, html)
+
+    def relatorio(self) -> dict:
+        """
+        Resume a coleta, incluindo quantas chamadas ao LLM a extração local evitou.
+
+        Returns:
+            dict: Estatísticas brutas (``chamadas_llm`` inclui as que falharam,
+            contadas também em ``erros_llm``) mais ``llm_evitadas`` e
+            ``llm_evitadas_pct`` (em relação às páginas que chegaram à etapa de extração).
+        """
+        with self._lock:
+            est = dict(self.estatisticas)
+        candidatas = est["extraidas_localmente"] + est["chamadas_llm"]
+        est["llm_evitadas"] = est["extraidas_localmente"]
+        est["llm_evitadas_pct"] = round(100 * est["extraidas_localmente"] / candidatas, 1) if candidatas else 0.0
+        return est
+
+    def coletar(self, urls: list[str]) -> list[dict | None]:
+        """Processa ``urls`` em paralelo; os resultados seguem a ordem de entrada."""
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="coletor") as pool:
+            return list(pool.map(self.processar, urls))
+
+    def fechar(self):
+        """Fecha as sessões HTTP abertas."""
+        with self._lock:
+            for sessao, _ in self._hosts.values():
+                sessao.close()
+            self._hosts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
@@ -4,33 +4,53 @@ import hashlib
 import logging
 from datetime import datetime
 from pathlib import Path
-import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from tavily import TavilyClient
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from chatbot import ann, bm25, filtros, index_store, metricas
+from chatbot.embeddings import criar_embeddings
+from chatbot.knowledge.chunking import dividir_artigos
+from chatbot.knowledge.duplicatas import IndiceDuplicatas, IMPRESSOES_PATH, DEDUP_LIMIAR
+from crawler.coletor import ColetorConcorrente
+from crawler import estado as estado_coleta
+from crawler.extracao import extrair_conteudo_principal
+from data import camadas
+
 # ========================
 # Configurações iniciais
 # ========================
 BASE_DIR = Path(__file__).resolve().parent.parent
 FAISS_DATA_PATH = BASE_DIR / "FAISS"
 BRONZE_DATA_PATH = BASE_DIR / "data" / "bronze"
-PROCESSED_URLS_LOG = BRONZE_DATA_PATH / "processed_urls.log"
+PROCESSED_URLS_LOG = BRONZE_DATA_PATH / "processed_urls.log"  # legado, migrado para ESTADO_PATH
+ESTADO_PATH = BASE_DIR / "data" / "crawler_estado.sqlite3"
 
 FAISS_DATA_PATH.mkdir(parents=True, exist_ok=True)
 BRONZE_DATA_PATH.mkdir(parents=True, exist_ok=True)
 
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+embeddings = criar_embeddings()
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Limites do coletor concorrente (ver crawler.coletor)
+CRAWLER_MAX_WORKERS = int(os.getenv("CRAWLER_MAX_WORKERS", "8"))
+CRAWLER_MAX_POR_HOST = int(os.getenv("CRAWLER_MAX_POR_HOST", "2"))
+CRAWLER_INTERVALO_HOST = float(os.getenv("CRAWLER_INTERVALO_HOST", "0.5"))
+CRAWLER_MAX_LLM = int(os.getenv("CRAWLER_MAX_LLM", "3"))
+CRAWLER_TENTATIVAS = int(os.getenv("CRAWLER_TENTATIVAS", "3"))
+CRAWLER_BACKOFF = float(os.getenv("CRAWLER_BACKOFF", "1.0"))
+# Extração heurística antes do LLM (ver crawler.extracao) e cópia opcional do HTML bruto
+CRAWLER_EXTRACAO_LOCAL = os.getenv("CRAWLER_EXTRACAO_LOCAL", "1") == "1"
+CRAWLER_HTML_DIR = os.getenv("CRAWLER_HTML_DIR") or None
+# URLs já processadas são revisitadas (com GET condicional) após este intervalo; 0 desativa
+CRAWLER_REVISITAR_HORAS = float(os.getenv("CRAWLER_REVISITAR_HORAS", "24"))
+
 # ========================
 # APIs
 # ========================
@@ -63,54 +83,93 @@ ARTIGO EXTRAÍDO:"""
 rag_chain = prompt | llm | StrOutputParser()
 
 # ========================
-# Funções utilitárias
+# Métricas (expostas em /metrics/, ver chatbot.metricas)
 # ========================
-def carregar_urls_processadas() -> set[str]:
-    if not PROCESSED_URLS_LOG.exists():
-        return set()
-    return set(PROCESSED_URLS_LOG.read_text().splitlines())
-
-def salvar_url_processada(url: str, test_mode: bool):
-    if test_mode:
-        logging.info(f"[TEST_MODE] URL processada (não salva): {url}")
-        return
-    with open(PROCESSED_URLS_LOG, "a") as f:
-        f.write(f"{url}\n")
-
-def extrair_conteudo_com_ia(url: str, session: requests.Session) -> dict | None:
-    logging.info(f"Processando: {url}")
-    headers = {"User-Agent": "Mozilla/5.0"}
-
-    try:
-        response = session.get(url, headers=headers, timeout=20)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        for tag in soup(["script", "style", "nav", "header", "footer"]):
-            tag.decompose()
-
-        html_pre_limpo = soup.get_text(separator="\n", strip=True)
-
-        if len(html_pre_limpo) < 500:
-            logging.warning("Descartado: texto muito curto.")
-            return None
-
-        texto_extraido = rag_chain.invoke({"conteudo": html_pre_limpo[:15000]})
+PAGINAS = metricas.contador(
+    "pqr_crawler_paginas_total",
+    "Páginas tratadas pelo crawler por situação (baixada, inalterada, falha, descartada, duplicata, indexada)",
+    rotulos=("situacao",),
+)
+EXTRACOES = metricas.contador("pqr_crawler_extracoes_total", "Artigos extraídos por método", rotulos=("metodo",))
+RETENTATIVAS = metricas.contador("pqr_crawler_retentativas_total", "Novas tentativas de download")
+LLM_CHAMADAS = metricas.contador("pqr_llm_chamadas_total", "Chamadas ao LLM", rotulos=("origem", "resultado"))
 
-        if "NAO_EH_ARTIGO" in texto_extraido or len(texto_extraido) < 250:
-            logging.info("Veredito: não é artigo válido.")
-            return None
+# ========================
+# Funções utilitárias
+# ========================
+def abrir_estado() -> estado_coleta.EstadoColeta:
+    """Abre o estado do crawler, migrando o ``processed_urls.log`` antigo se ele existir."""
+    return estado_coleta.EstadoColeta(ESTADO_PATH, log_legado=PROCESSED_URLS_LOG)
+
+def registrar_urls(estado: estado_coleta.EstadoColeta, situacoes: dict[str, str], buscas: dict[str, dict], test_mode: bool,
+                   revisitadas: set[str] = frozenset()):
+    """
+    Grava no estado o status final de cada URL, com os validadores HTTP da busca.
+
+    Uma URL revisitada que não foi reindexada mantém o status, o hash e os
+    validadores da versão que está no índice (só o horário da busca muda),
+    para que a próxima revisita não a tome por inalterada.
+    """
+    for url, status in situacoes.items():
+        if test_mode:
+            logging.info(f"[TEST_MODE] URL {status} (não salva): {url}")
+            continue
+        if url in revisitadas and status != estado_coleta.INDEXADO:
+            estado.tocar(url)
+            continue
+        busca = buscas.get(url, {})
+        estado.registrar(
+            url,
+            status,
+            hash_conteudo=busca.get("hash_conteudo"),
+            etag=busca.get("etag"),
+            last_modified=busca.get("last_modified"),
+            http_status=busca.get("http_status"),
+        )
+
+def preparar_texto(html: str) -> str | None:
+    """Remove scripts, menus e rodapés do HTML; retorna ``None`` se sobrar texto demais curto."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "nav", "header", "footer"]):
+        tag.decompose()
+
+    html_pre_limpo = soup.get_text(separator="\n", strip=True)
+
+    if len(html_pre_limpo) < 500:
+        logging.warning("Descartado: texto muito curto.")
+        return None
+    return html_pre_limpo[:15000]
 
-        return {"texto": texto_extraido}
+def extrair_artigo_com_llm(texto: str) -> dict | None:
+    """Pede ao LLM o texto limpo do artigo principal; ``None`` se não for artigo."""
+    texto_extraido = rag_chain.invoke({"conteudo": texto})
 
-    except Exception as e:
-        logging.error(f"Erro ao processar {url}: {e}")
+    if "NAO_EH_ARTIGO" in texto_extraido or len(texto_extraido) < 250:
+        logging.info("Veredito: não é artigo válido.")
         return None
 
-def salvar_artigo_em_json(artigo: dict, test_mode: bool):
+    return {"texto": texto_extraido}
+
+def criar_coletor(estado: estado_coleta.EstadoColeta | None = None) -> ColetorConcorrente:
+    """Cria o motor de coleta concorrente com os limites configurados no ambiente."""
+    return ColetorConcorrente(
+        preparar=preparar_texto,
+        extrair=extrair_artigo_com_llm,
+        extrair_local=extrair_conteudo_principal if CRAWLER_EXTRACAO_LOCAL else None,
+        html_dir=CRAWLER_HTML_DIR,
+        estado=estado,
+        max_workers=CRAWLER_MAX_WORKERS,
+        max_por_host=CRAWLER_MAX_POR_HOST,
+        intervalo_host=CRAWLER_INTERVALO_HOST,
+        max_llm=CRAWLER_MAX_LLM,
+        tentativas=CRAWLER_TENTATIVAS,
+        backoff=CRAWLER_BACKOFF,
+    )
+
+def salvar_artigo_em_json(artigo: dict, test_mode: bool) -> str | None:
     if test_mode:
         logging.info(f"[TEST_MODE] Artigo coletado (não salvo em disco): {artigo['titulo']}")
-        return
+        return None
 
     url_hash = hashlib.md5(artigo["link"].encode()).hexdigest()[:10]
     timestamp = datetime.now().strftime("%Y-%m-%d")
@@ -120,54 +179,218 @@ def salvar_artigo_em_json(artigo: dict, test_mode: bool):
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(artigo, f, ensure_ascii=False, indent=4)
     logging.info(f"Artigo salvo em: {filepath}")
-
-def atualizar_faiss(artigo: dict, test_mode: bool):
-    if test_mode:
-        logging.info("[TEST_MODE] FAISS não atualizado.")
-        return
-
-    texto = f"{artigo['titulo']} - {artigo['texto']}"
-    if (FAISS_DATA_PATH / "index.faiss").exists():
-        vs = FAISS.load_local(str(FAISS_DATA_PATH), embeddings, allow_dangerous_deserialization=True)
-        vs.add_texts([texto])
-        logging.info("🔄 Índice FAISS atualizado")
-    else:
-        vs = FAISS.from_texts([texto], embedding=embeddings)
-        logging.info("🆕 Índice FAISS criado")
-    vs.save_local(str(FAISS_DATA_PATH))
-
-def executar_coleta(query: str, test_mode: bool = False):
+    return filename
+
+class IngestorFAISS:
+    """
+    Acumula os artigos de uma coleta e os publica no índice FAISS de uma vez.
+
+    Cada artigo é dividido em trechos com metadados (ver
+    :mod:`chatbot.knowledge.chunking`, o mesmo usado por ``build_faiss.py``).
+    Os trechos são vetorizados em um único lote, anexados à versão atual do
+    índice (ou a um novo, se ainda não houver), acrescentados ao índice BM25
+    da mesma versão (ver :mod:`chatbot.bm25`) e o resultado é publicado como
+    uma nova versão em :func:`publicar` (ver :mod:`chatbot.index_store`),
+    sob o lock de escrita do índice.
+
+    Artigos adicionados com ``substituir=True`` (páginas revisitadas que
+    mudaram) tiram do índice os trechos anteriores do mesmo ``link`` (ver
+    :func:`chatbot.filtros.marcar_removidos`), como o gold, que guarda só a
+    versão mais recente de cada link.
+
+    Args:
+        faiss_path (Path): Diretório do índice FAISS.
+        test_mode (bool): Se verdadeiro, nada é gravado em disco.
+    """
+
+    def __init__(self, faiss_path: Path = FAISS_DATA_PATH, test_mode: bool = False):
+        self.faiss_path = Path(faiss_path)
+        self.test_mode = test_mode
+        self.textos: list[str] = []
+        self.metadados: list[dict] = []
+        self.substituir: set[str] = set()
+
+    def adicionar(self, artigo: dict, substituir: bool = False):
+        textos, metadados = dividir_artigos([artigo])
+        self.textos.extend(textos)
+        self.metadados.extend(metadados)
+        if substituir:
+            self.substituir.add(artigo["link"])
+
+    def publicar(self) -> int:
+        """Vetoriza os trechos pendentes, atualiza o índice e retorna quantos foram indexados."""
+        total = len(self.textos)
+        if total == 0:
+            return 0
+        if self.test_mode:
+            logging.info(f"[TEST_MODE] FAISS não atualizado ({total} trechos).")
+            self.textos, self.metadados, self.substituir = [], [], set()
+            return 0
+
+        vetores = embeddings.embed_documents(self.textos)
+        pares = list(zip(self.textos, vetores))
+
+        # a versão atual é lida sob o lock: outra escrita publicada no meio
+        # (build_faiss.py ou outra coleta) não é sobrescrita
+        with index_store.bloqueio_escrita(self.faiss_path):
+            atual = index_store.current_path(self.faiss_path)
+            if atual is not None:
+                vs = index_store.load_for_update(atual, embeddings)
+                lexico = bm25.abrir(atual)
+                if lexico is None or lexico.total != vs.index.ntotal:
+                    # versão anterior ao BM25: indexa os trechos existentes uma vez
+                    lexico = bm25.construir(vs)
+                removidos = filtros.marcar_removidos(vs.docstore, vs.index_to_docstore_id, self.substituir)
+                vs.add_embeddings(pares, metadatas=self.metadados)
+                logging.info(f"🔄 Índice FAISS atualizado (+{total}, {removidos} trechos substituídos)")
+            else:
+                vs = ann.criar_vector_store(pares, embeddings, self.metadados)
+                lexico = bm25.IndiceBM25()
+                logging.info(f"🆕 Índice FAISS criado ({total})")
+            lexico.adicionar(self.textos)
+
+            index_store.publish(vs, self.faiss_path, bm25=lexico)
+        self.textos, self.metadados, self.substituir = [], [], set()
+        return total
+
+def registrar_metricas(relatorio: dict, artigos: int, duplicadas: int):
+    """Soma o resultado de uma coleta aos contadores do crawler."""
+    for situacao, chave in (("baixada", "baixadas"), ("inalterada", "nao_modificadas"),
+                            ("falha", "falhas_download"), ("falha", "falhas_processamento"),
+                            ("falha", "erros_llm"), ("descartada", "descartadas")):
+        PAGINAS.inc(relatorio.get(chave, 0), situacao=situacao)
+    PAGINAS.inc(duplicadas, situacao="duplicata")
+    PAGINAS.inc(artigos, situacao="indexada")
+    EXTRACOES.inc(relatorio.get("extraidas_localmente", 0), metodo="local")
+    erros_llm = relatorio.get("erros_llm", 0)
+    EXTRACOES.inc(relatorio.get("chamadas_llm", 0) - erros_llm, metodo="llm")
+    RETENTATIVAS.inc(relatorio.get("retentativas", 0))
+    LLM_CHAMADAS.inc(relatorio.get("chamadas_llm", 0) - erros_llm, origem="crawler", resultado="ok")
+    LLM_CHAMADAS.inc(erros_llm, origem="crawler", resultado="erro")
+
+def executar_coleta(query: str, test_mode: bool = False, progresso=None):
+    """
+    Busca notícias no Tavily, coleta e extrai as páginas, descarta duplicatas
+    e publica os artigos novos no índice FAISS (nada é gravado em ``test_mode``).
+
+    A duração de cada etapa vai para as métricas e para o log ``chatbot.metricas``.
+
+    Args:
+        progresso: Função opcional ``progresso(etapa, fracao)`` chamada no início
+            de cada etapa (usada pelo worker da fila, ver :mod:`crawler.fila`).
+    """
+    with metricas.requisicao("coleta", teste=test_mode):
+        return _executar_coleta(query, test_mode, progresso or (lambda etapa, fracao: None))
+
+def _executar_coleta(query: str, test_mode: bool, progresso):
     logging.info(f"Iniciando coleta. Modo teste = {test_mode}")
+    progresso("busca", 0.0)
     try:
-        response_tavily = tavily.search(query=query, search_depth="advanced", max_results=5)
+        with metricas.etapa("tavily"):
+            response_tavily = tavily.search(query=query, search_depth="advanced", max_results=5)
         urls_tavily = response_tavily.get("results", [])
     except Exception as e:
         logging.error(f"Erro Tavily: {e}")
         return []
 
-    urls_processadas = carregar_urls_processadas()
+    estado = abrir_estado()
+    revisitar_apos = 3600 * CRAWLER_REVISITAR_HORAS if CRAWLER_REVISITAR_HORAS > 0 else None
     artigos = []
-
-    with requests.Session() as session:
-        for item in urls_tavily:
-            url = item.get("url")
-            if not url or url in urls_processadas:
-                continue
-
-            resultado_ia = extrair_conteudo_com_ia(url, session)
-            if resultado_ia:
-                artigo = {
-                    "fonte": item.get("source", url.split("/")[2]),
-                    "titulo": item.get("title", "Sem título"),
-                    "link": url,
-                    "texto": resultado_ia["texto"],
-                    "data_coleta": datetime.now().isoformat(),
-                    "query_origem": query,
-                }
-                artigos.append(artigo)
-                salvar_artigo_em_json(artigo, test_mode)
-                atualizar_faiss(artigo, test_mode)
-                salvar_url_processada(url, test_mode)
-
+    arquivos_bronze = []
+    ingestor = IngestorFAISS(test_mode=test_mode)
+
+    itens, vistas, revisitadas = [], set(), set()
+    for item in urls_tavily:
+        url = item.get("url")
+        if not url or estado_coleta.normalizar_url(url) in vistas:
+            continue
+        if not estado.deve_coletar(url, revisitar_apos):
+            continue
+        vistas.add(estado_coleta.normalizar_url(url))
+        if estado.obter(url) is not None:
+            revisitadas.add(url)
+        itens.append(item)
+
+    progresso("download", 0.1)
+    with metricas.etapa("coleta"), criar_coletor(estado) as coletor:
+        resultados = coletor.coletar([item["url"] for item in itens])
+        relatorio = coletor.relatorio()
+        buscas = dict(coletor.buscas)
+    logging.info(
+        f"Extração: {relatorio['extraidas_localmente']} páginas resolvidas localmente, "
+        f"{relatorio['chamadas_llm']} chamadas ao LLM ({relatorio['llm_evitadas_pct']}% evitadas, "
+        f"{relatorio['erros_llm']} com erro), "
+        f"{relatorio['nao_modificadas']} inalteradas desde a última coleta"
+    )
+
+    progresso("deduplicacao", 0.6)
+    dedup = IndiceDuplicatas(IMPRESSOES_PATH, limiar=DEDUP_LIMIAR)
+    duplicadas = []
+    situacoes = {}
+    for item, resultado_ia in zip(itens, resultados):
+        url = item["url"]
+        situacao = buscas.get(url, {}).get("situacao")
+        if not resultado_ia:
+            if situacao == "baixada":
+                situacoes[url] = estado_coleta.DESCARTADO
+            elif situacao == "falha":
+                situacoes[url] = estado_coleta.FALHA
+            continue
+
+        titulo = item.get("title", "Sem título")
+        revisita = url in revisitadas
+        if test_mode or revisita:
+            original, _ = dedup.buscar(resultado_ia["texto"])
+        else:
+            original = dedup.verificar_e_adicionar(url, resultado_ia["texto"], titulo)
+        if revisita and original is not None and (
+            estado_coleta.normalizar_url(original) == estado_coleta.normalizar_url(url)
+        ):
+            # a própria página, com mudanças pequenas: o hash mudou, então ela é reindexada
+            original = None
+        if original is not None:
+            duplicadas.append(url)
+            situacoes[url] = estado_coleta.DUPLICATA
+            continue
+        if revisita and not test_mode:
+            dedup.adicionar(url, resultado_ia["texto"], titulo)
+
+        artigo = {
+            "fonte": item.get("source", url.split("/")[2]),
+            "titulo": titulo,
+            "link": url,
+            "texto": resultado_ia["texto"],
+            "data_coleta": datetime.now().isoformat(),
+            "query_origem": query,
+        }
+        artigos.append(artigo)
+        situacoes[url] = estado_coleta.INDEXADO
+        arquivo = salvar_artigo_em_json(artigo, test_mode)
+        if arquivo:
+            arquivos_bronze.append(arquivo)
+        # a versão nova de uma página revisitada substitui a anterior no índice
+        ingestor.adicionar(artigo, substituir=revisita)
+
+    progresso("publicacao", 0.7)
+    # índice e silver sob o mesmo lock: um build_faiss.py que comece logo depois
+    # da publicação já encontra a coleta na silver
+    with index_store.bloqueio_escrita(ingestor.faiss_path):
+        with metricas.etapa("publicacao"):
+            ingestor.publicar()
+        if not test_mode and artigos:
+            # a silver recebe a coleta inteira em um único arquivo; o gold é
+            # recompactado no próximo build_faiss.py
+            with metricas.etapa("silver"):
+                camadas.anexar_silver(artigos, arquivos_bronze=arquivos_bronze)
+    # só marca as URLs depois que o índice foi publicado com sucesso
+    registrar_urls(estado, situacoes, buscas, test_mode, revisitadas)
+    estado.fechar()
+    if duplicadas:
+        logging.info(f"🧹 {len(duplicadas)} quase-duplicatas ignoradas: {dedup.relatorio()['clusters']}")
+    dedup.fechar()
+
+    registrar_metricas(relatorio, len(artigos), len(duplicadas))
+    metricas.anotar(urls=len(itens), artigos=len(artigos), duplicadas=len(duplicadas),
+                    chamadas_llm=relatorio["chamadas_llm"], erros_llm=relatorio["erros_llm"])
     logging.info(f"✅ Coleta finalizada: {len(artigos)} artigos.")
     return artigos
@@ -0,0 +1,199 @@
+"""
+Estado persistente do crawler.
+
+Substitui o ``processed_urls.log`` por um SQLite com uma linha por URL
+normalizada (ver :func:`normalizar_url`), guardando o status do último
+processamento, o hash do conteúdo, os validadores HTTP (``ETag`` e
+``Last-Modified``) e o horário da última busca. As consultas são feitas pela
+chave primária, sem carregar o histórico inteiro em memória.
+
+Os validadores permitem GETs condicionais: quando uma URL já processada é
+revisitada, o servidor pode responder ``304 Not Modified`` e a página é pulada
+sem download; se ele não suportar validadores, o hash do conteúdo evita repetir
+a extração (e a chamada ao LLM) de páginas que não mudaram.
+
+Na primeira abertura, as URLs de um ``processed_urls.log`` existente são
+importadas e o arquivo é renomeado para ``processed_urls.log.migrado``.
+"""
+
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+INDEXADO = "indexado"
+DUPLICATA = "duplicata"
+DESCARTADO = "descartado"
+FALHA = "falha"
+# status de URLs que não precisam ser coletadas de novo até a próxima revisita
+FINALIZADOS = (INDEXADO, DUPLICATA, DESCARTADO)
+
+PARAMETROS_RASTREIO = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "cmpid", "_ga", "_gl", "amp", "outputtype",
+}
+_PORTAS_PADRAO = {"http": 80, "https": 443}
+
+
+def normalizar_url(url: str) -> str:
+    """
+    Forma canônica de ``url`` para deduplicação.
+
+    Coloca esquema e host em minúsculas, remove a porta padrão, o fragmento,
+    parâmetros de rastreamento (``utm_*``, ``fbclid``, ``gclid``...) e a barra
+    final do caminho, e ordena os parâmetros restantes.
+    """
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or "").lower()
+    if partes.port and partes.port != _PORTAS_PADRAO.get(esquema):
+        host = f"{host}:{partes.port}"
+    caminho = partes.path.rstrip("/") or "/"
+    parametros = sorted(
+        (k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in PARAMETROS_RASTREIO
+    )
+    return urlunsplit((esquema, host, caminho, urlencode(parametros), ""))
+
+
+def hash_conteudo(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class EstadoColeta:
+    """
+    Tabela de URLs já vistas pelo crawler.
+
+    Args:
+        caminho: Arquivo SQLite (``":memory:"`` para uso temporário).
+        log_legado: ``processed_urls.log`` a importar, se existir.
+    """
+
+    def __init__(self, caminho, log_legado=None):
+        if caminho != ":memory:":
+            Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(caminho), check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    url_original TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    hash_conteudo TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    http_status INTEGER,
+                    ultima_busca REAL NOT NULL
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_urls_hash ON urls (hash_conteudo)")
+        if log_legado is not None:
+            self.migrar_log(log_legado)
+
+    def migrar_log(self, caminho) -> int:
+        """
+        Importa as URLs de um ``processed_urls.log`` como já indexadas.
+
+        O arquivo é renomeado para ``<nome>.migrado`` para que a importação
+        aconteça uma única vez.
+
+        Returns:
+            int: Número de URLs importadas.
+        """
+        caminho = Path(caminho)
+        if not caminho.exists():
+            return 0
+        urls = [u.strip() for u in caminho.read_text(encoding="utf-8").splitlines() if u.strip()]
+        agora = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO urls (url, url_original, status, ultima_busca) VALUES (?, ?, ?, ?)",
+                [(normalizar_url(u), u, INDEXADO, agora) for u in urls],
+            )
+        caminho.rename(caminho.with_name(caminho.name + ".migrado"))
+        logging.info(f"{len(urls)} URLs migradas de {caminho} para o estado do crawler")
+        return len(urls)
+
+    def obter(self, url: str) -> dict | None:
+        """Linha da URL (normalizada) ou ``None`` se ela nunca foi vista."""
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM urls WHERE url = ?", (normalizar_url(url),))
+            linha = cursor.fetchone()
+            if linha is None:
+                return None
+            return dict(zip([c[0] for c in cursor.description], linha))
+
+    def deve_coletar(self, url: str, revisitar_apos: float | None = None) -> bool:
+        """
+        Verdadeiro se ``url`` nunca foi finalizada ou se já passou da hora de revisitá-la.
+
+        Args:
+            revisitar_apos (float | None): Segundos após a última busca a partir
+                dos quais uma URL finalizada é revisitada (``None`` = nunca).
+        """
+        linha = self.obter(url)
+        if linha is None or linha["status"] not in FINALIZADOS:
+            return True
+        return revisitar_apos is not None and time.time() - linha["ultima_busca"] >= revisitar_apos
+
+    def cabecalhos_condicionais(self, url: str) -> dict:
+        """Cabeçalhos ``If-None-Match``/``If-Modified-Since`` de uma URL já finalizada."""
+        linha = self.obter(url)
+        if linha is None or linha["status"] not in FINALIZADOS:
+            return {}
+        cabecalhos = {}
+        if linha["etag"]:
+            cabecalhos["If-None-Match"] = linha["etag"]
+        if linha["last_modified"]:
+            cabecalhos["If-Modified-Since"] = linha["last_modified"]
+        return cabecalhos
+
+    def conteudo_inalterado(self, url: str, hash_atual: str) -> bool:
+        """Verdadeiro se a URL já foi finalizada com exatamente este conteúdo."""
+        linha = self.obter(url)
+        return linha is not None and linha["status"] in FINALIZADOS and linha["hash_conteudo"] == hash_atual
+
+    def registrar(self, url: str, status: str, hash_conteudo: str | None = None, etag: str | None = None,
+                  last_modified: str | None = None, http_status: int | None = None):
+        """
+        Grava o resultado do processamento de ``url``.
+
+        Campos ``None`` preservam o valor anterior, de modo que uma revisita sem
+        validadores não apaga os que já estavam guardados.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                """INSERT INTO urls (url, url_original, status, hash_conteudo, etag, last_modified,
+                                     http_status, ultima_busca)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (url) DO UPDATE SET
+                       url_original = excluded.url_original,
+                       status = excluded.status,
+                       hash_conteudo = COALESCE(excluded.hash_conteudo, hash_conteudo),
+                       etag = COALESCE(excluded.etag, etag),
+                       last_modified = COALESCE(excluded.last_modified, last_modified),
+                       http_status = COALESCE(excluded.http_status, http_status),
+                       ultima_busca = excluded.ultima_busca""",
+                (normalizar_url(url), url, status, hash_conteudo, etag, last_modified, http_status, time.time()),
+            )
+
+    def tocar(self, url: str, http_status: int | None = None):
+        """Atualiza só o horário da última busca (página revisitada inalterada ou não reindexada)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE urls SET ultima_busca = ?, http_status = COALESCE(?, http_status) WHERE url = ?",
+                (time.time(), http_status, normalizar_url(url)),
+            )
+
+    def contagem(self) -> dict:
+        """Número de URLs por status."""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall())
+
+    def fechar(self):
+        self._db.close()
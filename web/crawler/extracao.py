@@ -0,0 +1,138 @@
+"""
+Extração heurística do conteúdo principal de uma página.
+
+Antes de enviar uma página ao LLM, o crawler tenta localizar o artigo no
+próprio DOM, no estilo do Readability: cada parágrafo pontua o bloco que o
+contém (e, com peso menor, o avô) de acordo com a densidade de texto, e a
+pontuação do bloco é penalizada pela densidade de links. Quando o melhor bloco
+é claramente dominante, o texto é devolvido direto; caso contrário a página
+segue para o LLM.
+"""
+
+import re
+
+from bs4 import BeautifulSoup
+
+TAGS_REMOVIDAS = ["script", "style", "nav", "header", "footer", "aside", "form", "noscript", "iframe", "svg"]
+TAGS_TEXTO = ["p", "h1", "h2", "h3", "li", "blockquote"]
+PADRAO_BOILERPLATE = re.compile(
+    r"comment|coment|menu|sidebar|footer|rodape|banner|share|compartilh|social|publicidade|ads?\b|related|relacionad|newsletter|cookie",
+    re.IGNORECASE,
+)
+
+MIN_CARACTERES = 800
+MIN_PARAGRAFOS = 3
+MAX_DENSIDADE_LINKS = 0.25
+MIN_PARTICIPACAO = 0.5
+MIN_DOMINANCIA = 1.5
+
+
+def _texto(el) -> str:
+    return " ".join(el.get_text(" ", strip=True).split())
+
+
+def densidade_links(el) -> float:
+    """Fração do texto de ``el`` que está dentro de links."""
+    total = len(_texto(el))
+    if total == 0:
+        return 1.0
+    em_links = sum(len(_texto(a)) for a in el.find_all("a"))
+    return min(em_links / total, 1.0)
+
+
+def _peso_classe(el) -> float:
+    atributos = " ".join(el.get("class", [])) + " " + (el.get("id") or "")
+    if el.name in ("article", "main"):
+        return 1.5
+    if PADRAO_BOILERPLATE.search(atributos):
+        return 0.3
+    return 1.0
+
+
+def pontuar_blocos(soup) -> list:
+    """
+    Pontua os blocos que contêm parágrafos.
+
+    Returns:
+        list[tuple]: Pares ``(elemento, pontuação)`` em ordem decrescente, com a
+        pontuação já ponderada pela densidade de links e pelo peso de classe/id.
+    """
+    # indexado por id(): Tags do BeautifulSoup comparam por conteúdo, não por identidade
+    pontos = {}
+
+    def somar(el, valor):
+        pontos.setdefault(id(el), [el, 0.0])[1] += valor
+
+    for p in soup.find_all("p"):
+        texto = _texto(p)
+        if len(texto) < 25:
+            continue
+        valor = 1 + texto.count(",") + min(len(texto) / 100, 3)
+        pai = p.parent
+        avo = pai.parent if pai is not None else None
+        if pai is not None:
+            somar(pai, valor)
+        if avo is not None and avo.name not in ("[document]", "html"):
+            somar(avo, valor / 2)
+
+    ranking = [
+        (el, valor * (1 - densidade_links(el)) * _peso_classe(el))
+        for el, valor in pontos.values()
+    ]
+    return sorted(ranking, key=lambda item: item[1], reverse=True)
+
+
+def extrair_conteudo_principal(html: str) -> dict | None:
+    """
+    Tenta extrair o artigo principal de ``html`` sem usar o LLM.
+
+    Args:
+        html (str): HTML bruto da página.
+
+    Returns:
+        dict | None: ``{"texto": ..., "confianca": ...}`` se a heurística estiver
+        confiante; ``None`` se a página deve seguir para o LLM.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(TAGS_REMOVIDAS):
+        tag.decompose()
+
+    ranking = pontuar_blocos(soup)
+    if not ranking:
+        return None
+
+    melhor, pontuacao = ranking[0]
+    # o segundo colocado relevante é o melhor bloco que não contém nem está contido no primeiro
+    concorrentes = [
+        v for el, v in ranking[1:]
+        if not any(p is melhor for p in el.parents)
+        and not any(p is el for p in melhor.parents)
+    ]
+    dominancia = pontuacao / concorrentes[0] if concorrentes and concorrentes[0] > 0 else float("inf")
+
+    blocos = [_texto(el) for el in melhor.find_all(TAGS_TEXTO)]
+    blocos = [b for b in blocos if b]
+    paragrafos = [b for b in blocos if len(b) >= 25]
+    texto = "\n\n".join(dict.fromkeys(blocos))
+
+    titulo = soup.find("h1")
+    if titulo is not None and not any(p is melhor for p in titulo.parents):
+        texto_titulo = _texto(titulo)
+        if texto_titulo:
+            texto = f"{texto_titulo}\n\n{texto}"
+
+    total_pagina = len(_texto(soup.body or soup))
+    participacao = len(texto) / total_pagina if total_pagina else 0.0
+
+    confiante = (
+        len(texto) >= MIN_CARACTERES
+        and len(paragrafos) >= MIN_PARAGRAFOS
+        and densidade_links(melhor) <= MAX_DENSIDADE_LINKS
+        and participacao >= MIN_PARTICIPACAO
+        and dominancia >= MIN_DOMINANCIA
+    )
+    if not confiante:
+        return None
+
+    confianca = min(1.0, participacao * min(dominancia, 3) / 3)
+    return {"texto": texto, "confianca": round(confianca, 3)}
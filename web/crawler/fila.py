@@ -0,0 +1,458 @@
+"""
+Fila persistente de coletas e o worker que as executa.
+
+O ``/update_news/`` rodava :func:`crawler.crawler_exec.executar_coleta` dentro
+da requisição HTTP: a resposta demorava minutos, o worker do servidor ficava
+preso, e uma queda no meio perdia a coleta sem deixar rastro. Agora a view só
+registra uma tarefa nesta fila e responde ``202`` com o id; um processo
+separado executa as tarefas::
+
+    python -m crawler.fila              # worker contínuo (com as coletas agendadas)
+    python -m crawler.fila --uma-vez    # executa as tarefas pendentes e sai
+
+A fila é um SQLite em ``data/fila_coletas.sqlite3`` (WAL), compartilhado pelo
+processo web e pelo worker:
+
+* cada tarefa tem status (``pendente``, ``executando``, ``concluida``,
+  ``falhou``), etapa e fração de progresso, resultado e erro, consultados em
+  ``/update_news/<id>/``;
+* a reserva de uma tarefa é atômica (``BEGIN IMMEDIATE``), então vários
+  workers podem rodar ao mesmo tempo sem executar a mesma tarefa duas vezes;
+  as escritas no índice são serializadas pelo lock de
+  :func:`chatbot.index_store.bloqueio_escrita`;
+* o worker renova um *heartbeat* enquanto executa. Tarefas de um worker que
+  morreu voltam para a fila após ``FILA_TAREFA_TIMEOUT`` segundos (até
+  ``FILA_MAX_TENTATIVAS`` execuções);
+* pedir uma coleta igual a uma que ainda está pendente devolve a tarefa
+  existente, em vez de empilhar outra;
+* com ``COLETA_INTERVALO_HORAS`` > 0, o worker enfileira sozinho uma coleta
+  de ``COLETA_QUERY`` a cada intervalo. O horário da próxima fica no banco, de
+  modo que reiniciar o worker não antecipa nem repete a coleta.
+
+As métricas do crawler são contadas no processo do worker; com
+``--metricas-porta`` ele as expõe em ``http://<host>:<porta>/metrics``.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from chatbot import metricas
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FILA_PATH = BASE_DIR / "data" / "fila_coletas.sqlite3"
+
+QUERY_PADRAO = "notícias recentes sobre educação na Região Integrada de Desenvolvimento do Distrito Federal e Entorno (RIDE-DF)"
+COLETA_QUERY = os.getenv("COLETA_QUERY", QUERY_PADRAO)
+# coleta recorrente enfileirada pelo worker; 0 desativa
+COLETA_INTERVALO_HORAS = float(os.getenv("COLETA_INTERVALO_HORAS", "6"))
+FILA_INTERVALO = float(os.getenv("FILA_INTERVALO", "5"))
+FILA_TAREFA_TIMEOUT = float(os.getenv("FILA_TAREFA_TIMEOUT", "600"))
+FILA_MAX_TENTATIVAS = int(os.getenv("FILA_MAX_TENTATIVAS", "2"))
+# tarefas terminadas há mais que isso são apagadas
+FILA_RETER_DIAS = float(os.getenv("FILA_RETER_DIAS", "30"))
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+STATUS = (PENDENTE, EXECUTANDO, CONCLUIDA, FALHOU)
+
+AGENDAMENTO_PADRAO = "noticias"
+
+TAREFAS = metricas.contador(
+    "pqr_coleta_tarefas_total", "Tarefas de coleta por desfecho (concluida, falhou, reenfileirada)",
+    rotulos=("resultado",),
+)
+DURACAO = metricas.histograma(
+    "pqr_coleta_tarefa_segundos", "Duração das tarefas de coleta executadas pelo worker",
+    limites=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+
+
+class FilaColetas:
+    """
+    Tabela de tarefas de coleta e de agendamentos recorrentes.
+
+    Args:
+        caminho: Arquivo SQLite (``":memory:"`` para uso temporário).
+    """
+
+    def __init__(self, caminho=FILA_PATH):
+        if caminho != ":memory:":
+            Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit: as transações da reserva são abertas explicitamente
+        self._db = sqlite3.connect(str(caminho), check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS tarefas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query TEXT NOT NULL,
+                    teste INTEGER NOT NULL DEFAULT 0,
+                    origem TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    etapa TEXT,
+                    progresso REAL NOT NULL DEFAULT 0,
+                    resultado TEXT,
+                    erro TEXT,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    criada REAL NOT NULL,
+                    iniciada REAL,
+                    heartbeat REAL,
+                    concluida REAL
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_status ON tarefas (status, id)")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS agendamentos (
+                    nome TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    intervalo REAL NOT NULL,
+                    proxima REAL NOT NULL
+                )"""
+            )
+
+    @staticmethod
+    def _dict(linha) -> dict | None:
+        if linha is None:
+            return None
+        tarefa = dict(linha)
+        tarefa["teste"] = bool(tarefa["teste"])
+        tarefa["resultado"] = json.loads(tarefa["resultado"]) if tarefa["resultado"] else None
+        return tarefa
+
+    def enfileirar(self, query: str, test_mode: bool = False, origem: str = "api") -> tuple[dict, bool]:
+        """
+        Registra uma coleta, ou devolve a igual que ainda não começou.
+
+        Returns:
+            tuple[dict, bool]: A tarefa e se ela foi criada agora.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                existente = self._db.execute(
+                    "SELECT * FROM tarefas WHERE status = ? AND query = ? AND teste = ? ORDER BY id LIMIT 1",
+                    (PENDENTE, query, int(test_mode)),
+                ).fetchone()
+                if existente is None:
+                    cursor = self._db.execute(
+                        "INSERT INTO tarefas (query, teste, origem, status, criada) VALUES (?, ?, ?, ?, ?)",
+                        (query, int(test_mode), origem, PENDENTE, time.time()),
+                    )
+                    existente = self._db.execute("SELECT * FROM tarefas WHERE id = ?", (cursor.lastrowid,)).fetchone()
+                    criada = True
+                else:
+                    criada = False
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self._dict(existente), criada
+
+    def obter(self, tarefa_id: int) -> dict | None:
+        with self._lock:
+            return self._dict(self._db.execute("SELECT * FROM tarefas WHERE id = ?", (tarefa_id,)).fetchone())
+
+    def listar(self, limite: int = 20) -> list[dict]:
+        """Tarefas mais recentes primeiro."""
+        with self._lock:
+            linhas = self._db.execute("SELECT * FROM tarefas ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+        return [self._dict(linha) for linha in linhas]
+
+    def contagem(self) -> dict:
+        """Número de tarefas em cada status."""
+        with self._lock:
+            linhas = self._db.execute("SELECT status, COUNT(*) FROM tarefas GROUP BY status").fetchall()
+        return {status: 0 for status in STATUS} | {status: n for status, n in linhas}
+
+    def reservar(self, worker: str) -> dict | None:
+        """Passa a tarefa pendente mais antiga para ``executando`` em nome de ``worker``."""
+        agora = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._db.execute(
+                    "SELECT id FROM tarefas WHERE status = ? ORDER BY id LIMIT 1", (PENDENTE,)
+                ).fetchone()
+                if linha is not None:
+                    self._db.execute(
+                        """UPDATE tarefas SET status = ?, worker = ?, iniciada = ?, heartbeat = ?,
+                           tentativas = tentativas + 1, etapa = NULL, progresso = 0, erro = NULL
+                           WHERE id = ?""",
+                        (EXECUTANDO, worker, agora, agora, linha["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.obter(linha["id"]) if linha is not None else None
+
+    def progresso(self, tarefa_id: int, etapa: str | None = None, fracao: float | None = None):
+        """Atualiza etapa e progresso (o que for informado) e renova o heartbeat."""
+        with self._lock:
+            self._db.execute(
+                """UPDATE tarefas SET etapa = COALESCE(?, etapa), progresso = COALESCE(?, progresso), heartbeat = ?
+                   WHERE id = ? AND status = ?""",
+                (etapa, fracao, time.time(), tarefa_id, EXECUTANDO),
+            )
+
+    def concluir(self, tarefa_id: int, resultado: dict):
+        with self._lock:
+            self._db.execute(
+                "UPDATE tarefas SET status = ?, etapa = NULL, progresso = 1, resultado = ?, concluida = ? WHERE id = ?",
+                (CONCLUIDA, json.dumps(resultado, ensure_ascii=False), time.time(), tarefa_id),
+            )
+
+    def falhar(self, tarefa_id: int, erro: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE tarefas SET status = ?, erro = ?, concluida = ? WHERE id = ?",
+                (FALHOU, erro, time.time(), tarefa_id),
+            )
+
+    def recuperar(self, timeout: float = FILA_TAREFA_TIMEOUT, max_tentativas: int = FILA_MAX_TENTATIVAS) -> int:
+        """
+        Devolve à fila as tarefas cujo worker parou de dar sinal há ``timeout``
+        segundos; as que já tiveram ``max_tentativas`` execuções falham.
+
+        Returns:
+            int: Número de tarefas recuperadas.
+        """
+        limite = time.time() - timeout
+        with self._lock:
+            self._db.execute(
+                """UPDATE tarefas SET status = ?, erro = 'worker interrompido', concluida = ?
+                   WHERE status = ? AND heartbeat < ? AND tentativas >= ?""",
+                (FALHOU, time.time(), EXECUTANDO, limite, max_tentativas),
+            )
+            cursor = self._db.execute(
+                "UPDATE tarefas SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ?",
+                (PENDENTE, EXECUTANDO, limite),
+            )
+        if cursor.rowcount:
+            TAREFAS.inc(cursor.rowcount, resultado="reenfileirada")
+            logging.warning(f"{cursor.rowcount} tarefa(s) de coleta interrompida(s) voltaram para a fila")
+        return cursor.rowcount
+
+    def limpar(self, reter_dias: float = FILA_RETER_DIAS) -> int:
+        """Apaga as tarefas terminadas há mais de ``reter_dias`` dias."""
+        limite = time.time() - 86400 * reter_dias
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM tarefas WHERE status IN (?, ?) AND concluida < ?", (CONCLUIDA, FALHOU, limite)
+            )
+        return cursor.rowcount
+
+    def agendar(self, nome: str, query: str, intervalo: float):
+        """
+        Cria ou atualiza uma coleta recorrente a cada ``intervalo`` segundos.
+
+        Um agendamento novo dispara na primeira verificação; um existente
+        mantém o horário da próxima execução.
+        """
+        with self._lock:
+            self._db.execute(
+                """INSERT INTO agendamentos (nome, query, intervalo, proxima) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(nome) DO UPDATE SET query = excluded.query, intervalo = excluded.intervalo,
+                   proxima = MIN(proxima, ? + excluded.intervalo)""",
+                (nome, query, intervalo, time.time(), time.time()),
+            )
+
+    def desagendar(self, nome: str):
+        with self._lock:
+            self._db.execute("DELETE FROM agendamentos WHERE nome = ?", (nome,))
+
+    def disparar_agendadas(self) -> list[dict]:
+        """Enfileira as coletas recorrentes vencidas e avança o horário de cada uma."""
+        agora = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                vencidos = self._db.execute("SELECT * FROM agendamentos WHERE proxima <= ?", (agora,)).fetchall()
+                for agendamento in vencidos:
+                    # pula os intervalos perdidos (worker parado), sem enfileirar um por um
+                    atrasos = int((agora - agendamento["proxima"]) // agendamento["intervalo"]) + 1
+                    self._db.execute(
+                        "UPDATE agendamentos SET proxima = ? WHERE nome = ?",
+                        (agendamento["proxima"] + atrasos * agendamento["intervalo"], agendamento["nome"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        tarefas = []
+        for agendamento in vencidos:
+            tarefa, _ = self.enfileirar(agendamento["query"], origem=f"agendamento:{agendamento['nome']}")
+            tarefas.append(tarefa)
+        return tarefas
+
+    def agendamentos(self) -> list[dict]:
+        with self._lock:
+            return [dict(linha) for linha in self._db.execute("SELECT * FROM agendamentos ORDER BY nome")]
+
+    def fechar(self):
+        with self._lock:
+            self._db.close()
+
+
+def resumo(artigos: list[dict], test_mode: bool) -> dict:
+    """Resultado guardado na tarefa (o mesmo JSON que o ``/update_news/`` síncrono devolvia)."""
+    return {
+        "qtde_artigos": len(artigos),
+        "artigos": artigos if test_mode else [a["titulo"] for a in artigos],
+    }
+
+
+class Worker:
+    """
+    Executa as tarefas da fila, uma por vez.
+
+    Args:
+        fila (FilaColetas): Fila de onde as tarefas são reservadas.
+        executar: Função ``executar(query, test_mode, progresso)`` que roda a
+            coleta e devolve os artigos; por padrão,
+            :func:`crawler.crawler_exec.executar_coleta`.
+        intervalo (float): Segundos entre verificações quando a fila está vazia.
+        heartbeat (float): Segundos entre renovações do heartbeat da tarefa em execução.
+    """
+
+    def __init__(self, fila: FilaColetas, executar=None, intervalo: float = FILA_INTERVALO,
+                 heartbeat: float | None = None):
+        self.fila = fila
+        self._executar = executar
+        self.intervalo = intervalo
+        self.heartbeat = heartbeat if heartbeat is not None else max(1.0, FILA_TAREFA_TIMEOUT / 4)
+        self.nome = f"{socket.gethostname()}:{os.getpid()}"
+        self._parar = threading.Event()
+
+    def executar(self, query: str, test_mode: bool, progresso) -> list[dict]:
+        if self._executar is None:
+            # importado aqui: o crawler carrega modelo e clientes de API ao ser importado
+            from crawler import crawler_exec
+
+            self._executar = crawler_exec.executar_coleta
+        return self._executar(query, test_mode, progresso)
+
+    def _manter_viva(self, tarefa_id: int, fim: threading.Event):
+        while not fim.wait(self.heartbeat):
+            self.fila.progresso(tarefa_id)
+
+    def processar(self, tarefa: dict):
+        """Executa uma tarefa já reservada e grava o desfecho."""
+        logging.info(f"Tarefa de coleta {tarefa['id']} iniciada ({tarefa['origem']})")
+        fim = threading.Event()
+        vigia = threading.Thread(target=self._manter_viva, args=(tarefa["id"], fim), daemon=True)
+        vigia.start()
+        inicio = time.monotonic()
+        try:
+            artigos = self.executar(
+                tarefa["query"], tarefa["teste"],
+                lambda etapa, fracao: self.fila.progresso(tarefa["id"], etapa, fracao),
+            )
+        except Exception as e:
+            logging.exception(f"Tarefa de coleta {tarefa['id']} falhou")
+            self.fila.falhar(tarefa["id"], str(e))
+            TAREFAS.inc(resultado="falhou")
+        else:
+            self.fila.concluir(tarefa["id"], resumo(artigos, tarefa["teste"]))
+            TAREFAS.inc(resultado="concluida")
+            logging.info(f"Tarefa de coleta {tarefa['id']} concluída: {len(artigos)} artigos")
+        finally:
+            fim.set()
+            DURACAO.observar(time.monotonic() - inicio)
+
+    def rodar(self, uma_vez: bool = False):
+        """
+        Laço do worker: recupera tarefas órfãs, enfileira as agendadas e executa
+        as pendentes. Com ``uma_vez``, sai quando a fila esvazia.
+        """
+        logging.info(f"Worker de coletas {self.nome} iniciado")
+        while not self._parar.is_set():
+            self.fila.recuperar()
+            if not uma_vez:
+                self.fila.disparar_agendadas()
+            tarefa = self.fila.reservar(self.nome)
+            if tarefa is not None:
+                self.processar(tarefa)
+                continue
+            if uma_vez:
+                break
+            self.fila.limpar()
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+
+
+_fila = None
+_fila_lock = threading.Lock()
+
+
+def abrir() -> FilaColetas:
+    """Fila compartilhada deste processo (usada pelas views)."""
+    global _fila
+    with _fila_lock:
+        if _fila is None:
+            _fila = FilaColetas()
+        return _fila
+
+
+metricas.medidor("pqr_coleta_fila", "Tarefas de coleta em cada status", lambda: abrir().contagem(), rotulo="status")
+
+
+def servir_metricas(porta: int):
+    """Expõe :func:`chatbot.metricas.exportar` em ``/metrics`` numa thread do worker."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            corpo = metricas.exportar().encode("utf-8")
+            self.send_response(200 if self.path.rstrip("/") == "/metrics" else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("", porta), Handler)
+    threading.Thread(target=servidor.serve_forever, name="metricas-worker", daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Worker da fila de coletas")
+    parser.add_argument("--uma-vez", action="store_true", help="executa as tarefas pendentes e sai")
+    parser.add_argument("--metricas-porta", type=int, default=None, help="porta para expor /metrics")
+    args = parser.parse_args()
+
+    fila = abrir()
+    if COLETA_INTERVALO_HORAS > 0:
+        fila.agendar(AGENDAMENTO_PADRAO, COLETA_QUERY, 3600 * COLETA_INTERVALO_HORAS)
+        logging.info(f"Coleta agendada a cada {COLETA_INTERVALO_HORAS:g} h")
+    else:
+        fila.desagendar(AGENDAMENTO_PADRAO)
+    if args.metricas_porta:
+        servir_metricas(args.metricas_porta)
+    try:
+        Worker(fila).rodar(uma_vez=args.uma_vez)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fila.fechar()
@@ -0,0 +1,207 @@
+"""
+Camadas silver e gold da arquitetura Medallion.
+
+* **Bronze** (``data/bronze/``): um JSON indentado por artigo, como o crawler
+  sempre gravou.
+* **Silver** (``data/silver/``): artigos limpos e normalizados em JSONL,
+  particionados por dia de coleta (``data_coleta=AAAA-MM-DD/part-*.jsonl``).
+  É append-only: cada importação/coleta grava um novo arquivo ``part-*``.
+* **Gold** (``data/gold/``): um único conjunto compactado e deduplicado
+  (``artigos.jsonl`` e, se o ``pyarrow`` estiver instalado, ``artigos.parquet``),
+  pronto para leitura sequencial no build do índice.
+
+A leitura é feita em streaming por :func:`ler_artigos`, que projeta só as
+colunas pedidas (no Parquet, as demais colunas nem são lidas do disco).
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+
+DATA_DIR = Path(__file__).resolve().parent
+BRONZE_PATH = DATA_DIR / "bronze"
+SILVER_PATH = DATA_DIR / "silver"
+GOLD_PATH = DATA_DIR / "gold"
+MANIFESTO_BRONZE = "_bronze_importados.txt"
+
+COLUNAS = ("id", "fonte", "titulo", "link", "texto", "data_coleta", "query_origem")
+
+
+def _id_artigo(artigo: dict) -> str:
+    chave = artigo.get("link") or artigo.get("titulo") or artigo.get("texto", "")
+    return hashlib.md5(chave.encode("utf-8")).hexdigest()
+
+
+def normalizar_artigo(artigo: dict) -> dict:
+    """Limpa um artigo da camada bronze e o coloca no esquema da silver."""
+    texto = "\n".join(linha.strip() for linha in (artigo.get("texto") or "").splitlines())
+    return {
+        "id": _id_artigo(artigo),
+        "fonte": (artigo.get("fonte") or "").strip() or None,
+        "titulo": (artigo.get("titulo") or "").strip() or None,
+        "link": artigo.get("link"),
+        "texto": texto.strip(),
+        "data_coleta": artigo.get("data_coleta"),
+        "query_origem": artigo.get("query_origem"),
+    }
+
+
+def _particao(artigo: dict) -> str:
+    data = (artigo.get("data_coleta") or "")[:10] or "sem_data"
+    return f"data_coleta={data}"
+
+
+def _registrar_bronze(nomes: list[str], silver_path: Path):
+    silver_path = Path(silver_path)
+    silver_path.mkdir(parents=True, exist_ok=True)
+    with open(silver_path / MANIFESTO_BRONZE, "a", encoding="utf-8") as f:
+        f.writelines(f"{nome}\n" for nome in nomes)
+
+
+def anexar_silver(artigos: list[dict], silver_path: Path = SILVER_PATH, arquivos_bronze: list[str] | None = None) -> int:
+    """
+    Acrescenta artigos à camada silver, em um novo arquivo por partição.
+
+    Args:
+        artigos (list[dict]): Artigos no formato da camada bronze.
+        silver_path (Path): Raiz da camada silver.
+        arquivos_bronze (list[str] | None): Nomes dos arquivos bronze
+            correspondentes, marcados como importados para que
+            :func:`importar_bronze` não os leia de novo.
+
+    Returns:
+        int: Número de artigos gravados.
+    """
+    por_particao: dict[str, list[dict]] = {}
+    for artigo in artigos:
+        linha = normalizar_artigo(artigo)
+        if linha["texto"]:
+            por_particao.setdefault(_particao(linha), []).append(linha)
+
+    carimbo = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    for particao, linhas in por_particao.items():
+        pasta = Path(silver_path) / particao
+        pasta.mkdir(parents=True, exist_ok=True)
+        destino = pasta / f"part-{carimbo}.jsonl"
+        tmp = pasta / f".part-{carimbo}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for linha in linhas:
+                f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        os.replace(tmp, destino)
+    if arquivos_bronze:
+        _registrar_bronze(arquivos_bronze, silver_path)
+    return sum(len(v) for v in por_particao.values())
+
+
+def importar_bronze(bronze_path: Path = BRONZE_PATH, silver_path: Path = SILVER_PATH) -> int:
+    """
+    Importa para a silver os arquivos da bronze que ainda não foram importados.
+
+    Os nomes dos arquivos já importados ficam em um manifesto, então só os
+    arquivos novos são abertos.
+
+    Returns:
+        int: Número de artigos importados.
+    """
+    manifesto = Path(silver_path) / MANIFESTO_BRONZE
+    importados = set(manifesto.read_text(encoding="utf-8").splitlines()) if manifesto.exists() else set()
+
+    novos = sorted(f for f in os.listdir(bronze_path) if f.endswith(".json") and f not in importados)
+    artigos = []
+    for nome in novos:
+        with open(Path(bronze_path) / nome, encoding="utf-8") as f:
+            artigos.append(json.load(f))
+
+    return anexar_silver(artigos, silver_path, arquivos_bronze=novos)
+
+
+def _ler_jsonl(caminhos, colunas):
+    for caminho in caminhos:
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    registro = json.loads(linha)
+                    yield registro if colunas is None else {c: registro.get(c) for c in colunas}
+
+
+def _arquivos_silver(silver_path: Path) -> list[Path]:
+    return sorted(Path(silver_path).glob("data_coleta=*/part-*.jsonl"))
+
+
+def compactar_gold(silver_path: Path = SILVER_PATH, gold_path: Path = GOLD_PATH) -> int:
+    """
+    Compacta a silver em um único conjunto gold deduplicado por ``id``.
+
+    Em caso de repetição vale a versão mais recente (a última na ordem das
+    partições). A escrita é atômica: leitores veem o gold anterior ou o novo.
+
+    Returns:
+        int: Número de artigos no gold.
+    """
+    artigos: dict[str, dict] = {}
+    for registro in _ler_jsonl(_arquivos_silver(silver_path), None):
+        artigos[registro["id"]] = registro
+
+    gold_path = Path(gold_path)
+    gold_path.mkdir(parents=True, exist_ok=True)
+    tmp = gold_path / ".artigos.jsonl.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for registro in artigos.values():
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    os.replace(tmp, gold_path / "artigos.jsonl")
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return len(artigos)
+
+    tabela = pa.Table.from_pylist([{c: r.get(c) for c in COLUNAS} for r in artigos.values()])
+    tmp = gold_path / ".artigos.parquet.tmp"
+    pq.write_table(tabela, tmp)
+    os.replace(tmp, gold_path / "artigos.parquet")
+    return len(artigos)
+
+
+def compactar(bronze_path: Path = BRONZE_PATH, silver_path: Path = SILVER_PATH, gold_path: Path = GOLD_PATH) -> int:
+    """Executa bronze -> silver (incremental) -> gold e retorna o total de artigos no gold."""
+    importar_bronze(bronze_path, silver_path)
+    return compactar_gold(silver_path, gold_path)
+
+
+def ler_artigos(colunas: list[str] | None = None, camada: str = "gold",
+                silver_path: Path = SILVER_PATH, gold_path: Path = GOLD_PATH):
+    """
+    Lê os artigos de uma camada em streaming.
+
+    Args:
+        colunas (list[str] | None): Colunas a devolver (``None`` = todas).
+        camada (str): ``"gold"`` ou ``"silver"``.
+
+    Yields:
+        dict: Um artigo por vez, só com as colunas pedidas.
+    """
+    if camada == "silver":
+        yield from _ler_jsonl(_arquivos_silver(silver_path), colunas)
+        return
+
+    parquet = Path(gold_path) / "artigos.parquet"
+    if parquet.exists():
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pass
+        else:
+            arquivo = pq.ParquetFile(parquet)
+            for lote in arquivo.iter_batches(columns=list(colunas) if colunas else None):
+                yield from lote.to_pylist()
+            return
+
+    yield from _ler_jsonl([Path(gold_path) / "artigos.jsonl"], colunas)
+
+
+def gold_disponivel(gold_path: Path = GOLD_PATH) -> bool:
+    """Verdadeiro se a camada gold já foi compactada ao menos uma vez."""
+    return (Path(gold_path) / "artigos.jsonl").exists()
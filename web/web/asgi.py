@@ -3,6 +3,13 @@ Configuração ASGI para o projeto web.
 
 Expõe o callable ASGI como uma variável de módulo chamada ``application``.
 
+O modo streaming do endpoint ``/ask/`` (Server-Sent Events) usa um iterador
+assíncrono; servido por aqui (ex.: ``uvicorn web.asgi:application``), um
+stream lento não prende uma thread de worker enquanto o LLM gera tokens.
+
+Ao carregar a aplicação, os componentes do RAG são inicializados conforme
+``RAG_STARTUP`` (ver ``chatbot.rag_engine.startup``).
+
 Para mais informações sobre este arquivo, veja
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,3 +21,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web.settings")
 
 application = get_asgi_application()
+
+from chatbot import rag_engine  # noqa: E402
+
+rag_engine.startup()
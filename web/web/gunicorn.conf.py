@@ -0,0 +1,34 @@
+"""
+Configuração do gunicorn com os modelos pré-carregados no master.
+
+O master importa a aplicação uma única vez e carrega embeddings,
+cross-encoder, índice e prompt (``RAG_STARTUP=preload``). Os workers são
+criados por fork e herdam esses objetos por copy-on-write, em vez de cada um
+carregar a própria cópia. Depois do fork, cada worker cria o cliente do LLM e
+o monitor do índice e faz o warmup antes de aceitar requisições.
+
+Uso (a partir de ``web/``)::
+
+    gunicorn -c web/gunicorn.conf.py
+    # ou, com o streaming assíncrono (SSE):
+    gunicorn -c web/gunicorn.conf.py -k uvicorn.workers.UvicornWorker web.asgi:application
+"""
+
+import os
+
+os.environ.setdefault("RAG_STARTUP", "preload")
+
+wsgi_app = "web.wsgi:application"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+if workers > 1 and os.getenv("CONVERSAS_BACKEND") == "locmem":
+    # cada worker teria o próprio histórico, e a conversa mudaria conforme o worker que atende
+    raise RuntimeError("CONVERSAS_BACKEND=locmem não é compartilhado entre workers; use arquivo ou redis")
+preload_app = True
+timeout = 120
+
+
+def post_fork(server, worker):
+    from chatbot import rag_engine
+
+    rag_engine.init_worker()
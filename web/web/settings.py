@@ -10,8 +10,13 @@ Para a lista completa de configurações e seus valores, veja
 https://docs.djangoproject.com/pt-br/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -81,6 +86,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Histórico do chat (ver chatbot.conversas): "arquivo" é compartilhado pelos
+# workers de um host, "redis" entre hosts; "locmem" guarda um histórico por
+# processo e só serve com um único worker (o gunicorn.conf.py recusa o contrário)
+CONVERSAS_BACKEND = os.getenv("CONVERSAS_BACKEND", "arquivo")
+_CACHES_CONVERSAS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "conversas",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "arquivo": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CONVERSAS_DIR", str(BASE_DIR / "data" / "conversas")),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+    },
+}
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "conversas": _CACHES_CONVERSAS[CONVERSAS_BACKEND],
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -121,3 +156,18 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Logs do app no console (inclui os tempos de cada etapa de inicialização do RAG)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simples": {"format": "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "simples"},
+    },
+    "loggers": {
+        "chatbot": {"handlers": ["console"], "level": "INFO"},
+    },
+}
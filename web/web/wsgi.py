@@ -3,6 +3,10 @@ Configuração WSGI para o projeto web.
 
 Expõe o objeto WSGI como uma variável de módulo chamada ``application``.
 
+Ao carregar a aplicação, os componentes do RAG são inicializados conforme
+``RAG_STARTUP`` (ver ``chatbot.rag_engine.startup``). Comandos do
+``manage.py`` não passam por aqui e não carregam modelos.
+
 Para mais informações sobre este arquivo, veja
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
@@ -14,3 +18,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web.settings")
 
 application = get_wsgi_application()
+
+from chatbot import rag_engine  # noqa: E402
+
+rag_engine.startup()